@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_DIR = "manifests"
+
+def atomic_write(path: str, data: bytes):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class ArtifactStore:
+    # Objects are stored once under objects/<2 chars>/<sha256>, shared by every run that uses this root.
+    # Each run keeps per-iteration manifests (file name -> hash) in <output_dir>/manifests.
+    def __init__(self, root: str = "artifacts", cache_bytes: int = 16 * 1024 * 1024):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self.lock = threading.Lock()
+        # path -> (mtime_ns, size, hash); a changed stat means the file was edited outside the store
+        self.index: Dict[str, Tuple[int, int, str]] = {}
+        # hash -> text; content never changes for a hash, so entries only leave by eviction
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.cached_bytes = 0
+        self.stats = {"writes": 0, "dedup_hits": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _remember(self, digest: str, text: str):
+        with self.lock:
+            if digest in self.cache:
+                self.cache.move_to_end(digest)
+                return
+            self.cache[digest] = text
+            self.cached_bytes += len(text)
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = content_hash(data)
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            with self.lock:
+                self.stats["dedup_hits"] += 1
+        else:
+            atomic_write(path, data)
+        self._remember(digest, text)
+        return digest
+
+    def get(self, digest: str) -> str:
+        with self.lock:
+            text = self.cache.get(digest)
+            if text is not None:
+                self.cache.move_to_end(digest)
+                self.stats["cache_hits"] += 1
+                return text
+            self.stats["cache_misses"] += 1
+        with open(self._object_path(digest), "rb") as f:
+            text = f.read().decode("utf-8")
+        self._remember(digest, text)
+        return text
+
+    def _stat(self, path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def write_file(self, output_dir: str, filename: str, text: str) -> str:
+        digest = self.put(text)
+        path = os.path.join(output_dir, filename)
+        # A copy, not a hard link to the object: shell commands and tests edit working files in place
+        # (>>, open(path, "w")), which through a link would rewrite the object under its old hash.
+        # There is one working copy per run, overwritten each iteration; only objects accumulate
+        atomic_write(path, text.encode("utf-8"))
+        with self.lock:
+            self.index[os.path.abspath(path)] = (*self._stat(path), digest)
+            self.stats["writes"] += 1
+        return digest
+
+    def file_hash(self, output_dir: str, filename: str) -> str:
+        path = os.path.abspath(os.path.join(output_dir, filename))
+        stat = self._stat(path)
+        with self.lock:
+            known = self.index.get(path)
+        if known is not None and known[:2] == stat:
+            return known[2]
+        # Written by something else (a shell command, a copied candidate): hash it and keep a copy
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8", errors="replace")
+        digest = self.put(text)
+        with self.lock:
+            self.index[path] = (*stat, digest)
+        return digest
+
+    def read_file(self, output_dir: str, filename: str) -> str:
+        return self.get(self.file_hash(output_dir, filename))
+
+    def snapshot(self, output_dir: str, iteration: int, filenames: List[str], score: Optional[float] = None, **extra) -> Dict:
+        files = {}
+        for name in filenames:
+            try:
+                files[name] = self.file_hash(output_dir, name)
+            except OSError:
+                continue
+        manifest = {"iteration": iteration, "files": files, "score": score, "created_at": time.time(), **extra}
+        atomic_write(os.path.join(output_dir, MANIFEST_DIR, f"iteration_{iteration}.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+        return manifest
+
+    def manifests(self, output_dir: str) -> List[Dict]:
+        directory = os.path.join(output_dir, MANIFEST_DIR)
+        if not os.path.isdir(directory):
+            return []
+        manifests = []
+        for name in os.listdir(directory):
+            if name.startswith("iteration_") and name.endswith(".json"):
+                with open(os.path.join(directory, name), "r") as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: m["iteration"])
+
+    def manifest(self, output_dir: str, iteration: int) -> Dict:
+        with open(os.path.join(output_dir, MANIFEST_DIR, f"iteration_{iteration}.json"), "r") as f:
+            return json.load(f)
+
+    def best(self, output_dir: str) -> Optional[Dict]:
+        scored = [m for m in self.manifests(output_dir) if m.get("score") is not None]
+        # Earliest iteration wins ties, as it got there with fewer calls
+        return max(scored, key=lambda m: (m["score"], -m["iteration"])) if scored else None
+
+    def diff(self, output_dir: str, old_iteration: int, new_iteration: int) -> Dict[str, str]:
+        old, new = self.manifest(output_dir, old_iteration)["files"], self.manifest(output_dir, new_iteration)["files"]
+        diffs = {}
+        for name in sorted(old.keys() | new.keys()):
+            # Equal hashes mean equal content, so unchanged files cost nothing
+            if old.get(name) == new.get(name):
+                continue
+            before = self.get(old[name]).splitlines(True) if name in old else []
+            after = self.get(new[name]).splitlines(True) if name in new else []
+            diffs[name] = "".join(difflib.unified_diff(before, after, f"iteration_{old_iteration}/{name}", f"iteration_{new_iteration}/{name}"))
+        return diffs
+
+    def restore(self, output_dir: str, iteration: int) -> Dict:
+        manifest = self.manifest(output_dir, iteration)
+        for name, digest in manifest["files"].items():
+            self.write_file(output_dir, name, self.get(digest))
+        return manifest
+
+    def usage(self) -> Dict:
+        objects, stored = 0, 0
+        for directory, _, files in os.walk(os.path.join(self.root, "objects")):
+            for name in files:
+                objects += 1
+                stored += os.path.getsize(os.path.join(directory, name))
+        with self.lock:
+            return {"objects": objects, "stored_bytes": stored, "cached_bytes": self.cached_bytes, **self.stats}
@@ -0,0 +1,99 @@
+import math
+import random
+from typing import Dict, List, Optional
+
+class RunningStats:
+    # Welford running mean/variance. remove() undoes a push, so a caller keeping a sliding window
+    # of pulls can drop the oldest score from its arm in O(1)
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value: float):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = self.mean
+        self.count -= 1
+        self.mean = (mean * (self.count + 1) - value) / self.count
+        self.m2 = max(self.m2 - (value - self.mean) * (value - mean), 0.0)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def state_dict(self) -> Dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+    def load_state_dict(self, state: Dict):
+        if "values" in state:
+            for value in state["values"]:
+                self.push(value)
+            return
+        self.count, self.mean, self.m2 = state["count"], state["mean"], state["m2"]
+
+def stand_ins(state: Dict, n: int) -> List[float]:
+    # n scores with the mean and variance of a saved summary, for rebuilding a window whose raw scores were not kept
+    n = min(state.get("count", 0), n)
+    if n == 0:
+        return []
+    mean = state["mean"]
+    variance = state["m2"] / (state["count"] - 1) if state["count"] > 1 else 0.0
+    spread = math.sqrt(variance * (n - 1) / (n - n % 2)) if n > 1 else 0.0
+    values = [mean + spread * (-1) ** i for i in range(n - n % 2)]
+    return values + [mean] * (n % 2)
+
+class Greedy:
+    def select(self, names: List[str], stats: Dict[str, RunningStats], total: int) -> Optional[str]:
+        if total == 0:
+            return None
+        return max(names, key=lambda name: stats[name].mean)
+
+class UCB1:
+    def __init__(self, c: float = math.sqrt(2), scale: float = 100.0):
+        self.c = c
+        self.scale = scale
+
+    def select(self, names: List[str], stats: Dict[str, RunningStats], total: int) -> Optional[str]:
+        for name in names:
+            if stats[name].count == 0:
+                return name
+        # With windowed stats the counts are pulls within the window, so the log term must be too
+        log_total = math.log(max(sum(stats[name].count for name in names), 1))
+        return max(names, key=lambda name: stats[name].mean / self.scale + self.c * math.sqrt(log_total / stats[name].count))
+
+class ThompsonSampling:
+    # Gaussian posterior on each algorithm's mean score
+    def __init__(self, prior_std: float = 25.0, seed: Optional[int] = None):
+        self.prior_std = prior_std
+        self.rng = random.Random(seed)
+
+    def select(self, names: List[str], stats: Dict[str, RunningStats], total: int) -> Optional[str]:
+        for name in names:
+            if stats[name].count == 0:
+                return name
+
+        def sample(name: str) -> float:
+            s = stats[name]
+            std = math.sqrt((s.variance if s.count > 1 else self.prior_std ** 2) / s.count)
+            return self.rng.gauss(s.mean, std)
+
+        return max(names, key=sample)
+
+STRATEGIES = {
+    "greedy": Greedy,
+    "ucb1": UCB1,
+    "thompson": ThompsonSampling
+}
+
+def make_strategy(name: str):
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown selection strategy: {name} (expected one of {', '.join(STRATEGIES)})")
+    return STRATEGIES[name]()
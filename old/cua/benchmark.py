@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from http_client import HTTPClient
+from stub_server import LatencyModel, StubServer
+from warm_pytest import PytestWorker
+from cua4_rl import Agent, EvaluatorAgent, FileTools, OpenRouter, RLGeneratorAgent, RLSimulation, config_content
+
+GENERATOR_REPLY = (
+    "[FileTools]save:def add(a, b):\n    return a + b:data_utils.py[/FileTools]\n"
+    "[FileTools]save:from data_utils import add\n\nprint(add(1, 2)):app.py[/FileTools]\n"
+    "[FileTools]save:from data_utils import add\n\ndef test_add():\n    assert add(1, 2) == 3:tests.py[/FileTools]"
+)
+EVALUATOR_REPLY = json.dumps({"score": 70, "functionality_feedback": "Works.", "quality_feedback": "Small but tidy."})
+RL_REPLY = json.dumps({"name": "StubRL", "description": "Scripted", "pseudo_code": "pass"})
+
+def default_script() -> List:
+    return [("expert code reviewer", EVALUATOR_REPLY), ("RL expert", RL_REPLY), ("", GENERATOR_REPLY)]
+
+def _session(backoff: float) -> HTTPClient:
+    return HTTPClient(backoff_factor=backoff)
+
+def _simulation(base_url: str, work_dir: str, evaluators: int, iterations: int, backoff: float,
+                test_worker: Optional[PytestWorker], stream: bool = False) -> RLSimulation:
+    config_file = os.path.join(work_dir, "config.json")
+    if not os.path.exists(config_file):
+        with open(config_file, "w") as f:
+            json.dump(config_content, f)
+    session = _session(backoff)
+    model = OpenRouter(id="stub/model", api_key="stub", base_url=base_url)
+    generator = Agent(model=model, tools=[FileTools()], stream=stream, session=session)
+    rl_generator = RLGeneratorAgent(model, session=session)
+    return RLSimulation(
+        generator=generator,
+        evaluators=[EvaluatorAgent(OpenRouter(id=f"stub/evaluator-{i}", api_key="stub", base_url=base_url), session=session) for i in range(evaluators)],
+        rl_generator=rl_generator,
+        config_file=config_file,
+        max_iterations=iterations,
+        output_root=os.path.join(work_dir, "runs"),
+        test_worker=test_worker
+    )
+
+def _summary(values: List[float]) -> Dict:
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(np.max(values))
+    }
+
+def bench_iteration_latency(args, work_dir: str, test_worker) -> Dict:
+    latency = LatencyModel(args.latency, median=args.latency_ms / 1000, mean=args.latency_ms / 1000, value=args.latency_ms / 1000)
+    with StubServer(default_script(), latency=latency) as stub:
+        simulation = _simulation(stub.base_url, work_dir, args.evaluators, args.iterations, args.backoff, test_worker, args.stream)
+        simulation.run()
+        stats = dict(stub.stats)
+    return {"iteration_seconds": _summary([entry["elapsed"] for entry in simulation.history if "elapsed" in entry]), "stub": stats}
+
+def bench_concurrent_throughput(args, work_dir: str, test_worker) -> Dict:
+    latency = LatencyModel(args.latency, median=args.latency_ms / 1000, mean=args.latency_ms / 1000, value=args.latency_ms / 1000)
+    with StubServer(default_script(), latency=latency) as stub:
+        simulations = [_simulation(stub.base_url, work_dir, args.evaluators, args.iterations, args.backoff, test_worker, args.stream)
+                       for _ in range(args.concurrency)]
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(lambda simulation: simulation.run(), simulations))
+        wall = time.time() - start
+        stats = dict(stub.stats)
+    iterations = sum(len(simulation.history) for simulation in simulations)
+    return {"simulations": args.concurrency, "iterations": iterations, "wall_seconds": wall,
+            "iterations_per_second": iterations / wall if wall else 0.0, "requests_per_second": stats["requests"] / wall if wall else 0.0}
+
+def bench_retry_overhead(args, work_dir: str, test_worker) -> Dict:
+    results = {}
+    for label, rate in (("clean", 0.0), ("faulty", args.error_rate)):
+        latency = LatencyModel(args.latency, median=args.latency_ms / 1000, mean=args.latency_ms / 1000, value=args.latency_ms / 1000)
+        with StubServer(default_script(), latency=latency, error_rate_429=rate / 2, error_rate_5xx=rate / 2) as stub:
+            simulation = _simulation(stub.base_url, work_dir, args.evaluators, args.iterations, args.backoff, test_worker, args.stream)
+            simulation.run()
+            results[label] = {"iteration_seconds": _summary([entry["elapsed"] for entry in simulation.history if "elapsed" in entry]), "stub": dict(stub.stats)}
+    clean, faulty = results["clean"]["iteration_seconds"], results["faulty"]["iteration_seconds"]
+    if clean.get("n") and faulty.get("n"):
+        results["overhead_seconds_per_iteration"] = faulty["mean"] - clean["mean"]
+    return results
+
+def bench_memory(args, work_dir: str, test_worker) -> Dict:
+    with StubServer(default_script()) as stub:
+        simulation = _simulation(stub.base_url, work_dir, args.evaluators, args.iterations, args.backoff, test_worker, args.stream)
+        tracemalloc.start()
+        simulation.run()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "retained_bytes": current}
+
+BENCHMARKS = {
+    "iteration_latency": bench_iteration_latency,
+    "concurrent_throughput": bench_concurrent_throughput,
+    "retry_overhead": bench_retry_overhead,
+    "memory": bench_memory
+}
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(args) -> Dict:
+    report = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": {}
+    }
+    test_worker = PytestWorker(timeout=60) if args.with_tests else None
+    try:
+        for name in args.only or BENCHMARKS:
+            with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                report["results"][name] = BENCHMARKS[name](args, work_dir, test_worker)
+    finally:
+        if test_worker is not None:
+            test_worker.close()
+    return report
+
+def _flatten(prefix: str, value, out: Dict):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+def compare(baseline: Dict, current: Dict) -> Dict[str, Dict]:
+    old, new = {}, {}
+    _flatten("", baseline.get("results", {}), old)
+    _flatten("", current.get("results", {}), new)
+    return {
+        key: {"baseline": old[key], "current": new[key], "change": (new[key] - old[key]) / old[key] if old[key] else None}
+        for key in sorted(old.keys() & new.keys())
+    }
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the agent loop against a local stub API")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--evaluators", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal", "exponential"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Share of requests answered with 429/503 in the retry benchmark")
+    parser.add_argument("--backoff", type=float, default=0.05, help="Retry backoff_factor used by the benchmarked sessions")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--with-tests", action="store_true", help="Run the generated tests through PytestWorker each iteration")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS))
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            report["comparison"] = compare(json.load(f), report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Benchmark report saved to {args.output}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,87 @@
+import os
+import re
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+# Template slots the model echoed back instead of writing code, e.g. "[library_code]"
+PLACEHOLDER = re.compile(r"^\s*\[\w+\]\s*$")
+
+class GenerationCancelled(Exception):
+    pass
+
+def screen_candidate(candidate_dir: str, files: List[str], test_file: str, test_worker=None) -> Dict:
+    # Cheap local check before any evaluator tokens are spent: every file present, real code, compiles, tests pass
+    result = {"present": 0, "compiled": 0, "files": len(files) + 1, "passed": 0, "failed": 0, "errors": []}
+    for name in [*files, test_file]:
+        path = os.path.join(candidate_dir, name)
+        try:
+            with open(path, "r") as f:
+                source = f.read()
+        except OSError:
+            result["errors"].append(f"{name}: missing")
+            continue
+        if not source.strip() or PLACEHOLDER.match(source):
+            result["errors"].append(f"{name}: placeholder")
+            continue
+        result["present"] += 1
+        try:
+            compile(source, path, "exec")
+            result["compiled"] += 1
+        except SyntaxError as e:
+            result["errors"].append(f"{name}: {e.msg} (line {e.lineno})")
+    if test_worker is not None and result["compiled"] == result["files"]:
+        report = test_worker.run(candidate_dir, test_file, files=files)
+        result["passed"] = report.get("passed", 0)
+        result["failed"] = report.get("failed", 0) + report.get("error", 0)
+        result["errors"].extend(report.get("collection_errors", []))
+    tests = result["passed"] + result["failed"]
+    pass_rate = result["passed"] / tests if tests else 0.0
+    # Compiling is worth half; passing tests the other half (unknown without a test worker)
+    result["score"] = 0.5 * result["compiled"] / result["files"] + 0.5 * pass_rate
+    return result
+
+def best_of_n(generate: Callable[[int, threading.Event], str], screen: Callable[[int], Dict], n: int,
+              threshold: float = 1.0, max_workers: Optional[int] = None) -> List[Dict]:
+    # generate(index, cancel) writes candidate `index` to its own directory; screen(index) scores it.
+    # Once any candidate screens at or above `threshold`, unstarted candidates are dropped and
+    # running ones see `cancel` set.
+    cancel = threading.Event()
+    results = [{"index": index, "status": "cancelled", "score": None} for index in range(n)]
+
+    def attempt(index: int) -> Dict:
+        if cancel.is_set():
+            raise GenerationCancelled()
+        start = time.time()
+        output = generate(index, cancel)
+        screened = screen(index)
+        return {"index": index, "status": "screened", "output": output, "duration": time.time() - start, **screened}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or n)
+    try:
+        futures = {executor.submit(contextvars.copy_context().run, attempt, index): index for index in range(n)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except GenerationCancelled:
+                continue
+            except Exception as e:
+                results[index] = {"index": index, "status": "failed", "score": None, "error": str(e)}
+                continue
+            if results[index]["score"] >= threshold:
+                cancel.set()
+                break
+    finally:
+        # Generations still in flight see `cancel` and stop; nobody waits for them
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def pick_best(results: List[Dict]) -> Optional[Dict]:
+    screened = [r for r in results if r["status"] == "screened"]
+    if not screened:
+        return None
+    # Highest screen score; among ties the one that finished generating first
+    return max(screened, key=lambda r: (r["score"], -r["duration"]))
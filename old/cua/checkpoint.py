@@ -0,0 +1,104 @@
+import os
+import json
+import struct
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from qtable import QTable
+
+# Layout: MAGIC, 8-byte header length, JSON header, then 64-byte aligned raw arrays.
+# Raw arrays let load_checkpoint memory-map the tables instead of parsing them.
+MAGIC = b"RLCKPT1\n"
+ALIGN = 64
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_arrays(path: str, arrays: Dict[str, np.ndarray], meta: Dict):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"arrays": layout, "meta": meta}).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_arrays(path: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a checkpoint file: {path}")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = _align(len(MAGIC) + 8 + header_len)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=np.dtype(spec["dtype"]))
+            continue
+        # Copy-on-write: pages load lazily and in-place updates never touch the file
+        arrays[name] = np.memmap(path, dtype=np.dtype(spec["dtype"]), mode="c", offset=data_start + spec["offset"], shape=shape)
+    return arrays, header["meta"]
+
+def _policy_arrays(policy: Dict[str, Dict[str, float]]) -> Tuple[List[str], List[str], np.ndarray]:
+    states = list(policy)
+    actions = sorted({action for probs in policy.values() for action in probs})
+    action_index = {action: i for i, action in enumerate(actions)}
+    matrix = np.full((len(states), len(actions)), np.nan)
+    for s, state in enumerate(states):
+        for action, prob in policy[state].items():
+            matrix[s, action_index[action]] = prob
+    return states, actions, matrix
+
+def save_checkpoint(path: str, algorithms: List, meta_agent, extra: Optional[Dict] = None) -> None:
+    arrays = {}
+    meta = {"algorithms": {}, "meta_agent": meta_agent.state_dict()}
+    if extra is not None:
+        # JSON-serializable caller state (e.g. a simulation's loop state) stored in the header
+        meta["extra"] = extra
+    for algo in algorithms:
+        entry = {}
+        if isinstance(algo.q_table, QTable):
+            n_states, n_actions = len(algo.q_table.states), len(algo.q_table.actions)
+            arrays[f"{algo.name}/q_values"] = algo.q_table.values[:n_states, :n_actions]
+            arrays[f"{algo.name}/q_seen"] = algo.q_table.seen[:n_states, :n_actions]
+            entry["q_states"] = algo.q_table.states
+            entry["q_actions"] = algo.q_table.actions
+        if algo.policy:
+            states, actions, matrix = _policy_arrays(algo.policy)
+            arrays[f"{algo.name}/policy"] = matrix
+            entry["policy_states"] = states
+            entry["policy_actions"] = actions
+        meta["algorithms"][algo.name] = entry
+    write_arrays(path, arrays, meta)
+
+def load_checkpoint(path: str, algorithms: List, meta_agent) -> Optional[Dict]:
+    arrays, meta = read_arrays(path)
+    for algo in algorithms:
+        entry = meta["algorithms"].get(algo.name)
+        if entry is None:
+            continue
+        if "q_states" in entry and isinstance(algo.q_table, QTable):
+            algo.q_table = QTable.from_arrays(entry["q_states"], entry["q_actions"], arrays[f"{algo.name}/q_values"], arrays[f"{algo.name}/q_seen"])
+        if "policy_states" in entry:
+            matrix = arrays[f"{algo.name}/policy"]
+            actions = entry["policy_actions"]
+            algo.policy = {
+                state: {action: float(p) for action, p in zip(actions, row) if not np.isnan(p)}
+                for state, row in zip(entry["policy_states"], matrix)
+            }
+    meta_agent.load_state_dict(meta["meta_agent"])
+    return meta.get("extra")
@@ -0,0 +1,58 @@
+import json
+import threading
+import time
+import pytest
+from cua4_rl import FileTools, OpenRouter, RLSimulation, config_content
+
+class FakeGenerator:
+    def __init__(self):
+        self.tools = {"FileTools": FileTools()}
+
+    def run(self, prompt: str, max_tokens: int = 2000, output_dir: str = ".") -> str:
+        file_tools = self.tools["FileTools"]
+        file_tools.save("def add(a, b):\n    return a + b", "data_utils.py", output_dir)
+        file_tools.save("from data_utils import add", "app.py", output_dir)
+        file_tools.save("def test_add():\n    assert True", "tests.py", output_dir)
+        return "saved"
+
+class FakeEvaluator:
+    def __init__(self, score: int, delay: float = 0.0):
+        self.model = OpenRouter(id=f"fake-{score}", api_key="", base_url="http://localhost")
+        self.score = score
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def evaluate_code(self, code, project_type, project_description, test_results):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {"score": self.score, "functionality_feedback": f"ok {self.score}", "quality_feedback": ""}
+
+class FakeRLGenerator:
+    def generate_algorithm(self, existing_algorithms):
+        return {"name": "Fake", "description": "", "pseudo_code": ""}
+
+def make_simulation(config_file, evaluators, **kwargs):
+    return RLSimulation(
+        generator=FakeGenerator(),
+        evaluators=evaluators,
+        rl_generator=FakeRLGenerator(),
+        config_file=config_file,
+        **kwargs
+    )
+
+@pytest.fixture
+def make_config(tmp_path, monkeypatch):
+    # Runs from tmp_path so output_N directories land there; make_config(candidates=3) overrides config keys
+    monkeypatch.chdir(tmp_path)
+
+    def make(**overrides) -> str:
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({**config_content, **overrides}))
+        return str(path)
+    return make
+
+@pytest.fixture
+def config_file(make_config):
+    return make_config()
@@ -0,0 +1,132 @@
+import math
+import time
+import threading
+import contextvars
+from statistics import NormalDist
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+class ConsensusController:
+    # Queries evaluators in waves, cheapest and fastest first, and stops once the panel mean is pinned down:
+    # either the confidence interval is narrower than `ci_width` points or it lies wholly above `stop_threshold`.
+    # The interval is for the mean of the *whole* panel (finite population correction), so its half-width bounds
+    # the error that skipping the remaining evaluators introduces. Evaluator disagreement is pooled across
+    # iterations, starting from `prior_sd` weighted as `prior_weight` degrees of freedom. Only iterations that asked
+    # the whole panel are pooled: early stops happen when the first wave agrees, so pooling those would shrink the
+    # spread and make stops ever earlier. Results flagged "error" are not scores and are left out.
+    def __init__(self, ci_width: float = 10.0, confidence: float = 0.95, stop_threshold: float = 90.0, first_wave: int = 2,
+                 wave_size: int = 1, prior_sd: float = 10.0, prior_weight: float = 4.0, costs: Optional[Dict[str, float]] = None):
+        self.ci_width = ci_width
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.stop_threshold = stop_threshold
+        self.first_wave = max(1, first_wave)
+        self.wave_size = max(1, wave_size)
+        self.prior_sd = prior_sd
+        self.prior_weight = prior_weight
+        # Relative price per call by model id; models without one count as free
+        self.costs = costs or {}
+        self.latency: Dict[str, float] = {}
+        self.ss = 0.0
+        self.df = 0
+        self.lock = threading.Lock()
+        self.stats = {"iterations": 0, "calls": 0, "saved": 0, "ci_stops": 0, "threshold_stops": 0,
+                      "error_bound_total": 0.0, "max_error_bound": 0.0}
+
+    def order(self, models: List[str]) -> List[int]:
+        # Unmeasured models sort as instant so each gets timed at least once
+        with self.lock:
+            return sorted(range(len(models)), key=lambda i: (self.costs.get(models[i], 0.0), self.latency.get(models[i], 0.0), i))
+
+    def observe(self, model: str, seconds: float):
+        with self.lock:
+            previous = self.latency.get(model)
+            self.latency[model] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+
+    def sigma(self, scores: List[float] = ()) -> float:
+        ss, df = self.ss, self.df
+        if len(scores) > 1:
+            mean = sum(scores) / len(scores)
+            ss += sum((score - mean) ** 2 for score in scores)
+            df += len(scores) - 1
+        return math.sqrt((self.prior_weight * self.prior_sd ** 2 + ss) / (self.prior_weight + df))
+
+    def half_width(self, scores: List[float], panel: int) -> float:
+        n = len(scores)
+        if n >= panel:
+            return 0.0
+        return self.z * self.sigma(scores) / math.sqrt(n) * math.sqrt((panel - n) / (panel - 1))
+
+    def decide(self, scores: List[float], panel: int) -> Optional[Tuple[str, float]]:
+        if len(scores) >= panel:
+            return "all", 0.0
+        if len(scores) < self.first_wave:
+            return None
+        mean = sum(scores) / len(scores)
+        bound = self.half_width(scores, panel)
+        if mean - bound >= self.stop_threshold:
+            return "threshold", bound
+        if 2 * bound <= self.ci_width:
+            return "ci", bound
+        return None
+
+    def run(self, evaluators: List, evaluate: Callable[[object], Dict], max_workers: int = 5) -> Tuple[List[Optional[Dict]], Dict]:
+        # Returns results aligned with `evaluators` (None for the ones never asked) and the decision
+        models = [getattr(getattr(evaluator, "model", None), "id", str(i)) for i, evaluator in enumerate(evaluators)]
+        order = self.order(models)
+        results: List[Optional[Dict]] = [None] * len(evaluators)
+
+        def timed(index: int) -> Dict:
+            start = time.time()
+            result = evaluate(evaluators[index])
+            self.observe(models[index], time.time() - start)
+            return result
+
+        def valid_scores() -> List[float]:
+            return [results[i].get("score", 0) for i in order[:asked] if not results[i].get("error")]
+
+        asked, decision, wave = 0, None, self.first_wave
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            while decision is None:
+                batch = order[asked:asked + wave]
+                futures = [(index, executor.submit(contextvars.copy_context().run, timed, index)) for index in batch]
+                for index, future in futures:
+                    results[index] = future.result()
+                asked += len(batch)
+                wave = self.wave_size
+                # An evaluator that errored can never contribute a score, so the panel shrinks by one
+                decision = self.decide(valid_scores(), len(evaluators) - (asked - len(valid_scores())))
+        reason, bound = decision
+        scores = valid_scores()
+        with self.lock:
+            if reason == "all" and len(scores) > 1:
+                mean = sum(scores) / len(scores)
+                self.ss += sum((score - mean) ** 2 for score in scores)
+                self.df += len(scores) - 1
+            self.stats["iterations"] += 1
+            self.stats["calls"] += asked
+            self.stats["saved"] += len(evaluators) - asked
+            if reason != "all":
+                self.stats[f"{reason}_stops"] += 1
+            self.stats["error_bound_total"] += bound
+            self.stats["max_error_bound"] = max(self.stats["max_error_bound"], bound)
+        return results, {"queried": [models[i] for i in order[:asked]], "skipped": len(evaluators) - asked, "reason": reason,
+                         "mean": sum(scores) / len(scores) if scores else 0.0, "error_bound": bound}
+
+    def report(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+            total = stats["calls"] + stats["saved"]
+            stats["saved_fraction"] = stats["saved"] / total if total else 0.0
+            stats["mean_error_bound"] = stats.pop("error_bound_total") / stats["iterations"] if stats["iterations"] else 0.0
+            stats["sigma"] = self.sigma()
+            return stats
+
+    def state_dict(self) -> Dict:
+        with self.lock:
+            return {"latency": dict(self.latency), "ss": self.ss, "df": self.df, "stats": dict(self.stats)}
+
+    def load_state_dict(self, state: Dict):
+        with self.lock:
+            self.latency = dict(state["latency"])
+            self.ss, self.df = state["ss"], state["df"]
+            self.stats.update(state["stats"])
@@ -1,8 +1,8 @@
 import os
-import subprocess
 import requests
 import time
 from typing import Any, Dict, List, Optional
+from shell_exec import ShellExecutor
 
 class OpenRouter:
     def __init__(self, id: str, api_key: str, base_url: str):
@@ -11,14 +11,35 @@ class OpenRouter:
         self.base_url = base_url
 
 class ShellTools:
+    def __init__(self, timeout: float = 60.0, max_output_bytes: int = 64 * 1024, max_concurrent: int = 4):
+        self.executor = ShellExecutor(timeout, max_output_bytes, max_concurrent)
+
+    def run(self, command: str) -> Dict:
+        return self.executor.run(command)
+
+    async def arun(self, command: str) -> Dict:
+        return await self.executor.arun(command)
+
     def execute(self, command: str) -> str:
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-            return result.stdout or "Command executed (no output)"
-        except subprocess.CalledProcessError as e:
-            return f"Error: {e.stderr}"
+            result = self.run(command)
         except Exception as e:
             return f"Unexpected error: {str(e)}"
+        if result["timed_out"]:
+            return f"Error: command timed out after {self.executor.timeout:.0f}s\n{result['stderr']}"
+        if result["exit_code"] != 0:
+            return f"Error: {result['stderr']}"
+        return result["stdout"] or "Command executed (no output)"
+
+def extract_shell_command(content: str) -> Optional[str]:
+    start_tag = "[shell]"
+    end_tag = "[/shell]"
+    if start_tag in content and end_tag in content:
+        start_idx = content.index(start_tag) + len(start_tag)
+        end_idx = content.index(end_tag)
+        if end_idx >= start_idx:
+            return content[start_idx:end_idx].strip()
+    return None
 
 class Agent:
     def __init__(self, model: OpenRouter, tools: List[Any], show_tool_calls: bool = False):
@@ -26,14 +47,18 @@ class Agent:
         self.tools = {tool.__class__.__name__: tool for tool in tools}
         self.show_tool_calls = show_tool_calls
 
-    def _call_api(self, prompt: str) -> Dict:
-        full_prompt = (
+    @staticmethod
+    def build_prompt(prompt: str) -> str:
+        return (
             f"You are a helpful AI that executes shell commands to assist users. "
             f"For the request: '{prompt}', provide a shell command that works on the user's OS. "
             f"Return the command in the format: [shell]command[/shell]. "
             f"Detect the OS based on common conventions (e.g., 'dir' for Windows, 'ls' for Unix-like). "
             f"Current OS hint: {'Windows' if os.name == 'nt' else 'POSIX'}."
         )
+
+    def _call_api(self, prompt: str) -> Dict:
+        full_prompt = self.build_prompt(prompt)
         headers = {
             "Authorization": f"Bearer {self.model.api_key}",
             "Content-Type": "application/json",
@@ -69,12 +94,8 @@ class Agent:
             return content
         
         shell_tool = self.tools["ShellTools"]
-        start_tag = "[shell]"
-        end_tag = "[/shell]"
-        if start_tag in content and end_tag in content:
-            start_idx = content.index(start_tag) + len(start_tag)
-            end_idx = content.index(end_tag)
-            cmd = content[start_idx:end_idx].strip()
+        cmd = extract_shell_command(content)
+        if cmd is not None:
             result = shell_tool.execute(cmd)
             if self.show_tool_calls:
                 return f"**Tool Call:** ShellTools.execute('{cmd}')\n**Result:**\n```\n{result}\n```"
@@ -93,12 +114,6 @@ class Agent:
         else:
             print(response)
 
-# Usage
-api_key = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
-if api_key == "your-api-key-here":
-    print("Please set your OPENROUTER_API_KEY environment variable.")
-    exit(1)
-
 # Test multiple models
 models_to_test = [
     # "openai/gpt-3.5-turbo",
@@ -120,28 +135,38 @@ models_to_test = [
     # "deepseek/deepseek-r1-distill-qwen-1.5b"
 ]
 
-for model_id in models_to_test:
-    print(f"\nTesting model: {model_id}")
-    agent = Agent(
-        model=OpenRouter(
-            id=model_id,
-            api_key=api_key,
-            base_url="https://openrouter.ai/api/v1"
-        ),
-        tools=[ShellTools()],
-        show_tool_calls=True
-    )
+def main():
+    # Usage
+    api_key = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
+    if api_key == "your-api-key-here":
+        print("Please set your OPENROUTER_API_KEY environment variable.")
+        exit(1)
+
+    for model_id in models_to_test:
+        print(f"\nTesting model: {model_id}")
+        agent = Agent(
+            model=OpenRouter(
+                id=model_id,
+                api_key=api_key,
+                base_url="https://openrouter.ai/api/v1"
+            ),
+            tools=[ShellTools()],
+            show_tool_calls=True
+        )
     
-    # goal = "Show me the contents of the current directory"
-    goal = "get the first 5 lines of treechat.md"
-
-    # Measure time elapsed
-    start_time = time.time()
-    try:
-        agent.print_response(goal, markdown=True)
-    except Exception as e:
-        print(f"Error with {model_id}: {str(e)}")
-    end_time = time.time()
+        # goal = "Show me the contents of the current directory"
+        goal = "get the first 5 lines of treechat.md"
+
+        # Measure time elapsed
+        start_time = time.time()
+        try:
+            agent.print_response(goal, markdown=True)
+        except Exception as e:
+            print(f"Error with {model_id}: {str(e)}")
+        end_time = time.time()
     
-    elapsed_time = end_time - start_time
-    print(f"**Time Elapsed for {model_id}:** {elapsed_time:.2f} seconds")
+        elapsed_time = end_time - start_time
+        print(f"**Time Elapsed for {model_id}:** {elapsed_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
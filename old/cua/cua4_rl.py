@@ -1,15 +1,37 @@
 import os
-import subprocess
+import asyncio
+import threading
+import contextvars
 import requests
 import time
 import json
 from typing import Any, Dict, List, Optional
 import uuid
+import shutil
 import random
 import numpy as np
 import re
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from collections import deque
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
+from response_cache import ResponseCache
+from shell_exec import ShellExecutor
+from qtable import QTable
+from bandits import RunningStats, make_strategy, stand_ins
+from warm_pytest import PytestWorker, format_report, strip_timings
+from tracing import current_span, record_http, traced, tracer
+from prompt_builder import FeedbackBuffer, IncrementalPromptBuilder, estimate_tokens, truncate_tokens
+from http_client import HTTPClient, shared_client
+from candidates import GenerationCancelled, best_of_n, pick_best, screen_candidate
+from consensus import ConsensusController
+from local_inference import LocalEngine, TransformersBackend, mount_local
+from run_store import RunStore
+from artifact_store import ArtifactStore, atomic_write
+from hedging import HedgeCancelled, Hedger
+from checkpoint import load_checkpoint, save_checkpoint
+from replay_buffer import ReplayBuffer, train_offline
+from tool_parser import IncrementalToolParser, dispatch_blocks, parse_file_command, parse_tool_blocks
+from structured_output import RETRYABLE, Schema, disable_json_mode, json_mode_supported, parse_reply, parse_stats, rejects_json_mode, retry_messages
 
 class OpenRouter:
     def __init__(self, id: str, api_key: str, base_url: str):
@@ -18,28 +40,46 @@ class OpenRouter:
         self.base_url = base_url
 
 class ShellTools:
+    def __init__(self, timeout: float = 60.0, max_output_bytes: int = 64 * 1024, max_concurrent: int = 4):
+        self.executor = ShellExecutor(timeout, max_output_bytes, max_concurrent)
+
+    def run(self, command: str) -> Dict:
+        return self.executor.run(command)
+
+    async def arun(self, command: str) -> Dict:
+        return await self.executor.arun(command)
+
     def execute(self, command: str) -> str:
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-            return result.stdout or "Command executed (no output)"
-        except subprocess.CalledProcessError as e:
-            return f"Error: {e.stderr}"
+            result = self.run(command)
         except Exception as e:
             return f"Unexpected error: {str(e)}"
+        if result["timed_out"]:
+            return f"Error: command timed out after {self.executor.timeout:.0f}s\n{result['stderr']}"
+        if result["exit_code"] != 0:
+            return f"Error: {result['stderr']}"
+        return result["stdout"] or "Command executed (no output)"
 
 class FileTools:
+    def __init__(self, store: Optional[ArtifactStore] = None):
+        # With a store every saved version is kept by hash and reads come from memory
+        self.store = store
+
     def save(self, content: str, filename: str, output_dir: str) -> str:
         try:
-            os.makedirs(output_dir, exist_ok=True)
             filepath = os.path.join(output_dir, filename)
-            with open(filepath, 'w') as f:
-                f.write(content)
+            if self.store is not None:
+                self.store.write_file(output_dir, filename, content)
+            else:
+                atomic_write(filepath, content.encode("utf-8"))
             return f"Saved to {filepath}"
         except Exception as e:
             return f"Error saving file: {str(e)}"
 
     def read(self, filename: str, output_dir: str) -> str:
         try:
+            if self.store is not None:
+                return self.store.read_file(output_dir, filename)
             filepath = os.path.join(output_dir, filename)
             with open(filepath, 'r') as f:
                 return f.read()
@@ -47,23 +87,42 @@ class FileTools:
             return f"Error reading file: {str(e)}"
 
 class Agent:
-    def __init__(self, model: OpenRouter, tools: List[Any], show_tool_calls: bool = False):
+    def __init__(self, model: OpenRouter, tools: List[Any], show_tool_calls: bool = False, stream: bool = False, max_tool_workers: int = 4,
+                 hedge_models: Optional[List[OpenRouter]] = None, hedger: Optional[Hedger] = None, session: Optional[HTTPClient] = None):
         self.model = model
         self.tools = {tool.__class__.__name__: tool for tool in tools}
         self.show_tool_calls = show_tool_calls
-        self.session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        self.stream = stream
+        self.stream_stats = {}
+        self.max_tool_workers = max_tool_workers
+        self.tool_results = []
+        self.hedge_models = hedge_models or []
+        self.hedger = hedger if hedger is not None else (Hedger() if self.hedge_models else None)
+        # A hedged attempt that keeps failing should hand over to the next model, not sit through the full backoff
+        self.retry_policy = {"max_retries": 1, "backoff_factor": 0.5} if self.hedger is not None else {}
+        self.session = session if session is not None else shared_client()
 
+    @traced("agent.call_api")
     def _call_api(self, prompt: str, max_tokens: int = 2000) -> Dict:
+        if self.hedger is None:
+            return self._send(self.model, prompt, max_tokens)
+        result, model = self.hedger.call([self.model] + self.hedge_models, lambda model, cancel: self._hedge_attempt(model, prompt, max_tokens, cancel))
+        current_span().set(hedge_winner=model.id)
+        return result
+
+    def _hedge_attempt(self, model: OpenRouter, prompt: str, max_tokens: int, cancel: threading.Event) -> Dict:
+        with tracer.span("agent.hedge_attempt", model=model.id):
+            return self._send(model, prompt, max_tokens, cancel)
+
+    def _send(self, model: OpenRouter, prompt: str, max_tokens: int, cancel: Optional[threading.Event] = None) -> Dict:
         headers = {
-            "Authorization": f"Bearer {self.model.api_key}",
+            "Authorization": f"Bearer {model.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "http://localhost",
             "X-Title": "Code Generation Agent"
         }
         data = {
-            "model": self.model.id,
+            "model": model.id,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7,
             "max_tokens": max_tokens
@@ -71,60 +130,225 @@ class Agent:
         
         try:
             response = self.session.post(
-                f"{self.model.base_url}/chat/completions",
+                f"{model.base_url}/chat/completions",
                 headers=headers,
                 json=data,
-                timeout=20
+                timeout=20,
+                # Hedged attempts defer the body so a loser can hang up without downloading it
+                stream=cancel is not None,
+                **self.retry_policy
             )
-            print(f"Model: {self.model.id}, Status: {response.status_code}, Response: {response.text[:200]}...")
+            record_http(response, model.id)
+            if cancel is not None and cancel.is_set():
+                response.close()
+                raise HedgeCancelled(f"{model.id} lost the hedge")
+            print(f"Model: {model.id}, Status: {response.status_code}, Response: {response.text[:200]}...")
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
-            error_msg = f"API call failed for model {self.model.id}: {str(e)}"
+            error_msg = f"API call failed for model {model.id}: {str(e)}"
             if 'response' in locals():
                 error_msg += f"\nStatus Code: {response.status_code}\nResponse Text: {response.text}"
             raise Exception(error_msg)
 
-    def _execute_tools(self, content: str, output_dir: str) -> str:
-        for tool_name, tool in self.tools.items():
-            start_tag = f"[{tool_name}]"
-            end_tag = f"[/{tool_name}]"
-            if start_tag in content and end_tag in content:
-                start_idx = content.index(start_tag) + len(start_tag)
-                end_idx = content.index(end_tag)
-                cmd = content[start_idx:end_idx].strip()
-                if tool_name == "ShellTools":
-                    result = tool.execute(cmd)
-                elif tool_name == "FileTools":
-                    match = re.match(r"^(save|read):(.+?):(.+)$", cmd, re.DOTALL)
-                    if match:
-                        op, content_or_file, filename = match.groups()
-                        if op == "save":
-                            cleaned_content = re.sub(r'```python\n|```', '', content_or_file).strip()
-                            result = tool.save(cleaned_content, filename.strip(), output_dir)
-                        elif op == "read":
-                            result = tool.read(content_or_file.strip(), output_dir)
-                    else:
-                        result = f"Invalid FileTools command: {cmd}"
-                else:
-                    result = "Unknown tool"
-                if self.show_tool_calls:
-                    return f"**Tool Call:** {tool_name}.execute('{cmd}')\n**Result:**\n```\n{result}\n```"
-                return result
-        return content
+    def _open_stream(self, prompt: str, max_tokens: int):
+        if self.hedger is None:
+            return self._stream_api(prompt, max_tokens), self.model
+        # Hedged on the first token; tools only run once a winner is picked, so losers never touch the workspace
+        stream, model = self.hedger.call([self.model] + self.hedge_models, lambda model, cancel: self._hedge_stream(model, prompt, max_tokens, cancel))
+        current_span().set(hedge_winner=model.id)
+        return stream, model
+
+    def _hedge_stream(self, model: OpenRouter, prompt: str, max_tokens: int, cancel: threading.Event):
+        with tracer.span("agent.hedge_attempt", model=model.id):
+            stream = self._stream_api(prompt, max_tokens, model)
+            first = next(stream, None)
+            if cancel.is_set():
+                stream.close()
+                raise HedgeCancelled(f"{model.id} lost the hedge")
+
+        def resumed():
+            try:
+                if first is not None:
+                    yield first
+                yield from stream
+            finally:
+                stream.close()
+        return resumed()
+
+    def _stream_api(self, prompt: str, max_tokens: int = 2000, model: Optional[OpenRouter] = None):
+        model = model or self.model
+        headers = {
+            "Authorization": f"Bearer {model.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "http://localhost",
+            "X-Title": "Code Generation Agent"
+        }
+        data = {
+            "model": model.id,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+
+        try:
+            response = self.session.post(
+                f"{model.base_url}/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=20,
+                stream=True,
+                **self.retry_policy
+            )
+            record_http(response, model.id)
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                # SSE comments (": OPENROUTER PROCESSING") and blank keep-alives carry no data
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload).get("choices", [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        except (requests.RequestException, json.JSONDecodeError) as e:
+            error_msg = f"API call failed for model {model.id}: {str(e)}"
+            if 'response' in locals():
+                error_msg += f"\nStatus Code: {response.status_code}"
+            raise Exception(error_msg)
+        finally:
+            if 'response' in locals():
+                response.close()
+
+    @traced("agent.tool")
+    def _run_tool(self, tool_name: str, cmd: str, output_dir: str) -> str:
+        tool = self.tools[tool_name]
+        if tool_name == "ShellTools":
+            result = tool.execute(cmd)
+        elif tool_name == "FileTools":
+            parsed = parse_file_command(cmd)
+            if parsed:
+                op, content_or_file, filename = parsed
+                if op == "save":
+                    cleaned_content = re.sub(r'```python\n|```', '', content_or_file).strip()
+                    result = tool.save(cleaned_content, filename, output_dir)
+                elif op == "read":
+                    result = tool.read(content_or_file.strip(), output_dir)
+            else:
+                result = f"Invalid FileTools command: {cmd}"
+        else:
+            result = "Unknown tool"
+        return result
 
-    def run(self, prompt: str, max_tokens: int = 2000, output_dir: str = ".") -> str:
-        api_response = self._call_api(prompt, max_tokens)
-        content = api_response.get("choices", [{}])[0].get("message", {}).get("content", prompt)
-        return self._execute_tools(content, output_dir)
+    @traced("agent.execute_tools")
+    def _execute_tools(self, content: str, output_dir: str) -> List[Dict]:
+        blocks = parse_tool_blocks(content, self.tools.keys())
+        return dispatch_blocks(blocks, lambda block: self._run_tool(block.tool_name, block.command, output_dir), self.max_tool_workers)
+
+    def _format_tool_results(self, results: List[Dict]) -> str:
+        if self.show_tool_calls:
+            return "\n".join(
+                f"**Tool Call:** {r['tool']}.execute('{r['command']}') ({r['duration']:.2f}s)\n**Result:**\n```\n{r['result']}\n```"
+                for r in results
+            )
+        return "\n".join(r["result"] for r in results)
+
+    @traced("agent.stream")
+    def _run_streaming(self, prompt: str, max_tokens: int, output_dir: str, cancel: Optional[threading.Event] = None) -> str:
+        parser = IncrementalToolParser(self.tools.keys())
+        start_time = time.time()
+        stats = {"time_to_first_token": None, "time_to_first_tool": None, "tool_calls": 0}
+        futures = []
+        # A single worker keeps blocks in order while the stream keeps being read
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            stream, model = self._open_stream(prompt, max_tokens)
+            for delta in stream:
+                if cancel is not None and cancel.is_set():
+                    stream.close()
+                    raise GenerationCancelled()
+                if stats["time_to_first_token"] is None:
+                    stats["time_to_first_token"] = time.time() - start_time
+                for block in parser.feed(delta):
+                    if stats["time_to_first_tool"] is None:
+                        stats["time_to_first_tool"] = time.time() - start_time
+                    stats["tool_calls"] += 1
+                    futures.append(executor.submit(contextvars.copy_context().run, dispatch_blocks, [block], lambda b: self._run_tool(b.tool_name, b.command, output_dir), 1))
+            results = [future.result()[0] for future in futures]
+        for index, result in enumerate(results):
+            result["index"] = index
+        stats["total_time"] = time.time() - start_time
+        self.stream_stats = stats
+        ttft, ttf_tool = (f"{stats[k]:.2f}s" if stats[k] is not None else "n/a" for k in ("time_to_first_token", "time_to_first_tool"))
+        print(f"Model: {model.id}, Streamed: first token {ttft}, first tool {ttf_tool}, {stats['tool_calls']} tool calls in {stats['total_time']:.2f}s")
+        self.tool_results = results
+        if not results:
+            return parser.buffer or prompt
+        return self._format_tool_results(results)
+
+    def _collect_stream(self, prompt: str, max_tokens: int, cancel: threading.Event) -> str:
+        # A cancellable call is streamed under the hood: a plain request can only be abandoned once the
+        # whole completion is back, while hanging up a stream stops the generation itself
+        stream, _ = self._open_stream(prompt, max_tokens)
+        parts = []
+        for delta in stream:
+            if cancel.is_set():
+                stream.close()
+                raise GenerationCancelled()
+            parts.append(delta)
+        return "".join(parts) or prompt
+
+    def run(self, prompt: str, max_tokens: int = 2000, output_dir: str = ".", cancel: Optional[threading.Event] = None) -> str:
+        if self.stream:
+            return self._run_streaming(prompt, max_tokens, output_dir, cancel)
+        if cancel is not None:
+            content = self._collect_stream(prompt, max_tokens, cancel)
+        else:
+            api_response = self._call_api(prompt, max_tokens)
+            content = api_response.get("choices", [{}])[0].get("message", {}).get("content", prompt)
+        self.tool_results = self._execute_tools(content, output_dir)
+        if not self.tool_results:
+            return content
+        return self._format_tool_results(self.tool_results)
+
+EVALUATION_SCHEMA = Schema({"score": int, "functionality_feedback": str, "quality_feedback": str}, required=["score"], bounds={"score": (0, 100)})
+ALGORITHM_SCHEMA = Schema({"name": str, "description": str, "pseudo_code": str}, required=["name"])
+
+def request_structured(session, model: OpenRouter, headers: Dict, data: Dict, schema: Schema, source: str,
+                       parse_retries: int = 1, timeout: float = 20) -> Dict:
+    # Asks for JSON mode unless the model has refused it before, parses whatever comes back
+    # (fenced, wrapped in prose, truncated) and only pays for another call when nothing usable was found
+    messages = data["messages"]
+    for attempt in range(parse_retries + 1):
+        body = dict(data, messages=messages)
+        if json_mode_supported(model.id):
+            body["response_format"] = {"type": "json_object"}
+        response = session.post(f"{model.base_url}/chat/completions", headers=headers, json=body, timeout=timeout)
+        record_http(response, model.id)
+        if "response_format" in body and rejects_json_mode(response):
+            disable_json_mode(model.id)
+            body = dict(data, messages=messages)
+            response = session.post(f"{model.base_url}/chat/completions", headers=headers, json=body, timeout=timeout)
+            record_http(response, model.id)
+        response.raise_for_status()
+        content = response.json().get("choices", [{}])[0].get("message", {}).get("content") or ""
+        parsed = parse_reply(content, schema)
+        parse_stats.record(source, parsed["status"], retry=attempt > 0)
+        if parsed["status"] not in RETRYABLE:
+            break
+        messages = retry_messages(data["messages"], content, parsed, schema)
+    parsed.update(content=content, attempts=attempt + 1)
+    return parsed
 
 class EvaluatorAgent:
-    def __init__(self, model: OpenRouter):
+    def __init__(self, model: OpenRouter, session: Optional[HTTPClient] = None, cache: Optional[ResponseCache] = None, parse_retries: int = 1):
         self.model = model
-        self.session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        self.cache = cache
+        self.parse_retries = parse_retries
+        self.session = session if session is not None else shared_client()
 
+    @traced("evaluator.evaluate_code")
     def evaluate_code(self, code: str, project_type: str, project_description: str, test_results: str) -> Dict:
         prompt = (
             f"You are an expert code reviewer. Evaluate the following code for a {project_type} project ({project_description}):\n\n"
@@ -147,24 +371,30 @@ class EvaluatorAgent:
             "temperature": 0.5,
             "max_tokens": 500
         }
+        # Keyed on the results, not on how long the run took, so re-evaluating the same code hits
+        key_prompt = prompt.replace(f"Test Results:\n{test_results}\n", f"Test Results:\n{strip_timings(test_results)}\n")
+        cache_key = ResponseCache.key(dict(data, messages=[{"role": "user", "content": key_prompt}])) if self.cache else None
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                current_span().set(cache_hit=True)
+                return cached
         
         try:
-            response = self.session.post(
-                f"{self.model.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=20
-            )
-            response.raise_for_status()
-            content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}, Raw response: {content}")
-                return {"score": 0, "functionality_feedback": f"Invalid JSON response: {content}", "quality_feedback": ""}
+            parsed = request_structured(self.session, self.model, headers, data, EVALUATION_SCHEMA, f"evaluator/{self.model.id}", self.parse_retries)
+            current_span().set(parse_status=parsed["status"], parse_attempts=parsed["attempts"])
+            if parsed["value"] is None:
+                print(f"Unusable evaluator reply ({'; '.join(parsed['errors'])}), Raw response: {parsed['content']}")
+                return {"score": 0, "functionality_feedback": f"Invalid JSON response: {parsed['content']}", "quality_feedback": "", "error": True}
+            result = parsed["value"]
+            if self.cache:
+                self.cache.set(cache_key, result)
+            return result
         except requests.RequestException as e:
-            print(f"API call failed: {str(e)}, Response: {response.text if 'response' in locals() else 'N/A'}")
-            return {"score": 0, "functionality_feedback": f"Evaluation failed: {str(e)}", "quality_feedback": ""}
+            print(f"API call failed: {str(e)}, Response: {getattr(e.response, 'text', 'N/A')}")
+            return {"score": 0, "functionality_feedback": f"Evaluation failed: {str(e)}", "quality_feedback": "", "error": True}
+
+ACTIONS = ["improve_modularity", "add_features", "fix_bugs"]
 
 class RLAlgorithm:
     def __init__(self, name: str):
@@ -178,52 +408,73 @@ class RLAlgorithm:
     def get_action(self, state: str) -> str:
         raise NotImplementedError
 
-class QLearning(RLAlgorithm):
-    def __init__(self, alpha: float = 0.1, gamma: float = 0.9, epsilon: float = 0.1):
-        super().__init__("Q-Learning")
+    def update_batch(self, states: List[str], actions: List[str], rewards: List[float], next_states: List[str], next_actions: Optional[List[str]] = None):
+        for i, (state, action, reward, next_state) in enumerate(zip(states, actions, rewards, next_states)):
+            self.update(state, action, reward, next_state, next_actions[i] if next_actions is not None else None)
+
+    def get_actions(self, states: List[str]) -> List[str]:
+        return [self.get_action(state) for state in states]
+
+class TabularRLAlgorithm(RLAlgorithm):
+    def __init__(self, name: str, alpha: float, gamma: float, epsilon: float):
+        super().__init__(name)
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        self.q_table = QTable(ACTIONS)
+
+    def get_action(self, state: str) -> str:
+        if random.random() < self.epsilon:
+            return random.choice(ACTIONS)
+        best = self.q_table.best_action(state)
+        if best is None:
+            return random.choice(ACTIONS)
+        return best
+
+    def get_actions(self, states: List[str]) -> List[str]:
+        greedy = self.q_table.best_actions(np.array([self.q_table.state_id(state) for state in states], dtype=np.int64))
+        explore = np.random.random(len(states)) < self.epsilon
+        return [random.choice(ACTIONS) if explore[i] or greedy[i] is None else greedy[i] for i in range(len(states))]
+
+class QLearning(TabularRLAlgorithm):
+    def __init__(self, alpha: float = 0.1, gamma: float = 0.9, epsilon: float = 0.1):
+        super().__init__("Q-Learning", alpha, gamma, epsilon)
 
     def update(self, state: str, action: str, reward: float, next_state: str, next_action: Optional[str] = None) -> str:
-        self.q_table.setdefault(state, {})
-        self.q_table[state].setdefault(action, 0.0)
-        next_q = max(self.q_table.get(next_state, {}).values(), default=0.0)
-        self.q_table[state][action] += self.alpha * (reward + self.gamma * next_q - self.q_table[state][action])
+        s, a = self.q_table.touch(state, action)
+        next_q = self.q_table.max_value(next_state)
+        self.q_table.values[s, a] += self.alpha * (reward + self.gamma * next_q - self.q_table.values[s, a])
         return action
 
-    def get_action(self, state: str) -> str:
-        if random.random() < self.epsilon:
-            return random.choice(["improve_modularity", "add_features", "fix_bugs"])
-        self.q_table.setdefault(state, {})
-        if not self.q_table[state]:
-            return random.choice(["improve_modularity", "add_features", "fix_bugs"])
-        return max(self.q_table[state].items(), key=lambda x: x[1])[0]
+    def update_batch(self, states: List[str], actions: List[str], rewards: List[float], next_states: List[str], next_actions: Optional[List[str]] = None):
+        # Targets are computed from the table as it stands before the batch (minibatch semantics)
+        s, a = self.q_table.ids(states, actions)
+        ns = np.array([self.q_table.state_id(state) for state in next_states], dtype=np.int64)
+        self.q_table.seen[s, a] = True
+        targets = np.asarray(rewards, dtype=np.float64) + self.gamma * self.q_table.max_values(ns)
+        self.q_table.move_toward(s, a, targets, self.alpha)
 
-class SARSA(RLAlgorithm):
+class SARSA(TabularRLAlgorithm):
     def __init__(self, alpha: float = 0.1, gamma: float = 0.9, epsilon: float = 0.1):
-        super().__init__("SARSA")
-        self.alpha = alpha
-        self.gamma = gamma
-        self.epsilon = epsilon
+        super().__init__("SARSA", alpha, gamma, epsilon)
 
     def update(self, state: str, action: str, reward: float, next_state: str, next_action: Optional[str] = None) -> str:
         if next_action is None:
             next_action = self.get_action(next_state)
-        self.q_table.setdefault(state, {})
-        self.q_table[state].setdefault(action, 0.0)
-        self.q_table.setdefault(next_state, {})
-        self.q_table[next_state].setdefault(next_action, 0.0)
-        self.q_table[state][action] += self.alpha * (reward + self.gamma * self.q_table[next_state][next_action] - self.q_table[state][action])
+        s, a = self.q_table.touch(state, action)
+        ns, na = self.q_table.touch(next_state, next_action)
+        self.q_table.values[s, a] += self.alpha * (reward + self.gamma * self.q_table.values[ns, na] - self.q_table.values[s, a])
         return next_action
 
-    def get_action(self, state: str) -> str:
-        if random.random() < self.epsilon:
-            return random.choice(["improve_modularity", "add_features", "fix_bugs"])
-        self.q_table.setdefault(state, {})
-        if not self.q_table[state]:
-            return random.choice(["improve_modularity", "add_features", "fix_bugs"])
-        return max(self.q_table[state].items(), key=lambda x: x[1])[0]
+    def update_batch(self, states: List[str], actions: List[str], rewards: List[float], next_states: List[str], next_actions: Optional[List[str]] = None):
+        if next_actions is None:
+            next_actions = self.get_actions(next_states)
+        s, a = self.q_table.ids(states, actions)
+        ns, na = self.q_table.ids(next_states, next_actions)
+        self.q_table.seen[s, a] = True
+        self.q_table.seen[ns, na] = True
+        targets = np.asarray(rewards, dtype=np.float64) + self.gamma * self.q_table.values[ns, na]
+        self.q_table.move_toward(s, a, targets, self.alpha)
 
 class PPO(RLAlgorithm):
     def __init__(self, clip_ratio: float = 0.2):
@@ -244,33 +495,79 @@ class PPO(RLAlgorithm):
     def get_action(self, state: str) -> str:
         self.policy.setdefault(state, {})
         if not self.policy[state]:
-            self.policy[state] = {"improve_modularity": 1/3, "add_features": 1/3, "fix_bugs": 1/3}
+            self.policy[state] = {action: 1 / len(ACTIONS) for action in ACTIONS}
         actions, probs = zip(*self.policy[state].items())
         return np.random.choice(actions, p=probs)
 
 class MetaAgent:
-    def __init__(self, algorithms: List[RLAlgorithm]):
+    def __init__(self, algorithms: List[RLAlgorithm], strategy: str = "greedy", window: Optional[int] = None):
         self.algorithms = algorithms
-        self.scores = {alg.name: [] for alg in algorithms}
+        self.by_name = {alg.name: alg for alg in algorithms}
+        self.names = [alg.name for alg in algorithms]
+        self.strategy_name = strategy
+        self.strategy = make_strategy(strategy)
+        self.stats = {alg.name: RunningStats() for alg in algorithms}
+        # With a window only the last `window` pulls count, across all algorithms, so a rarely
+        # chosen algorithm's old scores age out as fast as everyone else's
+        self.window = window
+        self.events = deque()
+        self.total = 0
         self.current_algo = algorithms[0]
 
     def select_algorithm(self) -> RLAlgorithm:
-        if not any(self.scores.values()):
-            return self.current_algo
-        avg_scores = {name: np.mean(scores) if scores else 0 for name, scores in self.scores.items()}
-        self.current_algo = max(avg_scores.items(), key=lambda x: x[1])[0]
-        return next(alg for alg in self.algorithms if alg.name == self.current_algo)
+        name = self.strategy.select(self.names, self.stats, self.total)
+        if name is not None:
+            self.current_algo = self.by_name[name]
+        return self.current_algo
 
     def update_score(self, algo_name: str, score: float):
-        self.scores[algo_name].append(score)
+        self.stats[algo_name].push(score)
+        self.total += 1
+        if self.window:
+            self.events.append((algo_name, score))
+            if len(self.events) > self.window:
+                name, old = self.events.popleft()
+                self.stats[name].remove(old)
+                self.total -= 1
+
+    def state_dict(self) -> Dict:
+        state = {"strategy": self.strategy_name, "stats": {name: stats.state_dict() for name, stats in self.stats.items()}}
+        if self.window:
+            state["events"] = [list(event) for event in self.events]
+        return state
+
+    def load_state_dict(self, state: Dict):
+        saved = dict(state.get("stats", {}))
+        # Older checkpoints stored the raw score lists
+        saved.update({name: {"values": scores} for name, scores in state.get("scores", {}).items()})
+        saved = {name: stats_state for name, stats_state in saved.items() if name in self.stats}
+        if not self.window:
+            for name, stats_state in saved.items():
+                self.stats[name].load_state_dict(stats_state)
+            self.total = sum(stats.count for stats in self.stats.values())
+            return
+        if "events" in state:
+            events = [tuple(event) for event in state["events"]]
+        else:
+            # Summaries keep no order between algorithms, so each one's scores are interleaved before the window is cut
+            per_algorithm = [[(name, score) for score in stats_state.get("values", stand_ins(stats_state, self.window))]
+                             for name, stats_state in saved.items()]
+            events = [event for group in zip_longest(*per_algorithm) for event in group if event is not None]
+        self.stats = {name: RunningStats() for name in self.names}
+        self.events = deque()
+        self.total = 0
+        for name, score in events:
+            if name in self.stats:
+                self.update_score(name, score)
 
 class RLGeneratorAgent:
-    def __init__(self, model: OpenRouter):
+    def __init__(self, model: OpenRouter, cache: Optional[ResponseCache] = None, session: Optional[HTTPClient] = None, parse_retries: int = 1):
         self.model = model
-        self.session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        self.cache = cache
+        self.parse_retries = parse_retries
+        self.session = session if session is not None else shared_client()
 
+    @traced("rl_generator.generate_algorithm")
     def generate_algorithm(self, existing_algorithms: List[str]) -> Dict:
         prompt = (
             f"You are an RL expert. Propose a new RL algorithm by combining or modifying existing ones ({', '.join(existing_algorithms)}).\n"
@@ -288,31 +585,38 @@ class RLGeneratorAgent:
             "temperature": 0.8,
             "max_tokens": 1000
         }
+        cache_key = ResponseCache.key(data) if self.cache else None
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                current_span().set(cache_hit=True)
+                return cached
         
         try:
-            response = self.session.post(
-                f"{self.model.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=20
-            )
-            response.raise_for_status()
-            content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error in RLGenerator: {e}, Raw response: {content}")
-                return {"name": "Error", "description": f"Invalid JSON response: {content}", "pseudo_code": ""}
+            parsed = request_structured(self.session, self.model, headers, data, ALGORITHM_SCHEMA, f"rl_generator/{self.model.id}", self.parse_retries)
+            current_span().set(parse_status=parsed["status"], parse_attempts=parsed["attempts"])
+            if parsed["value"] is None:
+                print(f"Unusable RLGenerator reply ({'; '.join(parsed['errors'])}), Raw response: {parsed['content']}")
+                return {"name": "Error", "description": f"Invalid JSON response: {parsed['content']}", "pseudo_code": ""}
+            result = parsed["value"]
+            if self.cache:
+                self.cache.set(cache_key, result)
+            return result
         except requests.RequestException as e:
-            print(f"API call failed in RLGenerator: {str(e)}, Response: {response.text if 'response' in locals() else 'N/A'}")
+            print(f"API call failed in RLGenerator: {str(e)}, Response: {getattr(e.response, 'text', 'N/A')}")
             return {"name": "Error", "description": f"Generation failed: {str(e)}", "pseudo_code": ""}
 
+RUN_STATE_FILE = "run_state.ckpt"
+
 class RLSimulation:
-    def __init__(self, generator: Agent, evaluators: List[EvaluatorAgent], rl_generator: RLGeneratorAgent, config_file: str, max_iterations: int = 3):
+    def __init__(self, generator: Agent, evaluators: List[EvaluatorAgent], rl_generator: RLGeneratorAgent, config_file: str, max_iterations: int = 3, max_concurrent_evaluations: int = 5, output_root: str = "",
+                 replay_file: Optional[str] = None, replay_capacity: int = 10000, checkpoint_file: Optional[str] = None,
+                 test_worker: Optional[PytestWorker] = None, run_store: Optional[RunStore] = None, resume_dir: Optional[str] = None):
         self.generator = generator
         self.evaluators = evaluators
         self.rl_generator = rl_generator
         self.max_iterations = max_iterations
+        self.max_concurrent_evaluations = max(1, max_concurrent_evaluations)
         self.history = []
         self.config = self._load_config(config_file)
         self.algorithms = [
@@ -320,17 +624,143 @@ class RLSimulation:
             SARSA(),
             PPO()
         ]
-        self.meta_agent = MetaAgent(self.algorithms)
+        self.meta_agent = MetaAgent(self.algorithms, strategy=self.config.get("meta_strategy", "greedy"), window=self.config.get("meta_window"))
         self.state = "initial"
-        self.output_dir = self._create_output_dir()
+        self.output_root = output_root
+        self.output_dir = resume_dir if resume_dir else self._create_output_dir()
+        self.test_worker = test_worker
+        self.test_report = None
+        self.prompt_builder = IncrementalPromptBuilder(diffs=False) if self.config.get("incremental_prompts") else None
+        # Without incremental prompts the generator sees only the latest feedback, as it always did, cut to the same budget
+        self.feedback_budget = self.config.get("feedback_token_budget", 1000)
+        self.feedback_buffer = FeedbackBuffer(self.feedback_budget) if self.config.get("incremental_prompts") else None
+        self.last_feedback = ""
+        self.candidates = max(1, self.config.get("candidates", 1))
+        self.candidate_results = None
+        # e.g. "consensus": {"ci_width": 10, "costs": {"openai/gpt-4o": 5}} stops asking evaluators once they agree
+        self.consensus = ConsensusController(**self.config["consensus"]) if self.config.get("consensus") else None
+        self.consensus_decision = None
+        self.run_store = run_store
+        self.run_id = None
+        self.start_iteration = 0
+        self.pending = None
+        self.checkpoint_file = checkpoint_file
+        self.resumed = self._load_run_state() if resume_dir else False
+        self.warm_started = self.resumed or self._load_checkpoint()
+        self.replay_file = replay_file
+        self.replay_buffer = self._load_replay_buffer(replay_capacity)
+        if self.resumed:
+            # Transitions of the interrupted run were never written to the replay file
+            for entry in self.history:
+                if "action" in entry:
+                    self.replay_buffer.add(entry["state"], entry["action"], entry["score"] / 100, entry["next_state"], entry.get("next_action"), entry["rl_algorithm"])
+
+    def _load_checkpoint(self) -> bool:
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return False
+        try:
+            load_checkpoint(self.checkpoint_file, self.algorithms, self.meta_agent)
+        except Exception as e:
+            print(f"Failed to load checkpoint: {str(e)}")
+            return False
+        print(f"Warm-started RL state from {self.checkpoint_file}")
+        return True
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_file:
+            return
+        try:
+            save_checkpoint(self.checkpoint_file, self.algorithms, self.meta_agent)
+        except Exception as e:
+            print(f"Failed to save checkpoint: {str(e)}")
+
+    def _save_run_state(self, completed: int, pending: Optional[Dict] = None):
+        # Everything the loop needs to continue in this output directory; `pending` holds the
+        # finished API results of an iteration that has not completed yet
+        state = {
+            "completed": completed,
+            "state": self.state,
+            "history": self.history,
+            "feedback": self.feedback_buffer.state_dict() if self.feedback_buffer is not None else None,
+            "last_feedback": self.last_feedback,
+            "prompt_builder": self.prompt_builder.state_dict() if self.prompt_builder is not None else None,
+            "run_id": self.run_id,
+            "consensus": self.consensus.state_dict() if self.consensus is not None else None,
+            "pending": pending
+        }
+        try:
+            save_checkpoint(os.path.join(self.output_dir, RUN_STATE_FILE), self.algorithms, self.meta_agent, extra=state)
+        except Exception as e:
+            print(f"Failed to save run state: {str(e)}")
+
+    def _load_run_state(self) -> bool:
+        path = os.path.join(self.output_dir, RUN_STATE_FILE)
+        if not os.path.exists(path):
+            print(f"No run state in {self.output_dir}; starting from the first iteration")
+            return False
+        state = load_checkpoint(path, self.algorithms, self.meta_agent)
+        self.start_iteration = state["completed"]
+        self.state = state["state"]
+        self.history = state["history"]
+        if self.feedback_buffer is not None and state["feedback"] is not None:
+            self.feedback_buffer.load_state_dict(state["feedback"])
+        self.last_feedback = state.get("last_feedback", "")
+        if self.prompt_builder is not None and state["prompt_builder"] is not None:
+            self.prompt_builder.load_state_dict(state["prompt_builder"])
+        self.run_id = state["run_id"]
+        if self.consensus is not None and state.get("consensus") is not None:
+            self.consensus.load_state_dict(state["consensus"])
+        self.pending = state["pending"]
+        print(f"Resuming {self.output_dir} after {self.start_iteration} completed iteration(s)")
+        return True
+
+    def _load_replay_buffer(self, capacity: int) -> ReplayBuffer:
+        if not self.replay_file or not os.path.exists(self.replay_file):
+            return ReplayBuffer(capacity)
+        try:
+            buffer = ReplayBuffer.load(self.replay_file, capacity)
+        except Exception as e:
+            print(f"Failed to load replay buffer: {str(e)}")
+            return ReplayBuffer(capacity)
+        if self.warm_started:
+            # The checkpoint already reflects these transitions; replaying them would count them twice
+            return buffer
+        # Transitions paid for by earlier runs warm up every algorithm before the first API call
+        for algo in self.algorithms:
+            train_offline(algo, buffer)
+        print(f"Replayed {len(buffer)} stored transitions into {len(self.algorithms)} algorithms")
+        return buffer
+
+    def restore_best(self) -> Optional[Dict]:
+        # Put the best-scoring iteration's files back in output_dir, straight from the artifact store
+        store = getattr(self.generator.tools.get("FileTools"), "store", None)
+        best = store.best(self.output_dir) if store is not None else None
+        if best is None:
+            return None
+        store.restore(self.output_dir, best["iteration"])
+        print(f"Restored files from iteration {best['iteration']} (score {best['score']})")
+        return best
+
+    def _record_iteration(self):
+        if self.run_store is None or self.run_id is None:
+            return
+        try:
+            self.run_store.record_iteration(self.run_id, self.history[-1])
+        except Exception as e:
+            print(f"Failed to record iteration: {str(e)}")
 
     def _create_output_dir(self) -> str:
+        if self.output_root:
+            os.makedirs(self.output_root, exist_ok=True)
         n = 1
-        while os.path.exists(f"output_{n}"):
-            n += 1
-        output_dir = f"output_{n}"
-        os.makedirs(output_dir, exist_ok=True)
-        return output_dir
+        while True:
+            output_dir = os.path.join(self.output_root, f"output_{n}")
+            # mkdir is atomic, so concurrent runs can never claim the same directory
+            try:
+                os.mkdir(output_dir)
+                return output_dir
+            except FileExistsError:
+                n += 1
 
     def _load_config(self, config_file: str) -> Dict:
         try:
@@ -342,7 +772,19 @@ class RLSimulation:
         except Exception as e:
             raise Exception(f"Failed to load config: {str(e)}")
 
+    @traced("simulation.run_tests")
     def _run_tests(self) -> str:
+        self.test_report = None
+        if self.test_worker is not None:
+            try:
+                self.test_report = self.test_worker.run(
+                    self.output_dir,
+                    self.config["test_file"],
+                    files=[self.config["library_file"], self.config["main_file"]]
+                )
+            except Exception as e:
+                return f"Test execution failed: {str(e)}"
+            return format_report(self.test_report)
         shell_tools = self.generator.tools.get("ShellTools")
         if not shell_tools:
             return "ShellTools not available"
@@ -357,98 +799,235 @@ class RLSimulation:
         except Exception as e:
             return f"Test execution failed: {str(e)}"
 
+    @traced("simulation.candidates")
+    def _generate_candidates(self, prompt: str, iteration: int) -> str:
+        scratch_root = os.path.join(self.output_dir, "candidates", f"iteration_{iteration}")
+        files = [self.config["library_file"], self.config["main_file"]]
+        test_file = self.config["test_file"]
+
+        def scratch(index: int) -> str:
+            return os.path.join(scratch_root, f"candidate_{index}")
+
+        results = best_of_n(
+            lambda index, cancel: self.generator.run(prompt, max_tokens=3000, output_dir=scratch(index), cancel=cancel),
+            lambda index: screen_candidate(scratch(index), files, test_file, self.test_worker),
+            self.candidates,
+            threshold=self.config.get("candidate_threshold", 1.0)
+        )
+        self.candidate_results = [{k: r.get(k) for k in ("index", "status", "score", "compiled", "passed", "failed", "duration", "error") if k in r} for r in results]
+        best = pick_best(results)
+        if best is None:
+            raise Exception("; ".join(r.get("error", r["status"]) for r in results))
+        summary = ", ".join(f"#{r['index']} {r['status']}" + (f" {r['score']:.2f}" if r["score"] is not None else "") for r in results)
+        print(f"Candidates: {summary}; using #{best['index']}")
+        # The winner becomes this iteration's output; losers stay in their scratch dirs for inspection
+        for name in [*files, test_file]:
+            source = os.path.join(scratch(best["index"]), name)
+            if os.path.exists(source):
+                shutil.copyfile(source, os.path.join(self.output_dir, name))
+        return best["output"]
+
+    def _evaluate_one(self, evaluator: EvaluatorAgent, code: str, project_type: str, project_description: str, test_results: str) -> Dict:
+        try:
+            return evaluator.evaluate_code(code, project_type, project_description, test_results)
+        except Exception as e:
+            return {"score": 0, "functionality_feedback": f"Evaluation failed: {str(e)}", "quality_feedback": "", "error": True}
+
+    async def _evaluate_async(self, code: str, project_type: str, project_description: str, test_results: str) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.max_concurrent_evaluations)
+
+        async def evaluate(evaluator: EvaluatorAgent) -> Dict:
+            async with semaphore:
+                return await asyncio.to_thread(self._evaluate_one, evaluator, code, project_type, project_description, test_results)
+
+        return await asyncio.gather(*(evaluate(evaluator) for evaluator in self.evaluators))
+
+    @traced("simulation.evaluate")
+    def _evaluate(self, code: str, project_type: str, project_description: str, test_results: str) -> List[Optional[Dict]]:
+        # Without a consensus controller all evaluators are queried at once; with one, evaluators it
+        # did not need are None. Each verdict is used for both the score and the feedback
+        if self.consensus is None:
+            self.consensus_decision = None
+            return asyncio.run(self._evaluate_async(code, project_type, project_description, test_results))
+        results, self.consensus_decision = self.consensus.run(
+            self.evaluators,
+            lambda evaluator: self._evaluate_one(evaluator, code, project_type, project_description, test_results),
+            self.max_concurrent_evaluations
+        )
+        current_span().set(consensus=self.consensus_decision["reason"], skipped=self.consensus_decision["skipped"])
+        decision = self.consensus_decision
+        print(f"Consensus: asked {len(decision['queried'])}/{len(self.evaluators)} evaluators ({decision['reason']}), "
+              f"mean {decision['mean']:.1f} ± {decision['error_bound']:.1f}")
+        return results
+
     def run(self):
         project_type = self.config["project_type"]
         project_description = self.config["project_description"]
         prompt_template = self.config["prompt_template"]
         rl_algorithm = self.config.get("rl_algorithm")
-        feedback = ""
-        
-        for iteration in range(self.max_iterations):
-            print(f"\n--- Iteration {iteration + 1} (Output: {self.output_dir}) ---")
-            if rl_algorithm is None:
-                algo = self.meta_agent.select_algorithm()
-            else:
-                algo = next((alg for alg in self.algorithms if alg.name == rl_algorithm), self.algorithms[0])
-            print(f"Using RL Algorithm: {algo.name}")
-
-            action = algo.get_action(self.state)
-            prompt = prompt_template.format(
-                project_type=project_type,
-                project_description=project_description,
-                feedback=feedback,
-                action=action,
-                library_file=self.config["library_file"],
-                main_file=self.config["main_file"],
-                test_file=self.config["test_file"]
+        # The tracer is process-wide; without this a run's trace export would repeat every earlier run's spans
+        tracer.reset()
+        if self.run_store is not None:
+            model = getattr(self.generator, "model", None)
+            self.run_id = self.run_store.start_run(
+                self.output_dir, self.config,
+                generator_model=getattr(model, "id", None),
+                evaluator_models=[evaluator.model.id for evaluator in self.evaluators if hasattr(evaluator, "model")],
+                run_id=self.run_id
             )
-            start_time = time.time()
-            try:
-                code_output = self.generator.run(prompt, max_tokens=3000, output_dir=self.output_dir)
-                print(f"Tool Results:\n{code_output}")
-            except Exception as e:
-                print(f"Generation failed: {str(e)}")
-                self.history.append({
-                    "iteration": iteration + 1,
-                    "code": "Generation failed",
-                    "score": 0,
-                    "feedback": f"Generation error: {str(e)}",
-                    "rl_algorithm": algo.name
-                })
-                break
+        start_iteration = self.start_iteration
+        if self.history and self.history[-1].get("score", 0) >= 90:
+            start_iteration = self.max_iterations
+        for iteration in range(start_iteration, self.max_iterations):
+            with tracer.span("iteration", iteration=iteration + 1) as iteration_span:
+                print(f"\n--- Iteration {iteration + 1} (Output: {self.output_dir}) ---")
+                pending = self.pending if self.pending and self.pending["iteration"] == iteration + 1 else None
+                self.pending = None
+                if pending is not None:
+                    algo = next(alg for alg in self.algorithms if alg.name == pending["algorithm"])
+                elif rl_algorithm is None:
+                    algo = self.meta_agent.select_algorithm()
+                else:
+                    algo = next((alg for alg in self.algorithms if alg.name == rl_algorithm), self.algorithms[0])
+                print(f"Using RL Algorithm: {algo.name}")
+                iteration_span.set(algorithm=algo.name)
+
+                action = pending["action"] if pending is not None else algo.get_action(self.state)
+                prompt = prompt_template.format(
+                    project_type=project_type,
+                    project_description=project_description,
+                    feedback=self.feedback_buffer.render() if self.feedback_buffer is not None else truncate_tokens(self.last_feedback, self.feedback_budget),
+                    action=action,
+                    library_file=self.config["library_file"],
+                    main_file=self.config["main_file"],
+                    test_file=self.config["test_file"]
+                )
+                start_time = time.time()
+                self.candidate_results = None
+                try:
+                    if pending is not None:
+                        # Generated before the interruption; the files are already in output_dir
+                        code_output = pending["code_output"]
+                        self.candidate_results = pending.get("candidates")
+                        print("Reusing the generation saved before the interruption")
+                    else:
+                        if self.candidates > 1:
+                            code_output = self._generate_candidates(prompt, iteration + 1)
+                        else:
+                            code_output = self.generator.run(prompt, max_tokens=3000, output_dir=self.output_dir)
+                        pending = {"iteration": iteration + 1, "algorithm": algo.name, "action": action,
+                                   "code_output": code_output, "candidates": self.candidate_results}
+                        self._save_run_state(iteration, pending)
+                    print(f"Tool Results:\n{code_output}")
+                except Exception as e:
+                    print(f"Generation failed: {str(e)}")
+                    self.history.append({
+                        "iteration": iteration + 1,
+                        "code": "Generation failed",
+                        "score": 0,
+                        "feedback": f"Generation error: {str(e)}",
+                        "rl_algorithm": algo.name
+                    })
+                    self._record_iteration()
+                    break
             
-            file_tools = self.generator.tools.get("FileTools")
-            lib_code = file_tools.read(self.config["library_file"], self.output_dir) if file_tools else "File not found"
-            main_code = file_tools.read(self.config["main_file"], self.output_dir) if file_tools else "File not found"
-            test_code = file_tools.read(self.config["test_file"], self.output_dir) if file_tools else "File not found"
-            combined_code = f"# {self.config['library_file']}\n{lib_code}\n\n# {self.config['main_file']}\n{main_code}\n\n# {self.config['test_file']}\n{test_code}"
-
-            test_results = self._run_tests()
-            print(f"Test Results:\n{test_results}")
-
-            scores = []
-            for i, evaluator in enumerate(self.evaluators):
-                eval_result = evaluator.evaluate_code(combined_code, project_type, project_description, test_results)
-                scores.append(eval_result.get("score", 0))
-                print(f"Evaluator {i + 1} (Model: {evaluator.model.id}):")
-                print(f"Score: {eval_result.get('score', 0)}")
-                print(f"Functionality Feedback: {eval_result.get('functionality_feedback', 'N/A')}")
-                print(f"Quality Feedback: {eval_result.get('quality_feedback', 'N/A')}\n")
+                file_tools = self.generator.tools.get("FileTools")
+                lib_code = file_tools.read(self.config["library_file"], self.output_dir) if file_tools else "File not found"
+                main_code = file_tools.read(self.config["main_file"], self.output_dir) if file_tools else "File not found"
+                test_code = file_tools.read(self.config["test_file"], self.output_dir) if file_tools else "File not found"
+                contents = {self.config["library_file"]: lib_code, self.config["main_file"]: main_code, self.config["test_file"]: test_code}
+                combined_code = "\n\n".join(f"# {name}\n{text}" for name, text in contents.items())
+                if pending.get("prompt_tokens") is not None:
+                    # The builder state saved with the evaluations already includes this iteration's build
+                    prompt_tokens = pending["prompt_tokens"]
+                else:
+                    prompt_tokens = {"generator": estimate_tokens(prompt)}
+                    if self.prompt_builder is not None:
+                        # Evaluators never saw the previous iteration, so changed files go in full (no diffs)
+                        # and only unchanged ones shrink to a signature summary
+                        combined_code, code_report = self.prompt_builder.build(contents)
+                        prompt_tokens.update(evaluator_code_full=code_report["code_tokens_full"] * len(self.evaluators), files=code_report["files"])
+                    prompt_tokens["evaluator_code"] = estimate_tokens(combined_code) * len(self.evaluators)
+                print(f"Prompt tokens: generator {prompt_tokens['generator']}, evaluators {prompt_tokens['evaluator_code']}")
+
+                test_results = self._run_tests()
+                print(f"Test Results:\n{test_results}")
+
+                if "eval_results" in pending:
+                    eval_results = pending["eval_results"]
+                    self.consensus_decision = pending.get("consensus")
+                else:
+                    eval_results = self._evaluate(combined_code, project_type, project_description, test_results)
+                    self._save_run_state(iteration, dict(pending, eval_results=eval_results, consensus=self.consensus_decision,
+                                                         prompt_tokens=prompt_tokens))
+                scores = []
+                for i, (evaluator, eval_result) in enumerate(zip(self.evaluators, eval_results)):
+                    if eval_result is None:
+                        continue
+                    scores.append(eval_result.get("score", 0))
+                    print(f"Evaluator {i + 1} (Model: {evaluator.model.id}):")
+                    print(f"Score: {eval_result.get('score', 0)}")
+                    print(f"Functionality Feedback: {eval_result.get('functionality_feedback', 'N/A')}")
+                    print(f"Quality Feedback: {eval_result.get('quality_feedback', 'N/A')}\n")
             
-            avg_score = sum(scores) / len(scores) if scores else 0
-            self.meta_agent.update_score(algo.name, avg_score)
+                avg_score = sum(scores) / len(scores) if scores else 0
+                self.meta_agent.update_score(algo.name, avg_score)
             
-            next_state = f"score_{int(avg_score)}"
-            next_action = algo.get_action(next_state)
-            if algo.name == "SARSA":
-                algo.update(self.state, action, avg_score / 100, next_state, next_action)
-            else:
-                algo.update(self.state, action, avg_score / 100, next_state)
-            self.state = next_state
-
-            feedback = "\n".join([
-                f"Evaluator {i + 1}: {result.get('functionality_feedback', '')} {result.get('quality_feedback', '')}"
-                for i, result in enumerate([evaluator.evaluate_code(combined_code, project_type, project_description, test_results) for evaluator in self.evaluators])
-            ])
-            self.history.append({
-                "iteration": iteration + 1,
-                "code": f"Files saved to {self.output_dir}",
-                "score": avg_score,
-                "feedback": feedback,
-                "rl_algorithm": algo.name
-            })
+                next_state = f"score_{int(avg_score)}"
+                next_action = algo.get_action(next_state)
+                if algo.name == "SARSA":
+                    algo.update(self.state, action, avg_score / 100, next_state, next_action)
+                else:
+                    algo.update(self.state, action, avg_score / 100, next_state)
+                self.replay_buffer.add(self.state, action, avg_score / 100, next_state, next_action, algo.name)
+                transition = {"state": self.state, "action": action, "next_state": next_state, "next_action": next_action}
+                self.state = next_state
+
+                feedback = "\n".join([
+                    f"Evaluator {i + 1}: {result.get('functionality_feedback', '')} {result.get('quality_feedback', '')}"
+                    for i, result in enumerate(eval_results) if result is not None
+                ])
+                if self.feedback_buffer is not None:
+                    self.feedback_buffer.add(iteration + 1, feedback)
+                self.last_feedback = feedback
+                self.history.append({
+                    "iteration": iteration + 1,
+                    "code": f"Files saved to {self.output_dir}",
+                    "score": avg_score,
+                    "feedback": feedback,
+                    "rl_algorithm": algo.name,
+                    "prompt_tokens": prompt_tokens,
+                    **transition
+                })
+                store = getattr(file_tools, "store", None)
+                if store is not None:
+                    manifest = store.snapshot(self.output_dir, iteration + 1, list(contents), score=avg_score, rl_algorithm=algo.name)
+                    self.history[-1]["files"] = manifest["files"]
+                if self.candidate_results is not None:
+                    self.history[-1]["candidates"] = self.candidate_results
+                if self.consensus_decision is not None:
+                    self.history[-1]["consensus"] = self.consensus_decision
+                if getattr(self.generator, "hedger", None) is not None:
+                    self.history[-1]["hedge"] = self.generator.hedger.report()
+                if self.test_report is not None:
+                    self.history[-1]["tests"] = {key: self.test_report.get(key) for key in ("passed", "failed", "skipped", "error", "duration", "cached")}
             
-            if iteration == 0 and random.random() < 0.3:
-                new_algo = self.rl_generator.generate_algorithm([alg.name for alg in self.algorithms])
-                print(f"Generated New RL Algorithm: {new_algo.get('name')}")
-                self.history[-1]["new_algorithm"] = new_algo
+                if iteration == 0 and random.random() < 0.3:
+                    new_algo = self.rl_generator.generate_algorithm([alg.name for alg in self.algorithms])
+                    print(f"Generated New RL Algorithm: {new_algo.get('name')}")
+                    self.history[-1]["new_algorithm"] = new_algo
 
-            end_time = time.time()
-            print(f"**Time Elapsed for Iteration {iteration + 1}:** {end_time - start_time:.2f} seconds")
+                self._save_checkpoint()
+                end_time = time.time()
+                self.history[-1]["elapsed"] = end_time - start_time
+                iteration_span.set(score=avg_score)
+                self._save_run_state(iteration + 1)
+                self._record_iteration()
+                print(f"**Time Elapsed for Iteration {iteration + 1}:** {end_time - start_time:.2f} seconds")
             
-            if avg_score >= 90:
-                print("High score achieved, stopping early.")
-                break
+                if avg_score >= 90:
+                    print("High score achieved, stopping early.")
+                    break
 
         try:
             with open(os.path.join(self.output_dir, "simulation_results.json"), "w") as f:
@@ -456,6 +1035,19 @@ class RLSimulation:
             print(f"Results saved to {self.output_dir}/simulation_results.json")
         except Exception as e:
             print(f"Failed to save results: {str(e)}")
+        if self.replay_file:
+            try:
+                self.replay_buffer.save(self.replay_file)
+                print(f"Replay buffer ({len(self.replay_buffer)} transitions) saved to {self.replay_file}")
+            except Exception as e:
+                print(f"Failed to save replay buffer: {str(e)}")
+        if self.config.get("restore_best"):
+            self.restore_best()
+        if self.run_id is not None:
+            self.run_store.finish_run(self.run_id)
+        if tracer.enabled:
+            paths = tracer.export(os.path.join(self.output_dir, "trace"))
+            print(f"Trace saved to {', '.join(paths)}")
 
 # Config file for prompts
 config_content = {
@@ -482,49 +1074,75 @@ config_content = {
     "rl_algorithm": "dynamic"
 }
 
-# Save config file
-with open("config.json", "w") as f:
-    json.dump(config_content, f, indent=2)
-
-# Usage
-api_key = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
-if api_key == "your-api-key-here":
-    print("Please set your OPENROUTER_API_KEY environment variable.")
-    exit(1)
-
-generator_model = OpenRouter(
-    id="google/gemini-2.0-flash-001",
-    api_key=api_key,
-    base_url="https://openrouter.ai/api/v1"
-)
-evaluator_models = [
-    OpenRouter(
+def main():
+    # Set AGENT_TRACE=1 to write trace.jsonl and trace.trace.json (chrome://tracing) into the output directory
+    if os.getenv("AGENT_TRACE") == "1":
+        tracer.enable()
+
+    # Save config file
+    with open("config.json", "w") as f:
+        json.dump(config_content, f, indent=2)
+
+    # Usage
+    api_key = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
+    if api_key == "your-api-key-here":
+        print("Please set your OPENROUTER_API_KEY environment variable.")
+        exit(1)
+
+    generator_model = OpenRouter(
         id="google/gemini-2.0-flash-001",
         api_key=api_key,
         base_url="https://openrouter.ai/api/v1"
-    ),
-    # OpenRouter(
-    #     id="anthropic/claude-3.5-sonnet",
-    #     api_key=api_key,
-    #     base_url="https://openrouter.ai/api/v1"
-    # )
-]
-rl_generator_model = OpenRouter(
-    id="google/gemini-2.0-flash-001",
-    api_key=api_key,
-    base_url="https://openrouter.ai/api/v1"
-)
-
-generator_agent = Agent(
-    model=generator_model,
-    tools=[ShellTools(), FileTools()],
-    show_tool_calls=True
-)
-evaluator_agents = [EvaluatorAgent(model) for model in evaluator_models]
-rl_generator_agent = RLGeneratorAgent(rl_generator_model)
-
-# Test FileTools
-test_file_content = """
+    )
+    evaluator_models = [
+        OpenRouter(
+            id="google/gemini-2.0-flash-001",
+            api_key=api_key,
+            base_url="https://openrouter.ai/api/v1"
+        ),
+        # OpenRouter(
+        #     id="anthropic/claude-3.5-sonnet",
+        #     api_key=api_key,
+        #     base_url="https://openrouter.ai/api/v1"
+        # )
+    ]
+    rl_generator_model = OpenRouter(
+        id="google/gemini-2.0-flash-001",
+        api_key=api_key,
+        base_url="https://openrouter.ai/api/v1"
+    )
+
+    # HEDGE_MODELS=model-a,model-b adds backups that get the request once the primary runs past its p95 latency
+    hedge_models = [
+        OpenRouter(id=model_id.strip(), api_key=api_key, base_url="https://openrouter.ai/api/v1")
+        for model_id in os.getenv("HEDGE_MODELS", "").split(",") if model_id.strip()
+    ]
+    # Every agent shares one keep-alive pool and per-model rate limits
+    client = shared_client()
+    generator_agent = Agent(
+        model=generator_model,
+        tools=[ShellTools(), FileTools(store=ArtifactStore("artifacts"))],
+        show_tool_calls=True,
+        stream=os.getenv("STREAM_COMPLETIONS") == "1",
+        hedge_models=hedge_models,
+        session=client
+    )
+    # LOCAL_EVALUATOR_MODEL=microsoft/bitnet-b1.58-2B-4T adds an evaluator served on this machine's CPU
+    local_engine = None
+    if os.getenv("LOCAL_EVALUATOR_MODEL"):
+        local_engine = LocalEngine(TransformersBackend(os.getenv("LOCAL_EVALUATOR_MODEL")))
+        evaluator_models.append(OpenRouter(id=os.getenv("LOCAL_EVALUATOR_MODEL"), api_key="", base_url=mount_local(client, local_engine)))
+    # Set RESPONSE_CACHE_BYPASS=1 to force fresh completions
+    response_cache = ResponseCache(bypass=os.getenv("RESPONSE_CACHE_BYPASS") == "1")
+    evaluator_agents = [EvaluatorAgent(model, session=client, cache=response_cache) for model in evaluator_models]
+    rl_generator_agent = RLGeneratorAgent(rl_generator_model, cache=response_cache, session=client)
+    # Generated suites are split across cores; one hanging test no longer costs the whole run
+    test_worker = PytestWorker(shards=os.cpu_count() or 1, per_test_timeout=10)
+    run_store = RunStore("runs.db")
+    run_store.import_outputs("outputs")
+
+    # Test FileTools
+    test_file_content = """
 import pytest
 import os
 from cua4_rl import FileTools
@@ -555,21 +1173,45 @@ def test_filetools_read():
     os.rmdir(output_dir)
 """
 
-with open("test_filetools.py", "w") as f:
-    f.write(test_file_content)
-
-shell_tools = ShellTools()
-try:
-    test_result = shell_tools.execute("pytest test_filetools.py --tb=short")
-    print(f"FileTools Tests:\n{test_result}")
-except Exception:
-    print("Pytest not installed for FileTools tests. Please run 'pip install pytest'.")
-
-simulation = RLSimulation(
-    generator=generator_agent,
-    evaluators=evaluator_agents,
-    rl_generator=rl_generator_agent,
-    config_file="config.json",
-    max_iterations=3
-)
-simulation.run()
\ No newline at end of file
+    with open("test_filetools.py", "w") as f:
+        f.write(test_file_content)
+
+    shell_tools = ShellTools()
+    try:
+        test_result = shell_tools.execute("pytest test_filetools.py --tb=short")
+        print(f"FileTools Tests:\n{test_result}")
+    except Exception:
+        print("Pytest not installed for FileTools tests. Please run 'pip install pytest'.")
+
+    simulation = RLSimulation(
+        generator=generator_agent,
+        evaluators=evaluator_agents,
+        rl_generator=rl_generator_agent,
+        config_file="config.json",
+        max_iterations=3,
+        replay_file="replay_buffer.npz",
+        checkpoint_file="rl_checkpoint.bin",
+        test_worker=test_worker,
+        # Every iteration is committed as it finishes; query with `python run_store.py query`
+        run_store=run_store,
+        # RESUME_DIR=output_3 continues an interrupted run at its next iteration
+        resume_dir=os.getenv("RESUME_DIR")
+    )
+    try:
+        simulation.run()
+    finally:
+        test_worker.close()
+        run_store.close()
+        if local_engine is not None:
+            print(f"Local inference: {local_engine.stats}")
+            local_engine.close()
+    print(f"Response cache: {response_cache.stats()}")
+    print(f"HTTP client: {json.dumps(client.metrics())}")
+    print(f"Structured output: {json.dumps(parse_stats.report())}")
+    if simulation.consensus is not None:
+        print(f"Consensus: {simulation.consensus.report()}")
+    if generator_agent.hedger is not None:
+        print(f"Hedging: {generator_agent.hedger.report()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+class HedgeCancelled(Exception):
+    pass
+
+class LatencyTracker:
+    # Rolling latency quantile used as the hedge delay; `initial` applies until enough samples exist
+    def __init__(self, quantile: float = 95.0, window: int = 50, min_samples: int = 5, initial: float = 10.0, floor: float = 0.25):
+        self.quantile = quantile
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.initial = initial
+        self.floor = floor
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def threshold(self) -> float:
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial
+            return max(self.floor, float(np.percentile(list(self.samples), self.quantile)))
+
+class Hedger:
+    # Sends to models[0]; once it has been outstanding longer than its latency threshold, or fails,
+    # the next model in the list gets the same request. The first good answer wins.
+    def __init__(self, quantile: float = 95.0, window: int = 50, min_samples: int = 5, initial: float = 10.0, max_attempts: Optional[int] = None):
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial = initial
+        self.max_attempts = max_attempts
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0, "cancelled": 0, "failures": 0, "wins": {}}
+
+    def tracker(self, model_id: str) -> LatencyTracker:
+        with self.lock:
+            if model_id not in self.trackers:
+                self.trackers[model_id] = LatencyTracker(self.quantile, self.window, self.min_samples, self.initial)
+            return self.trackers[model_id]
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _attempt(self, send: Callable, model, cancel: threading.Event):
+        start = time.perf_counter()
+        try:
+            result = send(model, cancel)
+        except HedgeCancelled:
+            # A loser's elapsed time is only a lower bound on its latency, but dropping it would leave
+            # the quantile fed by fast requests alone and the hedge delay would keep shrinking
+            self.tracker(model.id).record(time.perf_counter() - start)
+            raise
+        self.tracker(model.id).record(time.perf_counter() - start)
+        return result
+
+    def call(self, models: List[Any], send: Callable[[Any, threading.Event], Any]) -> Tuple[Any, Any]:
+        models = models[:self.max_attempts] if self.max_attempts else models
+        self._count("calls")
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=len(models))
+        pending = {}
+        errors = []
+        launched = 0
+        last_launch = 0.0
+
+        def launch():
+            nonlocal launched, last_launch
+            model = models[launched]
+            launched += 1
+            last_launch = time.perf_counter()
+            pending[executor.submit(contextvars.copy_context().run, self._attempt, send, model, cancel)] = model
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if launched < len(models):
+                    timeout = max(0.0, last_launch + self.tracker(models[launched - 1].id).threshold() - time.perf_counter())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if launched == 1:
+                        self._count("hedged")
+                    launch()
+                    continue
+                for future in done:
+                    model = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{model.id}: {e}")
+                        continue
+                    cancel.set()
+                    with self.lock:
+                        self.stats["wins"][model.id] = self.stats["wins"].get(model.id, 0) + 1
+                        self.stats["cancelled"] += len(pending)
+                        if model is not models[0]:
+                            self.stats["hedge_wins"] += 1
+                    return result, model
+                if launched < len(models):
+                    self._count("fallbacks")
+                    launch()
+        finally:
+            # Losers are not waited for; they see `cancel` and drop their connection
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._count("failures")
+        raise Exception("All hedged attempts failed:\n" + "\n".join(errors))
+
+    def report(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats, wins=dict(self.stats["wins"]))
+        stats["thresholds"] = {model_id: tracker.threshold() for model_id, tracker in list(self.trackers.items())}
+        return stats
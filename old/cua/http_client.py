@@ -0,0 +1,236 @@
+import time
+import threading
+import email.utils
+from urllib.parse import urlparse
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+    # rate=None means no steady-state limit, but Retry-After pauses still apply
+    def __init__(self, rate: Optional[float] = None, burst: float = 10.0):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = now
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.rate is None:
+                    return waited
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class AIMDLimiter:
+    # Concurrency window: +1 per window of good responses, halved on throttling or slow responses
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, backoff: float = 0.5,
+                 latency_target: Optional[float] = None, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.decreases = 0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> float:
+        start = time.monotonic()
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self, congested: bool, latency: float):
+        with self.cond:
+            self.in_flight -= 1
+            if congested or (self.latency_target is not None and latency > self.latency_target):
+                # A burst of 429s coming back together is one congestion signal, not many
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self.last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+class _Lane:
+    def __init__(self, bucket: TokenBucket, limiter: AIMDLimiter):
+        self.bucket = bucket
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "server_errors": 0, "exceptions": 0,
+                      "retries": 0, "wait_seconds": 0.0, "latency_seconds": 0.0}
+
+    def count(self, **amounts):
+        with self.lock:
+            for key, amount in amounts.items():
+                self.stats[key] += amount
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HTTPClient:
+    # One keep-alive pool for every agent; requests are grouped into lanes by host and model,
+    # each with its own token bucket and AIMD concurrency window.
+    # `limits` overrides lane settings by model id or host, e.g. {"openrouter.ai": {"rate": 5, "burst": 10}}.
+    def __init__(self, pool_maxsize: int = 32, rate: Optional[float] = None, burst: float = 10.0,
+                 initial_concurrency: int = 4, max_concurrency: int = 32, latency_target: Optional[float] = None,
+                 max_retries: int = 3, backoff_factor: float = 1.0, max_retry_after: float = 60.0,
+                 limits: Optional[Dict[str, Dict]] = None, slots=None):
+        self.defaults = {"rate": rate, "burst": burst, "initial": initial_concurrency, "maximum": max_concurrency,
+                         "latency_target": latency_target}
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after
+        # Optional cross-process cap (e.g. a multiprocessing semaphore shared by a sweep)
+        self.slots = slots
+        self.lanes: Dict[str, _Lane] = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        # Status retries happen here so the limiter sees every 429; urllib3 only retries failed connects
+        self.adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize,
+                                   max_retries=Retry(total=max_retries, read=0, status=0, backoff_factor=backoff_factor))
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def lane(self, url: str, model: Optional[str] = None) -> _Lane:
+        host = urlparse(url).netloc
+        key = f"{host}/{model}" if model else host
+        with self.lock:
+            if key not in self.lanes:
+                settings = dict(self.defaults, **self.limits.get(host, {}), **self.limits.get(model or "", {}))
+                self.lanes[key] = _Lane(
+                    TokenBucket(settings["rate"], settings["burst"]),
+                    AIMDLimiter(settings["initial"], maximum=settings["maximum"], latency_target=settings["latency_target"])
+                )
+            return self.lanes[key]
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, max_retries: Optional[int] = None, backoff_factor: Optional[float] = None,
+                **kwargs) -> requests.Response:
+        # Per-call retry settings let latency-sensitive callers (e.g. hedged attempts) fail over sooner
+        max_retries = self.max_retries if max_retries is None else max_retries
+        backoff_factor = self.backoff_factor if backoff_factor is None else backoff_factor
+        lane = self.lane(url, (kwargs.get("json") or {}).get("model"))
+        for attempt in range(max_retries + 1):
+            waited = lane.bucket.acquire()
+            waited += lane.limiter.acquire()
+            start = time.monotonic()
+            try:
+                if self.slots is not None:
+                    with self.slots:
+                        response = self.session.request(method, url, **kwargs)
+                else:
+                    response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                lane.limiter.release(True, time.monotonic() - start)
+                lane.count(requests=1, exceptions=1, wait_seconds=waited)
+                raise
+            # For streamed responses the slot covers time to headers, not the whole body
+            latency = time.monotonic() - start
+            status = response.status_code
+            lane.limiter.release(status in THROTTLE_STATUSES, latency)
+            lane.count(requests=1, ok=int(status < 400), throttled=int(status == 429), server_errors=int(status >= 500),
+                       wait_seconds=waited, latency_seconds=latency)
+            if status not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_factor * (2 ** attempt)
+            delay = min(delay, self.max_retry_after)
+            response.close()
+            lane.count(retries=1)
+            if status == 429:
+                # Everyone on this lane waits out the provider's Retry-After, not just this request
+                lane.bucket.pause(delay)
+            else:
+                time.sleep(delay)
+        return response
+
+    def metrics(self) -> Dict:
+        lanes = {}
+        with self.lock:
+            items = list(self.lanes.items())
+        for key, lane in items:
+            with lane.lock:
+                stats = dict(lane.stats)
+            stats["latency_avg"] = stats["latency_seconds"] / stats["requests"] if stats["requests"] else None
+            stats.update(limit=lane.limiter.limit, in_flight=lane.limiter.in_flight, decreases=lane.limiter.decreases,
+                         tokens=lane.bucket.tokens)
+            lanes[key] = stats
+        pool = {}
+        pools = self.adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            connection_pool = pools.get(pool_key)
+            if connection_pool is None:
+                continue
+            pool[f"{connection_pool.scheme}://{connection_pool.host}:{connection_pool.port}"] = {
+                "connections_opened": connection_pool.num_connections,
+                "requests": connection_pool.num_requests,
+                "idle": connection_pool.pool.qsize() if connection_pool.pool is not None else 0
+            }
+        return {"lanes": lanes, "pool": pool}
+
+    def mount(self, prefix: str, adapter):
+        # e.g. an in-process provider under "local://name"; it still goes through the lanes and limiters
+        self.session.mount(prefix, adapter)
+
+    def close(self):
+        self.session.close()
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_client() -> HTTPClient:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HTTPClient()
+        return _shared
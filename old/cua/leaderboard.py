@@ -0,0 +1,205 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from prompt_builder import estimate_tokens
+from cua4 import Agent, extract_shell_command, models_to_test
+
+DEFAULT_GOAL = "get the first 5 lines of treechat.md"
+SORT_KEYS = {
+    "p50": ("latency_p50", False),
+    "p95": ("latency_p95", False),
+    "p99": ("latency_p99", False),
+    "ttft": ("ttft_p50", False),
+    "tps": ("tokens_per_second", True),
+    "errors": ("error_rate", False),
+    "compliance": ("compliance_rate", True)
+}
+
+def make_session(pool_size: int) -> requests.Session:
+    # No automatic retries: a retried request would hide the error and inflate the measured latency
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def probe_once(session: requests.Session, model_id: str, api_key: str, base_url: str, prompt: str,
+               max_tokens: int = 100, timeout: float = 30.0) -> Dict:
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "http://localhost",
+        "X-Title": "Shell Command Agent"
+    }
+    data = {
+        "model": model_id,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    result = {"model": model_id, "ok": False, "status": None, "ttft": None, "latency": None,
+              "completion_tokens": 0, "compliant": False, "error": None}
+    start = time.perf_counter()
+    parts = []
+    usage = None
+    try:
+        with session.post(f"{base_url}/chat/completions", headers=headers, json=data, timeout=timeout, stream=True) as response:
+            result["status"] = response.status_code
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+                result["latency"] = time.perf_counter() - start
+                return result
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - start
+                    parts.append(delta)
+    except (requests.RequestException, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = time.perf_counter() - start
+        return result
+    content = "".join(parts)
+    result["latency"] = time.perf_counter() - start
+    result["ok"] = True
+    result["completion_tokens"] = (usage or {}).get("completion_tokens") or estimate_tokens(content)
+    result["compliant"] = bool(extract_shell_command(content))
+    return result
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+def summarize(model_id: str, results: List[Dict]) -> Dict:
+    ok = [r for r in results if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    # Decode speed: tokens after the first one over the time from the first token to the end
+    # of the reply, so queueing and prefill (both inside ttft) do not dilute it
+    decode = [(max(r["completion_tokens"] - 1, 0), r["latency"] - r["ttft"]) for r in ok if r["ttft"] is not None]
+    tokens, seconds = sum(t for t, _ in decode), sum(s for _, s in decode)
+    statuses = {}
+    for r in results:
+        if not r["ok"]:
+            key = str(r["status"] or "exception")
+            statuses[key] = statuses.get(key, 0) + 1
+    return {
+        "model": model_id,
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "errors": statuses,
+        "ttft_p50": _percentile(ttfts, 50),
+        "ttft_p95": _percentile(ttfts, 95),
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_p99": _percentile(latencies, 99),
+        "tokens_per_second": tokens / seconds if seconds > 0 else None,
+        "compliance_rate": sum(r["compliant"] for r in ok) / len(ok) if ok else 0.0,
+        "timestamp": time.time()
+    }
+
+def probe_models(model_ids: List[str], api_key: str, base_url: str, requests_per_model: int = 10,
+                 concurrency: int = 4, goal: str = DEFAULT_GOAL, max_tokens: int = 100, timeout: float = 30.0) -> List[Dict]:
+    prompt = Agent.build_prompt(goal)
+    session = make_session(concurrency)
+    # Requests for all models go through one bounded pool, interleaved so no model gets the quiet slot
+    jobs = [model_id for _ in range(requests_per_model) for model_id in model_ids]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(lambda model_id: probe_once(session, model_id, api_key, base_url, prompt, max_tokens, timeout), jobs))
+    session.close()
+    return [summarize(model_id, [r for r in results if r["model"] == model_id]) for model_id in model_ids]
+
+class Leaderboard:
+    def __init__(self, path: str = "leaderboard.json"):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = {entry["model"]: entry for entry in json.load(f)}
+
+    def update(self, summaries: List[Dict]):
+        # Latest probe per model wins; models not probed this time keep their previous row
+        for summary in summaries:
+            self.entries[summary["model"]] = summary
+
+    def sorted(self, by: str = "p50") -> List[Dict]:
+        if by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {by}. Choose from {', '.join(SORT_KEYS)}")
+        key, descending = SORT_KEYS[by]
+        present = [e for e in self.entries.values() if e.get(key) is not None]
+        missing = [e for e in self.entries.values() if e.get(key) is None]
+        return sorted(present, key=lambda e: e[key], reverse=descending) + missing
+
+    def save(self, by: str = "p50"):
+        rows = self.sorted(by)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(rows, f, indent=2)
+        os.replace(tmp, self.path)
+        csv_path = os.path.splitext(self.path)[0] + ".csv"
+        columns = ["model", "requests", "ok", "error_rate", "ttft_p50", "ttft_p95", "latency_p50",
+                   "latency_p95", "latency_p99", "tokens_per_second", "compliance_rate", "timestamp"]
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def format_table(self, by: str = "p50") -> str:
+        def fmt(value, pattern):
+            return pattern.format(value) if value is not None else "-"
+        lines = [f"{'model':40} {'ttft p50':>9} {'p50':>7} {'p95':>7} {'p99':>7} {'tok/s':>7} {'errors':>7} {'tags':>6}"]
+        for e in self.sorted(by):
+            lines.append(f"{e['model'][:40]:40} {fmt(e['ttft_p50'], '{:.2f}s'):>9} {fmt(e['latency_p50'], '{:.2f}s'):>7} "
+                         f"{fmt(e['latency_p95'], '{:.2f}s'):>7} {fmt(e['latency_p99'], '{:.2f}s'):>7} "
+                         f"{fmt(e['tokens_per_second'], '{:.1f}'):>7} {e['error_rate']:>7.0%} {e['compliance_rate']:>6.0%}")
+        return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Probe models concurrently and keep a latency leaderboard")
+    parser.add_argument("--models", nargs="*", default=None, help="Model ids (defaults to cua4.models_to_test)")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per model")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight across all models")
+    parser.add_argument("--goal", default=DEFAULT_GOAL)
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--base-url", default="https://openrouter.ai/api/v1")
+    parser.add_argument("--output", default="leaderboard.json")
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="p50")
+    parser.add_argument("--show", action="store_true", help="Print the saved leaderboard without probing")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    leaderboard = Leaderboard(args.output)
+    if not args.show:
+        api_key = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
+        if api_key == "your-api-key-here":
+            print("Please set your OPENROUTER_API_KEY environment variable.")
+            sys.exit(1)
+        models = args.models or models_to_test
+        print(f"Probing {len(models)} model(s), {args.requests} requests each, {args.concurrency} in flight")
+        leaderboard.update(probe_models(models, api_key, args.base_url, args.requests, args.concurrency,
+                                        args.goal, args.max_tokens, args.timeout))
+        leaderboard.save(args.sort)
+        print(f"Leaderboard saved to {args.output}")
+    print(leaderboard.format_table(args.sort))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,317 @@
+import io
+import copy
+import json
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+import requests
+from requests.adapters import BaseAdapter
+
+DEFAULT_MODEL = "microsoft/bitnet-b1.58-2B-4T"
+
+class EngineBusy(Exception):
+    pass
+
+class TransformersBackend:
+    # torch/transformers are only imported on load(), so importing this module stays cheap
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: str = "cpu", torch_dtype: str = "auto"):
+        self.model_name = model_name
+        self.device = device
+        self.torch_dtype = torch_dtype
+        self.model = None
+        self.tokenizer = None
+        self.torch = None
+
+    def load(self):
+        if self.model is not None:
+            return
+        try:
+            import torch
+            import transformers
+        except ImportError as e:
+            raise ImportError(f"Local inference needs torch and transformers ({e}). Run 'pip install torch transformers'.")
+        self.torch = torch
+        model_class = transformers.AutoModelForCausalLM
+        if "bitnet" in self.model_name.lower() and hasattr(transformers, "BitNetForCausalLM"):
+            model_class = transformers.BitNetForCausalLM
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+        self.model = model_class.from_pretrained(self.model_name, trust_remote_code=True, torch_dtype=self.torch_dtype).to(self.device)
+        self.model.eval()
+
+    @property
+    def pad_id(self) -> int:
+        pad = self.tokenizer.pad_token_id
+        return pad if pad is not None else self.tokenizer.eos_token_id
+
+    def encode(self, messages: List[Dict]) -> List[int]:
+        if getattr(self.tokenizer, "chat_template", None):
+            return list(self.tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=True))
+        return self.tokenizer("\n\n".join(m.get("content", "") for m in messages)).input_ids
+
+    def decode(self, ids: List[int]) -> str:
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def prefill(self, ids: List[int]):
+        with self.torch.no_grad():
+            output = self.model(input_ids=self.torch.tensor([ids], device=self.device), use_cache=True)
+        return output.past_key_values
+
+    def generate(self, prefix: List[int], cache, suffixes: List[List[int]], max_new_tokens: int, temperature: float) -> List[List[int]]:
+        torch = self.torch
+        # Pad between the shared prefix and each suffix so the prefix keeps the same positions in every row;
+        # the attention mask hides the gap and position ids follow the mask
+        width = max(len(suffix) for suffix in suffixes)
+        rows, masks = [], []
+        for suffix in suffixes:
+            gap = width - len(suffix)
+            rows.append(prefix + [self.pad_id] * gap + suffix)
+            masks.append([1] * len(prefix) + [0] * gap + [1] * len(suffix))
+        kwargs = {}
+        if cache is not None:
+            cache = copy.deepcopy(cache)
+            cache.batch_repeat_interleave(len(suffixes))
+            kwargs["past_key_values"] = cache
+        if temperature > 0:
+            kwargs.update(do_sample=True, temperature=temperature)
+        else:
+            kwargs["do_sample"] = False
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids=torch.tensor(rows, device=self.device),
+                attention_mask=torch.tensor(masks, device=self.device),
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.pad_id,
+                **kwargs
+            )
+        results = []
+        for row in output[:, len(rows[0]):].tolist():
+            if self.tokenizer.eos_token_id in row:
+                row = row[:row.index(self.tokenizer.eos_token_id)]
+            results.append(row)
+        return results
+
+class PrefixCache:
+    # LRU of prefilled KV caches keyed by the prefix token ids
+    def __init__(self, capacity: int = 4):
+        self.capacity = capacity
+        self.entries: "OrderedDict[Tuple[int, ...], object]" = OrderedDict()
+
+    def match(self, ids: List[int]) -> Tuple[int, ...]:
+        best = ()
+        for prefix in self.entries:
+            # At least one token has to be left for the model to run on
+            if len(best) < len(prefix) < len(ids) and tuple(ids[:len(prefix)]) == prefix:
+                best = prefix
+        if best:
+            self.entries.move_to_end(best)
+        return best
+
+    def get(self, prefix: Tuple[int, ...]):
+        return self.entries.get(prefix)
+
+    def put(self, prefix: Tuple[int, ...], cache):
+        self.entries[prefix] = cache
+        self.entries.move_to_end(prefix)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+def _common_prefix(a: List[int], b: List[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+class _Request:
+    __slots__ = ("ids", "max_tokens", "temperature", "future")
+
+    def __init__(self, ids: List[int], max_tokens: int, temperature: float):
+        self.ids = ids
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.future = Future()
+
+class LocalEngine:
+    # Loads the model once and serves requests from a queue: the first request waits up to `max_wait`
+    # for others to join its batch, and prompts that share a long prefix reuse its prefilled KV cache
+    def __init__(self, backend=None, max_batch_size: int = 8, max_wait: float = 0.02, max_queue: int = 256,
+                 min_prefix_tokens: int = 32, prefix_cache_size: int = 4):
+        self.backend = backend or TransformersBackend()
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.min_prefix_tokens = min_prefix_tokens
+        self.queue = queue.Queue(max_queue)
+        self.prefixes = PrefixCache(prefix_cache_size)
+        self.last_ids: List[int] = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {"requests": 0, "rejected": 0, "batches": 0, "max_batch": 0, "prefix_hits": 0, "prefix_builds": 0,
+                      "prompt_tokens": 0, "prefill_tokens_saved": 0, "completion_tokens": 0}
+
+    def start(self) -> "LocalEngine":
+        with self.lock:
+            if self.thread is None:
+                self.backend.load()
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+        return self
+
+    def close(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout=30)
+
+    def submit(self, messages: List[Dict], max_tokens: int = 256, temperature: float = 0.0) -> Future:
+        self.start()
+        request = _Request(self.backend.encode(messages), max_tokens, temperature)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            raise EngineBusy(f"Local inference queue is full ({self.queue.maxsize} requests)")
+        self._count("requests")
+        return request.future
+
+    def generate(self, messages: List[Dict], max_tokens: int = 256, temperature: float = 0.0, timeout: Optional[float] = None) -> Dict:
+        return self.submit(messages, max_tokens, temperature).result(timeout)
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+
+    def _prefix_for(self, ids: List[int]) -> Tuple[int, ...]:
+        prefix = self.prefixes.match(ids)
+        if prefix:
+            self._count("prefix_hits")
+            self._count("prefill_tokens_saved", len(prefix))
+            return prefix
+        # Learn prefixes from traffic: a long overlap with the previous prompt is most likely the template
+        shared = min(_common_prefix(ids, self.last_ids), len(ids) - 1)
+        self.last_ids = ids
+        if shared < self.min_prefix_tokens:
+            return ()
+        prefix = tuple(ids[:shared])
+        self.prefixes.put(prefix, self.backend.prefill(list(prefix)))
+        self._count("prefix_builds")
+        return prefix
+
+    def _run_batch(self, batch: List[_Request]):
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        groups: Dict[Tuple, List[_Request]] = {}
+        for request in batch:
+            try:
+                prefix = self._prefix_for(request.ids)
+            except Exception:
+                prefix = ()
+            groups.setdefault((prefix, request.temperature), []).append(request)
+        for (prefix, temperature), requests_ in groups.items():
+            try:
+                outputs = self.backend.generate(
+                    list(prefix),
+                    self.prefixes.get(prefix) if prefix else None,
+                    [request.ids[len(prefix):] for request in requests_],
+                    max(request.max_tokens for request in requests_),
+                    temperature
+                )
+            except Exception as e:
+                for request in requests_:
+                    request.future.set_exception(e)
+                continue
+            for request, ids in zip(requests_, outputs):
+                ids = ids[:request.max_tokens]
+                self._count("prompt_tokens", len(request.ids))
+                self._count("completion_tokens", len(ids))
+                request.future.set_result({
+                    "text": self.backend.decode(ids),
+                    "prompt_tokens": len(request.ids),
+                    "completion_tokens": len(ids),
+                    "cached_tokens": len(prefix)
+                })
+
+class LocalAdapter(BaseAdapter):
+    # Answers OpenAI-style /chat/completions requests from a LocalEngine without a network hop,
+    # so an OpenRouter config with base_url "local://<name>" works with every agent
+    def __init__(self, engine: LocalEngine, timeout: float = 600.0):
+        super().__init__()
+        self.engine = engine
+        self.timeout = timeout
+
+    def _response(self, request, status: int, body: bytes, content_type: str = "application/json", headers: Optional[Dict] = None):
+        response = requests.Response()
+        response.status_code = status
+        response.url = request.url
+        response.request = request
+        response.reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}.get(status, "")
+        response.headers["Content-Type"] = content_type
+        response.headers["Content-Length"] = str(len(body))
+        response.headers.update(headers or {})
+        response.raw = io.BytesIO(body)
+        response.encoding = "utf-8"
+        return response
+
+    def _error(self, request, status: int, message: str, headers: Optional[Dict] = None):
+        return self._response(request, status, json.dumps({"error": {"message": message, "code": status}}).encode("utf-8"), headers=headers)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if not request.url.endswith("/chat/completions"):
+            return self._error(request, 404, "Not found")
+        body = json.loads(request.body or b"{}")
+        try:
+            result = self.engine.generate(body.get("messages", []), body.get("max_tokens", 256), body.get("temperature", 0.0), self.timeout)
+        except EngineBusy as e:
+            return self._error(request, 429, str(e), {"Retry-After": "1"})
+        except Exception as e:
+            return self._error(request, 500, f"Local inference failed: {e}")
+        completion_id = f"local-{uuid.uuid4().hex[:12]}"
+        usage = {"prompt_tokens": result["prompt_tokens"], "completion_tokens": result["completion_tokens"], "cached_tokens": result["cached_tokens"]}
+        if body.get("stream"):
+            # Generation is batched, so the stream arrives in one piece
+            chunk = {"id": completion_id, "model": body.get("model"), "choices": [{"index": 0, "delta": {"content": result["text"]}}], "usage": usage}
+            data = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode("utf-8")
+            return self._response(request, 200, data, "text/event-stream")
+        payload = {
+            "id": completion_id,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": result["text"]}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+        return self._response(request, 200, json.dumps(payload).encode("utf-8"))
+
+    def close(self):
+        pass
+
+def mount_local(client, engine: LocalEngine, name: str = "local") -> str:
+    # Returns the base_url to put in an OpenRouter config
+    client.mount(f"local://{name}", LocalAdapter(engine))
+    return f"local://{name}"
@@ -0,0 +1,113 @@
+import ast
+import difflib
+import hashlib
+from typing import Dict, List, Tuple
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and for comparing iterations
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    return text[:max(budget, 0) * 4].rstrip() + " ..."
+
+def summarize_python(text: str) -> str:
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        lines = text.splitlines()
+        return "\n".join(lines[:5]) + (f"\n... ({len(lines)} lines)" if len(lines) > 5 else "")
+    signatures = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            signatures.append(f"def {node.name}({ast.unparse(node.args)})")
+        elif isinstance(node, ast.ClassDef):
+            methods = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            signatures.append(f"class {node.name}: {', '.join(methods)}")
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            signatures.append(ast.unparse(node))
+    return "\n".join(signatures) or "(no top-level definitions)"
+
+class IncrementalPromptBuilder:
+    # Full text the first time a file is seen, a signature summary while it is unchanged,
+    # and a unified diff against the previous version once it changes. With diffs=False a changed
+    # file is sent in full, for readers that never saw the previous version
+    def __init__(self, diffs: bool = True):
+        self.diffs = diffs
+        self.previous: Dict[str, str] = {}
+        self.iteration = 0
+        self.changed_at: Dict[str, int] = {}
+
+    def build(self, contents: Dict[str, str]) -> Tuple[str, Dict]:
+        self.iteration += 1
+        sections = []
+        full_sections = []
+        modes = {}
+        for name, text in contents.items():
+            full_section = f"# {name}\n{text}"
+            full_sections.append(full_section)
+            old = self.previous.get(name)
+            if old is None:
+                section, mode = full_section, "full"
+            elif old == text:
+                digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+                section = (f"# {name} (unchanged since iteration {self.changed_at[name]}, {len(text.splitlines())} lines, sha {digest})\n"
+                           f"{summarize_python(text)}")
+                mode = "unchanged"
+                if len(section) >= len(full_section):
+                    section, mode = full_section, "full"
+            elif not self.diffs:
+                section, mode = full_section, "full"
+            else:
+                diff = "".join(difflib.unified_diff(old.splitlines(True), text.splitlines(True), f"a/{name}", f"b/{name}"))
+                if len(diff) < len(text):
+                    section, mode = f"# {name} (diff against the previous iteration)\n{diff}", "diff"
+                else:
+                    section, mode = full_section, "full"
+            if old != text:
+                self.changed_at[name] = self.iteration
+            self.previous[name] = text
+            sections.append(section)
+            modes[name] = mode
+        prompt = "\n\n".join(sections)
+        report = {
+            "code_tokens": estimate_tokens(prompt),
+            "code_tokens_full": estimate_tokens("\n\n".join(full_sections)),
+            "files": modes
+        }
+        return prompt, report
+
+    def state_dict(self) -> Dict:
+        return {"previous": dict(self.previous), "iteration": self.iteration, "changed_at": dict(self.changed_at)}
+
+    def load_state_dict(self, state: Dict):
+        self.previous = dict(state["previous"])
+        self.iteration = state["iteration"]
+        self.changed_at = dict(state["changed_at"])
+
+class FeedbackBuffer:
+    # Keeps feedback from every iteration but renders only what fits in the token budget, newest first
+    def __init__(self, token_budget: int = 1000):
+        self.token_budget = token_budget
+        self.entries: List[Tuple[int, str]] = []
+
+    def add(self, iteration: int, feedback: str):
+        self.entries.append((iteration, feedback))
+
+    def state_dict(self) -> Dict:
+        return {"entries": [list(entry) for entry in self.entries]}
+
+    def load_state_dict(self, state: Dict):
+        self.entries = [(iteration, feedback) for iteration, feedback in state["entries"]]
+
+    def render(self) -> str:
+        parts = []
+        remaining = self.token_budget
+        for iteration, feedback in reversed(self.entries):
+            if remaining <= 0:
+                break
+            text = truncate_tokens(f"[Iteration {iteration}]\n{feedback}", remaining)
+            parts.append(text)
+            remaining -= estimate_tokens(text)
+        return "\n\n".join(parts)
@@ -0,0 +1,116 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+
+class QTable:
+    # States and actions are interned to integer rows/columns of a growable array.
+    # `seen` tracks which entries have been written, matching the old dict-of-dicts
+    # semantics where only touched actions take part in max/argmax.
+    def __init__(self, actions: Iterable[str] = (), initial_states: int = 64):
+        self.state_index: Dict[str, int] = {}
+        self.states: List[str] = []
+        self.action_index: Dict[str, int] = {}
+        self.actions: List[str] = []
+        action_list = list(actions)
+        self.values = np.zeros((initial_states, max(len(action_list), 4)), dtype=np.float64)
+        self.seen = np.zeros(self.values.shape, dtype=bool)
+        for action in action_list:
+            self.action_id(action)
+
+    def _grow(self, rows: int, cols: int):
+        new_rows = max(rows, self.values.shape[0])
+        new_cols = max(cols, self.values.shape[1])
+        if (new_rows, new_cols) == self.values.shape:
+            return
+        values = np.zeros((new_rows, new_cols), dtype=np.float64)
+        seen = np.zeros((new_rows, new_cols), dtype=bool)
+        values[:self.values.shape[0], :self.values.shape[1]] = self.values
+        seen[:self.seen.shape[0], :self.seen.shape[1]] = self.seen
+        self.values, self.seen = values, seen
+
+    def state_id(self, state: str) -> int:
+        index = self.state_index.get(state)
+        if index is None:
+            index = len(self.states)
+            if index >= self.values.shape[0]:
+                self._grow(self.values.shape[0] * 2, 0)
+            self.state_index[state] = index
+            self.states.append(state)
+        return index
+
+    def action_id(self, action: str) -> int:
+        index = self.action_index.get(action)
+        if index is None:
+            index = len(self.actions)
+            if index >= self.values.shape[1]:
+                self._grow(0, self.values.shape[1] * 2)
+            self.action_index[action] = index
+            self.actions.append(action)
+        return index
+
+    def touch(self, state: str, action: str) -> tuple:
+        s, a = self.state_id(state), self.action_id(action)
+        self.seen[s, a] = True
+        return s, a
+
+    def max_values(self, state_ids: np.ndarray) -> np.ndarray:
+        masked = np.where(self.seen[state_ids], self.values[state_ids], -np.inf)
+        best = masked.max(axis=1)
+        return np.where(np.isfinite(best), best, 0.0)
+
+    def max_value(self, state: str) -> float:
+        s = self.state_index.get(state)
+        if s is None:
+            return 0.0
+        return float(self.max_values(np.array([s]))[0])
+
+    def best_actions(self, state_ids: np.ndarray) -> List[Optional[str]]:
+        seen = self.seen[state_ids]
+        best = np.where(seen, self.values[state_ids], -np.inf).argmax(axis=1)
+        return [self.actions[a] if row.any() else None for a, row in zip(best, seen)]
+
+    def best_action(self, state: str) -> Optional[str]:
+        return self.best_actions(np.array([self.state_id(state)]))[0]
+
+    def ids(self, states: Sequence[str], actions: Sequence[str]) -> tuple:
+        return (np.array([self.state_id(s) for s in states], dtype=np.int64),
+                np.array([self.action_id(a) for a in actions], dtype=np.int64))
+
+    def move_toward(self, s: np.ndarray, a: np.ndarray, targets: np.ndarray, alpha: float):
+        # A pair repeated k times in a batch takes the k sequential steps it would have taken toward
+        # its mean target, v += (1 - (1 - alpha)^k) * (target - v), instead of k full steps from the
+        # same stale value, which overshoots and diverges on replay data full of duplicates
+        flat = s * self.values.shape[1] + a
+        pairs, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        mean_targets = np.bincount(inverse, weights=targets) / counts
+        rows, cols = pairs // self.values.shape[1], pairs % self.values.shape[1]
+        self.values[rows, cols] += (1 - (1 - alpha) ** counts) * (mean_targets - self.values[rows, cols])
+
+    # Dict-style read access so callers and tests can keep using q_table[state][action]
+    def __getitem__(self, state: str) -> Dict[str, float]:
+        s = self.state_index[state]
+        return {action: float(self.values[s, a]) for a, action in enumerate(self.actions) if self.seen[s, a]}
+
+    def __contains__(self, state: str) -> bool:
+        return state in self.state_index
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def get(self, state: str, default=None):
+        return self[state] if state in self.state_index else default
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        return {state: self[state] for state in self.states}
+
+    @classmethod
+    def from_arrays(cls, states: List[str], actions: List[str], values: np.ndarray, seen: np.ndarray) -> "QTable":
+        # values/seen may be memory-mapped; they are only copied when the table has to grow
+        table = cls()
+        table.states = list(states)
+        table.state_index = {state: i for i, state in enumerate(table.states)}
+        table.actions = list(actions)
+        table.action_index = {action: i for i, action in enumerate(table.actions)}
+        table.values = values
+        table.seen = seen
+        table._grow(max(len(states), 1), max(len(actions), 1))
+        return table
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+
+class ReplayBuffer:
+    # Fixed-capacity ring of transitions; strings are interned so the arrays stay numeric
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int32)
+        self.next_actions = np.full(capacity, -1, dtype=np.int32)
+        self.algorithms = np.full(capacity, -1, dtype=np.int32)
+        self.pos = 0
+        self.size = 0
+        self.vocab: List[str] = []
+        self.vocab_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        index = self.vocab_index.get(value)
+        if index is None:
+            index = len(self.vocab)
+            self.vocab.append(value)
+            self.vocab_index[value] = index
+        return index
+
+    def add(self, state: str, action: str, reward: float, next_state: str, next_action: Optional[str] = None, algorithm: Optional[str] = None):
+        i = self.pos
+        self.states[i] = self._intern(state)
+        self.actions[i] = self._intern(action)
+        self.rewards[i] = reward
+        self.next_states[i] = self._intern(next_state)
+        self.next_actions[i] = self._intern(next_action)
+        self.algorithms[i] = self._intern(algorithm)
+        self.pos = (self.pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _indices(self) -> np.ndarray:
+        # Oldest to newest
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.size) + self.pos) % self.capacity
+
+    def _decode(self, indices: np.ndarray) -> Dict[str, List]:
+        vocab = self.vocab
+        next_actions = [vocab[a] if a >= 0 else None for a in self.next_actions[indices]]
+        return {
+            "states": [vocab[s] for s in self.states[indices]],
+            "actions": [vocab[a] for a in self.actions[indices]],
+            "rewards": self.rewards[indices].astype(np.float64),
+            "next_states": [vocab[s] for s in self.next_states[indices]],
+            "next_actions": next_actions if all(a is not None for a in next_actions) else None
+        }
+
+    def batches(self, batch_size: int = 256, shuffle: bool = True, rng: Optional[np.random.Generator] = None) -> Iterator[Dict[str, List]]:
+        indices = self._indices()
+        if shuffle:
+            indices = (rng or np.random.default_rng()).permutation(indices)
+        for start in range(0, len(indices), batch_size):
+            yield self._decode(indices[start:start + batch_size])
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> Dict[str, List]:
+        indices = (rng or np.random.default_rng()).choice(self._indices(), size=min(batch_size, self.size), replace=False)
+        return self._decode(indices)
+
+    def save(self, path: str):
+        indices = self._indices()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                capacity=np.array(self.capacity),
+                states=self.states[indices],
+                actions=self.actions[indices],
+                rewards=self.rewards[indices],
+                next_states=self.next_states[indices],
+                next_actions=self.next_actions[indices],
+                algorithms=self.algorithms[indices],
+                vocab=np.array(self.vocab, dtype=str)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, capacity: Optional[int] = None) -> "ReplayBuffer":
+        with np.load(path, allow_pickle=False) as data:
+            buffer = cls(capacity or int(data["capacity"]))
+            buffer.vocab = [str(v) for v in data["vocab"]]
+            buffer.vocab_index = {v: i for i, v in enumerate(buffer.vocab)}
+            # Keep the newest transitions if the stored buffer is larger than this one
+            n = min(len(data["states"]), buffer.capacity)
+            for name in ("states", "actions", "rewards", "next_states", "next_actions", "algorithms"):
+                getattr(buffer, name)[:n] = data[name][len(data[name]) - n:]
+        buffer.size = n
+        buffer.pos = n % buffer.capacity
+        return buffer
+
+def train_offline(algorithm, buffer: ReplayBuffer, batch_size: int = 256, epochs: int = 1, rng: Optional[np.random.Generator] = None) -> int:
+    updates = 0
+    for _ in range(epochs):
+        for batch in buffer.batches(batch_size, shuffle=True, rng=rng):
+            algorithm.update_batch(batch["states"], batch["actions"], batch["rewards"], batch["next_states"], batch["next_actions"])
+            updates += len(batch["states"])
+    return updates
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+class ResponseCache:
+    def __init__(self, cache_dir: str = ".response_cache", max_bytes: int = 100 * 1024 * 1024,
+                 max_age: float = 7 * 24 * 3600, bypass: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def key(payload: Dict) -> str:
+        # payload is the request body: model id, messages and sampling parameters
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _remove(self, path: str, size: int):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        self._total_bytes -= size
+        self.evictions += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.bypass:
+            return None
+        path = self._path(key)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                if time.time() - stat.st_mtime > self.max_age:
+                    self._remove(path, stat.st_size)
+                    raise FileNotFoundError(path)
+                with open(path, "r") as f:
+                    value = json.load(f)["value"]
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        if self.bypass:
+            return
+        path = self._path(key)
+        data = json.dumps({"value": value, "created": time.time()})
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._total_bytes = sum(size for _, _, size in entries)
+        for path, mtime, size in entries:
+            if now - mtime <= self.max_age and self._total_bytes <= self.max_bytes:
+                break
+            self._remove(path, size)
+
+    def clear(self):
+        with self._lock:
+            for path, _, size in list(self._entries()):
+                self._remove(path, size)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._total_bytes
+        }
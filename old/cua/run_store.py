@@ -0,0 +1,204 @@
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    output_dir TEXT,
+    config_hash TEXT,
+    config_json TEXT,
+    generator_model TEXT,
+    started_at REAL,
+    finished_at REAL,
+    status TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS run_models (
+    run_id TEXT,
+    model TEXT,
+    role TEXT,
+    PRIMARY KEY (run_id, model, role)
+);
+CREATE TABLE IF NOT EXISTS iterations (
+    run_id TEXT,
+    iteration INTEGER,
+    rl_algorithm TEXT,
+    score REAL,
+    elapsed REAL,
+    recorded_at REAL,
+    entry_json TEXT,
+    PRIMARY KEY (run_id, iteration)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_config_hash ON runs (config_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_output_dir ON runs (output_dir);
+CREATE INDEX IF NOT EXISTS idx_run_models_model ON run_models (model);
+CREATE INDEX IF NOT EXISTS idx_iterations_algorithm_score ON iterations (rl_algorithm, score);
+CREATE INDEX IF NOT EXISTS idx_iterations_score ON iterations (score);
+"""
+
+def config_hash(config: Optional[Dict]) -> Optional[str]:
+    if config is None:
+        return None
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+class RunStore:
+    # SQLite in WAL mode: every iteration is its own transaction, so a crash loses at most the iteration in flight
+    def __init__(self, path: str = "runs.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def start_run(self, output_dir: str, config: Optional[Dict] = None, generator_model: Optional[str] = None,
+                  evaluator_models: Iterable[str] = (), run_id: Optional[str] = None, source: str = "live") -> str:
+        run_id = run_id or uuid.uuid4().hex
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, output_dir, config_hash, config_json, generator_model, started_at, status, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'running', ?)",
+                (run_id, os.path.abspath(output_dir), config_hash(config), json.dumps(config) if config is not None else None,
+                 generator_model, time.time(), source)
+            )
+            models = [(run_id, generator_model, "generator")] if generator_model else []
+            models += [(run_id, model, "evaluator") for model in evaluator_models]
+            self.conn.executemany("INSERT OR IGNORE INTO run_models (run_id, model, role) VALUES (?, ?, ?)", models)
+        return run_id
+
+    def record_iteration(self, run_id: str, entry: Dict):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO iterations (run_id, iteration, rl_algorithm, score, elapsed, recorded_at, entry_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, entry.get("iteration"), entry.get("rl_algorithm"), entry.get("score"), entry.get("elapsed"),
+                 time.time(), json.dumps(entry, default=str))
+            )
+
+    def finish_run(self, run_id: str, status: str = "finished"):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?", (time.time(), status, run_id))
+
+    def query(self, algorithm: Optional[str] = None, min_score: Optional[float] = None, max_score: Optional[float] = None,
+              model: Optional[str] = None, config_hash: Optional[str] = None, run_id: Optional[str] = None,
+              order_by: str = "score", limit: Optional[int] = None) -> List[Dict]:
+        clauses, params = [], []
+        for clause, value in (("i.rl_algorithm = ?", algorithm), ("i.score >= ?", min_score), ("i.score <= ?", max_score),
+                              ("r.config_hash = ?", config_hash), ("i.run_id = ?", run_id)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if model is not None:
+            clauses.append("EXISTS (SELECT 1 FROM run_models m WHERE m.run_id = i.run_id AND m.model = ?)")
+            params.append(model)
+        order = {"score": "i.score DESC", "recent": "i.recorded_at DESC", "iteration": "i.run_id, i.iteration"}[order_by]
+        sql = ("SELECT i.run_id, i.iteration, i.rl_algorithm, i.score, i.elapsed, i.entry_json, r.output_dir, r.config_hash, "
+               "r.generator_model, r.status FROM iterations i JOIN runs r ON r.run_id = i.run_id")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["entry"] = json.loads(result.pop("entry_json"))
+            results.append(result)
+        return results
+
+    def runs(self, status: Optional[str] = None) -> List[Dict]:
+        sql = ("SELECT r.*, COUNT(i.iteration) AS iterations, MAX(i.score) AS best_score FROM runs r "
+               "LEFT JOIN iterations i ON i.run_id = r.run_id")
+        params = []
+        if status is not None:
+            sql += " WHERE r.status = ?"
+            params.append(status)
+        sql += " GROUP BY r.run_id ORDER BY r.started_at"
+        with self.lock:
+            return [{k: row[k] for k in row.keys() if k != "config_json"} for row in self.conn.execute(sql, params).fetchall()]
+
+    def import_results(self, path: str, config: Optional[Dict] = None) -> Optional[str]:
+        # Idempotent: a directory already in the store (imported or recorded live) is skipped
+        output_dir = os.path.abspath(os.path.dirname(path))
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM runs WHERE output_dir = ?", (output_dir,)).fetchone():
+                return None
+        with open(path, "r") as f:
+            history = json.load(f)
+        run_id = self.start_run(output_dir, config, run_id=hashlib.sha256(output_dir.encode("utf-8")).hexdigest()[:32], source="import")
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO iterations (run_id, iteration, rl_algorithm, score, elapsed, recorded_at, entry_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, entry.get("iteration"), entry.get("rl_algorithm"), entry.get("score"), entry.get("elapsed"),
+                  os.path.getmtime(path), json.dumps(entry)) for entry in history]
+            )
+            self.conn.execute("UPDATE runs SET status = 'finished', started_at = ?, finished_at = ? WHERE run_id = ?",
+                              (os.path.getmtime(path), os.path.getmtime(path), run_id))
+        return run_id
+
+    def import_outputs(self, root: str = "outputs", config: Optional[Dict] = None) -> List[str]:
+        imported = []
+        for path in sorted(glob.glob(os.path.join(root, "*", "simulation_results.json"))):
+            try:
+                run_id = self.import_results(path, config)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            if run_id is not None:
+                imported.append(run_id)
+        return imported
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query and import simulation runs")
+    parser.add_argument("--db", default="runs.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="Import outputs/*/simulation_results.json")
+    importer.add_argument("root", nargs="?", default="outputs")
+    query = sub.add_parser("query", help="List iterations matching the filters")
+    query.add_argument("--algorithm")
+    query.add_argument("--min-score", type=float)
+    query.add_argument("--max-score", type=float)
+    query.add_argument("--model")
+    query.add_argument("--config-hash")
+    query.add_argument("--order-by", choices=["score", "recent", "iteration"], default="score")
+    query.add_argument("--limit", type=int, default=20)
+    sub.add_parser("runs", help="List runs with their best score")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    store = RunStore(args.db)
+    try:
+        if args.command == "import":
+            imported = store.import_outputs(args.root)
+            print(f"Imported {len(imported)} run(s) from {args.root}")
+        elif args.command == "query":
+            for row in store.query(args.algorithm, args.min_score, args.max_score, args.model, args.config_hash,
+                                   order_by=args.order_by, limit=args.limit):
+                print(f"{row['score']:6.1f}  {row['rl_algorithm'] or '-':12} iter {row['iteration']:<3} {row['output_dir']}")
+        else:
+            for run in store.runs():
+                best = f"{run['best_score']:.1f}" if run["best_score"] is not None else "-"
+                print(f"{run['run_id'][:12]}  {run['status']:8} {run['iterations']:3} iterations  best {best:>6}  {run['output_dir']}")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,126 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+import concurrent.futures
+from typing import Dict, Optional
+
+class RingBuffer:
+    # Keeps the first and last `limit // 2` bytes of a stream and counts the rest
+    def __init__(self, limit: int = 64 * 1024):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes truncated] ...\n{tail}"
+        return head + tail
+
+def _kill_group(process):
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+async def _pump(stream, buffer: RingBuffer):
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        buffer.write(chunk)
+
+async def run_command(command: str, timeout: float = 60.0, max_output_bytes: int = 64 * 1024, cwd: Optional[str] = None) -> Dict:
+    start = time.time()
+    stdout, stderr = RingBuffer(max_output_bytes), RingBuffer(max_output_bytes)
+    process = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        stdin=asyncio.subprocess.DEVNULL,
+        cwd=cwd,
+        # Own process group so a timeout kills the whole pipeline, not just the shell
+        start_new_session=os.name == "posix"
+    )
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.gather(_pump(process.stdout, stdout), _pump(process.stderr, stderr), process.wait()), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill_group(process)
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+    return {
+        "command": command,
+        "exit_code": process.returncode,
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "stdout_bytes": stdout.total,
+        "stderr_bytes": stderr.total,
+        "duration": time.time() - start,
+        "timed_out": timed_out
+    }
+
+class ShellExecutor:
+    # Every command runs on one event loop owned by a daemon thread, so the concurrency cap and the
+    # subprocess watcher are shared and no caller ever has to start a loop of its own. Synchronous
+    # callers use run(); code already inside an event loop awaits arun()
+    def __init__(self, timeout: float = 60.0, max_output_bytes: int = 64 * 1024, max_concurrent: int = 4):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.max_concurrent = max(1, max_concurrent)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.lock = threading.Lock()
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.slots = asyncio.Semaphore(self.max_concurrent)
+                threading.Thread(target=self.loop.run_forever, name="shell-executor", daemon=True).start()
+            return self.loop
+
+    async def _run(self, command: str, cwd: Optional[str]) -> Dict:
+        async with self.slots:
+            return await run_command(command, self.timeout, self.max_output_bytes, cwd)
+
+    def submit(self, command: str, cwd: Optional[str] = None) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self._run(command, cwd), self._start())
+
+    def run(self, command: str, cwd: Optional[str] = None) -> Dict:
+        return self.submit(command, cwd).result()
+
+    async def arun(self, command: str, cwd: Optional[str] = None) -> Dict:
+        return await asyncio.wrap_future(self.submit(command, cwd))
+
+    def close(self):
+        with self.lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop = None
@@ -0,0 +1,239 @@
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Reply statuses, from best to worst; only the last two are worth paying for another call
+CLEAN, EXTRACTED, REPAIRED, INVALID, UNPARSEABLE = "clean", "extracted", "repaired", "invalid", "unparseable"
+RETRYABLE = (INVALID, UNPARSEABLE)
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_NUMBER = re.compile(r"^\s*(-?\d+(?:\.\d+)?)")
+
+def _close(text: str, stack: List[str], in_string: bool) -> str:
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # A member cut off after its key or colon cannot be completed, so it is dropped
+    text = re.sub(r'(,|{)\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", text)
+    text = text.rstrip().rstrip(",")
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+def repair_json(text: str, truncated: bool = False) -> str:
+    # Fixes what models commonly get wrong: trailing commas, Python literals and, for a reply
+    # cut off by max_tokens, the unclosed string and brackets at the end
+    out = []
+    stack = []
+    in_string = escape = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in _CLOSERS:
+            stack.append(char)
+            out.append(char)
+        elif char in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(char)
+        else:
+            word = re.match(r"True|False|None", text[i:i + 5])
+            if word and not (out and (out[-1].isalnum() or out[-1] == "_")):
+                out.append(_LITERALS[word.group(0)])
+                i += len(word.group(0))
+                continue
+            out.append(char)
+        i += 1
+    repaired = "".join(out)
+    return _close(repaired, stack, in_string) if truncated and (stack or in_string) else repaired
+
+def _loads(text: str):
+    # strict=False accepts raw newlines inside strings, which models emit all the time
+    return json.loads(text, strict=False)
+
+class JSONExtractor:
+    # Finds the first JSON object in streamed text (prose, ```json fences and all) in a single pass:
+    # feed() returns the object as soon as its closing brace arrives, finish() repairs a truncated one.
+    # A balanced candidate that does not parse is skipped whole, so objects nested inside it are not found
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.start = None
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.result = None
+        self.status = None
+
+    def feed(self, chunk: str) -> Optional[Dict]:
+        if self.result is not None:
+            return self.result
+        self.buffer += chunk
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            self.pos += 1
+            if self.start is None:
+                if char == "{":
+                    self.start = self.pos - 1
+                    self.stack = ["{"]
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in _CLOSERS:
+                self.stack.append(char)
+            elif char in "}]":
+                self.stack.pop()
+                if not self.stack:
+                    if self._accept(self.buffer[self.start:self.pos], False):
+                        return self.result
+                    # Braces in prose ("{score}") are not the object; keep looking after this one.
+                    # Rescanning from inside it instead would make nested junk quadratic
+                    self.start = None
+        return None
+
+    def _accept(self, text: str, truncated: bool) -> bool:
+        for status, candidate in ((EXTRACTED, text), (REPAIRED, repair_json(text, truncated))):
+            try:
+                value = _loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                self.result, self.status = value, status
+                return True
+        return False
+
+    def finish(self) -> Optional[Dict]:
+        if self.result is None and self.start is not None:
+            self._accept(self.buffer[self.start:], True)
+        return self.result
+
+def extract_json(text: str) -> Tuple[Optional[Dict], Optional[str]]:
+    try:
+        value = _loads(text.strip())
+        if isinstance(value, dict):
+            return value, CLEAN
+    except ValueError:
+        pass
+    extractor = JSONExtractor()
+    extractor.feed(text)
+    value = extractor.finish()
+    return value, extractor.status
+
+class Schema:
+    # fields maps names to int, float or str. Missing optional fields get an empty value, numbers
+    # arriving as strings ("85", "85/100") are coerced and bounded numbers are clamped
+    def __init__(self, fields: Dict[str, type], required: Iterable[str] = (), bounds: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.fields = fields
+        self.required = set(required)
+        self.bounds = bounds or {}
+
+    def describe(self) -> str:
+        return ", ".join(f"{name} ({kind.__name__})" for name, kind in self.fields.items())
+
+    def _coerce(self, name: str, kind: type, value):
+        if kind is str:
+            return value if isinstance(value, str) else json.dumps(value)
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number, got {value!r}")
+        if isinstance(value, str):
+            match = _NUMBER.match(value)
+            if not match:
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            value = float(match.group(1))
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"{name} must be a number, got {value!r}")
+        low, high = self.bounds.get(name, (value, value))
+        value = min(max(value, low), high)
+        return int(round(value)) if kind is int else float(value)
+
+    def validate(self, value: Dict) -> Tuple[Dict, List[str]]:
+        result, errors = dict(value), []
+        for name, kind in self.fields.items():
+            if value.get(name) is None:
+                if name in self.required:
+                    errors.append(f"missing {name}")
+                else:
+                    result[name] = kind()
+                continue
+            try:
+                result[name] = self._coerce(name, kind, value[name])
+            except ValueError as e:
+                errors.append(str(e))
+        return result, errors
+
+def parse_reply(text: str, schema: Schema) -> Dict:
+    value, status = extract_json(text or "")
+    if value is None:
+        return {"value": None, "status": UNPARSEABLE, "errors": ["no JSON object found"]}
+    value, errors = schema.validate(value)
+    if errors:
+        return {"value": None, "status": INVALID, "errors": errors}
+    return {"value": value, "status": status, "errors": []}
+
+def retry_messages(messages: List[Dict], content: str, parsed: Dict, schema: Schema) -> List[Dict]:
+    # Showing the model its own reply is cheaper to fix than re-asking from scratch
+    return messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": f"That reply could not be used ({'; '.join(parsed['errors'])}). "
+                                    f"Reply with only a JSON object with: {schema.describe()}."}
+    ]
+
+class ParseStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sources: Dict[str, Dict[str, int]] = {}
+
+    def record(self, source: str, status: str, retry: bool = False):
+        with self.lock:
+            counts = self.sources.setdefault(source, {"replies": 0, "retries": 0, CLEAN: 0, EXTRACTED: 0, REPAIRED: 0, INVALID: 0, UNPARSEABLE: 0})
+            counts["replies"] += 1
+            counts["retries"] += int(retry)
+            counts[status] += 1
+
+    def report(self) -> Dict:
+        with self.lock:
+            report = {}
+            for source, counts in self.sources.items():
+                failed = counts[INVALID] + counts[UNPARSEABLE]
+                report[source] = {**counts, "failure_rate": failed / counts["replies"],
+                                  "repair_rate": (counts[EXTRACTED] + counts[REPAIRED]) / counts["replies"]}
+            return report
+
+parse_stats = ParseStats()
+
+# Models that rejected response_format; they keep getting plain requests for the rest of the process
+_no_json_mode = set()
+_no_json_mode_lock = threading.Lock()
+
+def json_mode_supported(model_id: str) -> bool:
+    with _no_json_mode_lock:
+        return model_id not in _no_json_mode
+
+def disable_json_mode(model_id: str):
+    with _no_json_mode_lock:
+        _no_json_mode.add(model_id)
+
+def rejects_json_mode(response) -> bool:
+    return response.status_code in (400, 422) and "response_format" in (response.text or "")
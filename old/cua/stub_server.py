@@ -0,0 +1,178 @@
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Union
+
+class LatencyModel:
+    # kind: "fixed" (value), "uniform" (low, high), "lognormal" (median, sigma), "exponential" (mean)
+    def __init__(self, kind: str = "fixed", rng: Optional[random.Random] = None, **params):
+        if kind not in ("fixed", "uniform", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.params = params
+        self.rng = rng or random.Random(0)
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p.get("value", 0.0)
+        if self.kind == "uniform":
+            return self.rng.uniform(p.get("low", 0.0), p.get("high", 0.1))
+        if self.kind == "lognormal":
+            return p.get("median", 0.05) * self.rng.lognormvariate(0.0, p.get("sigma", 0.5))
+        return self.rng.expovariate(1.0 / p.get("mean", 0.05))
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is normal; anything else still gets reported
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+class StubServer:
+    # script: either a list of replies served in rotation, or a list of (substring, reply)
+    # rules matched against the prompt, or a callable taking the request body
+    def __init__(self, script: Union[List, Callable[[Dict], str]], latency: Optional[LatencyModel] = None,
+                 error_rate_429: float = 0.0, error_rate_5xx: float = 0.0, retry_after: Optional[int] = None,
+                 stream_chunk_chars: int = 64, stream_chunk_delay: float = 0.0, seed: int = 0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.script = script
+        self.latency = latency or LatencyModel("fixed", value=0.0)
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay = stream_chunk_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.turn = 0
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "5xx": 0, "streamed": 0, "bytes_in": 0, "bytes_out": 0}
+        self.requests = []
+        self.httpd = _QuietHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, body: Dict) -> str:
+        if callable(self.script):
+            return self.script(body)
+        prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+        if self.script and isinstance(self.script[0], (tuple, list)):
+            for needle, reply in self.script:
+                if needle in prompt:
+                    return reply
+            return self.script[-1][1]
+        with self.lock:
+            reply = self.script[self.turn % len(self.script)]
+            self.turn += 1
+        return reply
+
+    def _roll_error(self) -> Optional[int]:
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.error_rate_429:
+            return 429
+        if roll < self.error_rate_429 + self.error_rate_5xx:
+            return 503
+        return None
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                server._count("bytes_out", len(data))
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._count("requests")
+                server._count("bytes_in", len(raw))
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+                    return
+                body = json.loads(raw or b"{}")
+                with server.lock:
+                    server.requests.append(body)
+                time.sleep(server.latency.sample())
+                status = server._roll_error()
+                if status is not None:
+                    server._count("429" if status == 429 else "5xx")
+                    headers = {"Retry-After": str(server.retry_after)} if status == 429 and server.retry_after is not None else None
+                    self._send_json(status, {"error": {"message": "Injected error", "code": status}}, headers)
+                    return
+                reply = server.reply_for(body)
+                server._count("ok")
+                if body.get("stream"):
+                    server._count("streamed")
+                    self._stream(body, reply)
+                    return
+                self._send_json(200, {
+                    "id": "stub",
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(reply) // 4}
+                })
+
+            def _stream(self, body: Dict, reply: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write_chunk(text: str):
+                    data = text.encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+                    server._count("bytes_out", len(data))
+
+                write_chunk(": OPENROUTER PROCESSING\n\n")
+                size = max(1, server.stream_chunk_chars)
+                for start in range(0, len(reply), size):
+                    delta = {"choices": [{"index": 0, "delta": {"content": reply[start:start + size]}}], "model": body.get("model")}
+                    write_chunk(f"data: {json.dumps(delta)}\n\n")
+                    if server.stream_chunk_delay:
+                        time.sleep(server.stream_chunk_delay)
+                write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
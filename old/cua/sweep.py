@@ -0,0 +1,152 @@
+import os
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from http_client import HTTPClient
+from warm_pytest import PytestWorker
+from cua4_rl import Agent, EvaluatorAgent, FileTools, OpenRouter, RLGeneratorAgent, RLSimulation, ShellTools
+
+DEFAULT_MODEL = "google/gemini-2.0-flash-001"
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+RESULT_COLUMNS = ["job_id", "rl_algorithm", "evaluators", "max_iterations", "seed", "output_dir",
+                  "iterations", "best_score", "final_score", "elapsed", "error"]
+
+# Set in each worker process by _init_worker; caps in-flight API requests across the whole sweep
+_request_slots = None
+_client = None
+
+def _init_worker(semaphore):
+    global _request_slots, _client
+    _request_slots = semaphore
+    # One client per worker process so its jobs share keep-alive connections and rate limits
+    _client = HTTPClient(slots=semaphore)
+
+def expand_grid(grid: Dict[str, List], config_file: str, sweep_dir: str) -> List[Dict]:
+    axes = {
+        "rl_algorithm": grid.get("rl_algorithm", ["dynamic"]),
+        "evaluators": grid.get("evaluators", [[DEFAULT_MODEL]]),
+        "max_iterations": grid.get("max_iterations", [3]),
+        "seed": grid.get("seed", [0])
+    }
+    jobs = []
+    for job_id, values in enumerate(itertools.product(*axes.values())):
+        job = dict(zip(axes.keys(), values))
+        job.update({
+            "job_id": job_id,
+            "config_file": config_file,
+            "sweep_dir": sweep_dir,
+            "generator_model": grid.get("generator_model", DEFAULT_MODEL),
+            "base_url": grid.get("base_url", DEFAULT_BASE_URL)
+        })
+        jobs.append(job)
+    return jobs
+
+def run_job(job: Dict) -> Dict:
+    random.seed(job["seed"])
+    np.random.seed(job["seed"])
+    row = {key: job.get(key) for key in ("job_id", "rl_algorithm", "evaluators", "max_iterations", "seed")}
+    start_time = time.time()
+    # Jobs already run one per core, so suites stay unsharded
+    test_worker = PytestWorker(per_test_timeout=10)
+    try:
+        api_key = os.getenv("OPENROUTER_API_KEY", "")
+        with open(job["config_file"], "r") as f:
+            config = json.load(f)
+        config["rl_algorithm"] = job["rl_algorithm"]
+        config_dir = os.path.join(job["sweep_dir"], "configs")
+        os.makedirs(config_dir, exist_ok=True)
+        job_config_file = os.path.join(config_dir, f"job_{job['job_id']}.json")
+        with open(job_config_file, "w") as f:
+            json.dump(config, f, indent=2)
+
+        session = _client or HTTPClient(slots=_request_slots)
+        generator = Agent(
+            model=OpenRouter(id=job["generator_model"], api_key=api_key, base_url=job["base_url"]),
+            tools=[ShellTools(), FileTools()],
+            session=session
+        )
+        evaluators = [
+            EvaluatorAgent(OpenRouter(id=model_id, api_key=api_key, base_url=job["base_url"]), session=session)
+            for model_id in job["evaluators"]
+        ]
+        rl_generator = RLGeneratorAgent(OpenRouter(id=job["generator_model"], api_key=api_key, base_url=job["base_url"]), session=session)
+        simulation = RLSimulation(
+            generator=generator,
+            evaluators=evaluators,
+            rl_generator=rl_generator,
+            config_file=job_config_file,
+            max_iterations=job["max_iterations"],
+            output_root=os.path.join(job["sweep_dir"], "runs"),
+            test_worker=test_worker
+        )
+        row["output_dir"] = simulation.output_dir
+        simulation.run()
+        scores = [entry["score"] for entry in simulation.history]
+        row.update({
+            "iterations": len(scores),
+            "best_score": max(scores, default=0),
+            "final_score": scores[-1] if scores else 0,
+            "error": ""
+        })
+    except Exception as e:
+        row["error"] = str(e)
+    finally:
+        test_worker.close()
+    row["elapsed"] = round(time.time() - start_time, 3)
+    return row
+
+def run_sweep(jobs: List[Dict], workers: Optional[int] = None, max_inflight: int = 8,
+              runner: Callable[[Dict], Dict] = run_job) -> List[Dict]:
+    semaphore = multiprocessing.BoundedSemaphore(max_inflight)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(semaphore,)) as executor:
+        futures = {executor.submit(runner, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                row = {"job_id": job["job_id"], "error": f"Worker failed: {str(e)}"}
+            print(f"Job {row.get('job_id')} finished: best={row.get('best_score')} error={row.get('error') or 'none'}")
+            rows.append(row)
+    return sorted(rows, key=lambda row: row["job_id"])
+
+def write_results_table(rows: List[Dict], sweep_dir: str):
+    os.makedirs(sweep_dir, exist_ok=True)
+    with open(os.path.join(sweep_dir, "sweep_results.json"), "w") as f:
+        json.dump(rows, f, indent=2)
+    with open(os.path.join(sweep_dir, "sweep_results.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "evaluators": " ".join(row.get("evaluators") or [])})
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of RLSimulation configurations in parallel")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--grid", required=True, help="JSON file with rl_algorithm, evaluators, max_iterations and seed lists")
+    parser.add_argument("--out", default="sweep")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-inflight", type=int, default=8, help="Global cap on concurrent API requests")
+    args = parser.parse_args()
+
+    if not os.getenv("OPENROUTER_API_KEY"):
+        print("Please set your OPENROUTER_API_KEY environment variable.")
+        exit(1)
+    with open(args.grid, "r") as f:
+        grid = json.load(f)
+    jobs = expand_grid(grid, os.path.abspath(args.config), os.path.abspath(args.out))
+    print(f"Running {len(jobs)} jobs")
+    rows = run_sweep(jobs, workers=args.workers, max_inflight=args.max_inflight)
+    write_results_table(rows, args.out)
+    print(f"Results saved to {args.out}/sweep_results.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+from artifact_store import ArtifactStore
+from cua4_rl import FileTools
+from conftest import FakeEvaluator, FakeGenerator, make_simulation
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    first = store.write_file(str(tmp_path / "run_1"), "a.py", "x = 1\n")
+    second = store.write_file(str(tmp_path / "run_2"), "a.py", "x = 1\n")
+    assert first == second
+    usage = store.usage()
+    assert usage["objects"] == 1 and usage["dedup_hits"] == 1
+    assert not [name for name in os.listdir(tmp_path / "run_1") if name.endswith(".tmp")]
+
+def test_reads_come_from_memory_until_the_file_changes(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    out = str(tmp_path / "out")
+    store.write_file(out, "a.py", "x = 1\n")
+    assert store.read_file(out, "a.py") == "x = 1\n"
+    assert store.read_file(out, "a.py") == "x = 1\n"
+    assert store.stats["cache_hits"] == 2 and store.stats["cache_misses"] == 0
+    # An edit behind the store's back changes the stat, so the file is rehashed
+    with open(os.path.join(out, "a.py"), "w") as f:
+        f.write("x = 22\n")
+    assert store.read_file(out, "a.py") == "x = 22\n"
+
+def test_in_place_edits_never_reach_stored_objects(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    out = str(tmp_path / "out")
+    digest = store.write_file(out, "a.py", "x = 1\n")
+    with open(os.path.join(out, "a.py"), "a") as f:
+        f.write("y = 2\n")
+    with open(store._object_path(digest)) as f:
+        assert f.read() == "x = 1\n"
+    assert os.stat(os.path.join(out, "a.py")).st_nlink == 1
+
+def test_manifests_diff_and_restore(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    out = str(tmp_path / "out")
+    store.write_file(out, "lib.py", "def f():\n    return 1\n")
+    store.write_file(out, "tests.py", "def test_f():\n    pass\n")
+    store.snapshot(out, 1, ["lib.py", "tests.py"], score=80)
+    store.write_file(out, "lib.py", "def f():\n    return 2\n")
+    store.snapshot(out, 2, ["lib.py", "tests.py", "missing.py"], score=40)
+
+    diffs = store.diff(out, 1, 2)
+    assert list(diffs) == ["lib.py"]
+    assert "-    return 1" in diffs["lib.py"] and "+    return 2" in diffs["lib.py"]
+    assert store.best(out)["iteration"] == 1
+    store.restore(out, 1)
+    with open(os.path.join(out, "lib.py")) as f:
+        assert f.read() == "def f():\n    return 1\n"
+
+def test_simulation_snapshots_every_iteration_and_restores_best(make_config, tmp_path):
+    config_file = make_config(restore_best=True)
+
+    class VersionedGenerator(FakeGenerator):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        def run(self, prompt, max_tokens=2000, output_dir=".", cancel=None):
+            super().run(prompt, max_tokens, output_dir)
+            self.calls += 1
+            self.tools["FileTools"].save(f"VERSION = {self.calls}\n", "app.py", output_dir)
+            return "saved"
+
+    class ScriptedEvaluator(FakeEvaluator):
+        def evaluate_code(self, *args):
+            self.calls += 1
+            return {"score": [30, 70, 50][self.calls - 1], "functionality_feedback": "", "quality_feedback": ""}
+
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    simulation = make_simulation(config_file, [ScriptedEvaluator(0)], max_iterations=3)
+    simulation.generator = VersionedGenerator()
+    simulation.generator.tools["FileTools"] = FileTools(store=store)
+    simulation.run()
+
+    assert [m["iteration"] for m in store.manifests(simulation.output_dir)] == [1, 2, 3]
+    assert set(simulation.history[0]["files"]) == {"data_utils.py", "app.py", "tests.py"}
+    # data_utils.py and tests.py never change and are stored once; app.py has its
+    # FakeGenerator placeholder plus one version per iteration
+    assert store.usage()["objects"] == 6
+    with open(os.path.join(simulation.output_dir, "app.py")) as f:
+        assert f.read() == "VERSION = 2\n"
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from bandits import RunningStats, ThompsonSampling, UCB1, make_strategy
+from cua4_rl import PPO, MetaAgent, QLearning, SARSA
+
+def test_running_stats_match_numpy():
+    values = [10, 40, 35, 90, 72]
+    stats = RunningStats()
+    for v in values:
+        stats.push(v)
+    assert stats.mean == pytest.approx(np.mean(values))
+    assert stats.variance == pytest.approx(np.var(values, ddof=1))
+
+def test_remove_undoes_push():
+    values = [10, 40, 35, 90, 72]
+    stats = RunningStats()
+    for v in values + [5, 99]:
+        stats.push(v)
+    stats.remove(5)
+    stats.remove(99)
+    assert stats.count == 5
+    assert stats.mean == pytest.approx(np.mean(values))
+    assert stats.variance == pytest.approx(np.var(values, ddof=1))
+
+def test_window_spans_all_algorithms():
+    meta = MetaAgent([QLearning(), SARSA()], window=3)
+    meta.update_score("SARSA", 0)
+    for _ in range(3):
+        meta.update_score("Q-Learning", 90)
+    # SARSA was not picked again, but its score still ages out with the shared window
+    assert meta.stats["SARSA"].count == 0
+    assert meta.stats["Q-Learning"].count == 3 and meta.total == 3
+
+def test_ucb1_tries_every_algorithm_before_exploiting():
+    meta = MetaAgent([QLearning(), SARSA(), PPO()], strategy="ucb1")
+    chosen = []
+    for score in (80, 20, 30):
+        algo = meta.select_algorithm()
+        chosen.append(algo.name)
+        meta.update_score(algo.name, score)
+    assert chosen == ["Q-Learning", "SARSA", "PPO"]
+    assert meta.select_algorithm().name == "Q-Learning"
+
+def test_ucb1_eventually_revisits_neglected_arm():
+    stats = {"a": RunningStats(), "b": RunningStats()}
+    stats["a"].push(60)
+    for _ in range(200):
+        stats["b"].push(61)
+    assert UCB1().select(["a", "b"], stats, 201) == "a"
+
+def test_thompson_prefers_clearly_better_arm():
+    stats = {"a": RunningStats(), "b": RunningStats()}
+    for _ in range(20):
+        stats["a"].push(90)
+        stats["b"].push(10)
+    strategy = ThompsonSampling(seed=0)
+    picks = [strategy.select(["a", "b"], stats, 40) for _ in range(50)]
+    assert picks.count("a") == 50
+
+def test_greedy_keeps_first_algorithm_until_scored():
+    meta = MetaAgent([QLearning(), SARSA()])
+    assert meta.select_algorithm().name == "Q-Learning"
+    meta.update_score("SARSA", 50)
+    assert meta.select_algorithm().name == "SARSA"
+
+def test_unknown_strategy_rejected():
+    with pytest.raises(ValueError):
+        make_strategy("softmax")
+
+def test_legacy_score_lists_load():
+    meta = MetaAgent([QLearning(), SARSA()])
+    meta.load_state_dict({"scores": {"SARSA": [10, 30]}})
+    assert meta.stats["SARSA"].mean == pytest.approx(20)
+    assert meta.total == 2
+
+def test_windowed_meta_agent_round_trips_and_loads_unwindowed_summary():
+    values = [10, 40, 35, 90, 72, 64]
+    full = MetaAgent([QLearning(), SARSA()])
+    for v in values:
+        full.update_score("SARSA", v)
+    for window in (4, 5, 10):
+        meta = MetaAgent([QLearning(), SARSA()], window=window)
+        meta.load_state_dict(full.state_dict())
+        stats = meta.stats["SARSA"]
+        assert stats.count == min(len(values), window) == meta.total
+        assert stats.mean == pytest.approx(np.mean(values))
+        assert stats.variance == pytest.approx(np.var(values, ddof=1))
+    meta = MetaAgent([QLearning(), SARSA()], window=3)
+    for name, score in [("SARSA", 10), ("Q-Learning", 20), ("SARSA", 30), ("Q-Learning", 40)]:
+        meta.update_score(name, score)
+    restored = MetaAgent([QLearning(), SARSA()], window=3)
+    restored.load_state_dict(meta.state_dict())
+    assert list(restored.events) == [("Q-Learning", 20), ("SARSA", 30), ("Q-Learning", 40)]
+    assert restored.stats["SARSA"].mean == 30
+
+def test_ucb1_uses_pulls_within_the_window():
+    stats = {"a": RunningStats(), "b": RunningStats()}
+    for _ in range(2):
+        stats["a"].push(10)
+    for _ in range(5):
+        stats["b"].push(90)
+    # Seven pulls are in view; a lifetime total of 5002 would inflate the bonus enough to pick the weak arm
+    assert UCB1().select(["a", "b"], stats, 5002) == "b"
+
+def test_load_state_dict_leaves_argument_untouched():
+    state = {"stats": {"SARSA": {"count": 1, "mean": 5.0, "m2": 0.0}}, "scores": {"Q-Learning": [10, 30]}}
+    MetaAgent([QLearning(), SARSA()]).load_state_dict(state)
+    assert set(state["stats"]) == {"SARSA"}
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import pytest
+from candidates import GenerationCancelled, best_of_n, pick_best, screen_candidate
+from cua4_rl import Agent, FileTools, OpenRouter
+from conftest import FakeEvaluator, make_simulation
+from warm_pytest import PytestWorker
+from stub_server import StubServer
+
+GOOD = {
+    "data_utils.py": "def add(a, b):\n    return a + b\n",
+    "app.py": "from data_utils import add\n",
+    "tests.py": "from data_utils import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+}
+
+def write(directory, files):
+    os.makedirs(directory, exist_ok=True)
+    for name, text in files.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(text)
+
+@pytest.fixture(scope="module")
+def test_worker():
+    worker = PytestWorker(timeout=30)
+    yield worker
+    worker.close()
+
+def test_screen_scores_placeholders_syntax_and_tests(tmp_path, test_worker):
+    write(tmp_path / "good", GOOD)
+    write(tmp_path / "placeholder", {**GOOD, "data_utils.py": "[library_code]"})
+    write(tmp_path / "broken", {**GOOD, "app.py": "def broken(:\n"})
+    write(tmp_path / "failing", {**GOOD, "tests.py": "def test_add():\n    assert False\n"})
+    screen = lambda name: screen_candidate(str(tmp_path / name), ["data_utils.py", "app.py"], "tests.py", test_worker)
+    good, placeholder, broken, failing = (screen(name) for name in ("good", "placeholder", "broken", "failing"))
+    assert good["score"] == 1.0 and good["passed"] == 1
+    assert placeholder["score"] < 0.5 and "data_utils.py: placeholder" in placeholder["errors"]
+    assert broken["compiled"] == 2 and broken["passed"] == 0
+    assert failing["score"] == 0.5 and failing["failed"] == 1
+
+def test_best_of_n_cancels_the_rest_once_one_clears():
+    started = []
+    cancelled = []
+
+    def generate(index, cancel):
+        started.append(index)
+        if index == 0:
+            return "fast"
+        if cancel.wait(5):
+            cancelled.append(index)
+            raise GenerationCancelled()
+        return "slow"
+
+    start = time.time()
+    results = best_of_n(generate, lambda index: {"score": 1.0}, 3)
+    assert time.time() - start < 1.0
+    assert results[0]["status"] == "screened" and results[0]["output"] == "fast"
+    assert [r["status"] for r in results[1:]] == ["cancelled", "cancelled"]
+    assert pick_best(results)["index"] == 0
+
+def test_best_of_n_keeps_the_best_below_threshold():
+    scores = {0: 0.2, 1: 0.9, 2: 0.5}
+    results = best_of_n(lambda index, cancel: str(index), lambda index: {"score": scores[index]}, 3)
+    assert all(r["status"] == "screened" for r in results)
+    assert pick_best(results)["index"] == 1
+
+def test_best_of_n_reports_failures():
+    def generate(index, cancel):
+        raise RuntimeError("API down")
+    results = best_of_n(generate, lambda index: {"score": 1.0}, 2)
+    assert [r["status"] for r in results] == ["failed", "failed"]
+    assert pick_best(results) is None
+
+class CandidateGenerator:
+    # Only candidate_1 writes working code; the others echo the template placeholders
+    def __init__(self):
+        self.tools = {"FileTools": FileTools()}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def run(self, prompt, max_tokens=2000, output_dir=".", cancel=None):
+        with self.lock:
+            self.calls += 1
+        files = GOOD if output_dir.endswith("candidate_1") else {name: f"[{name.split('.')[0]}_code]" for name in GOOD}
+        for name, text in files.items():
+            self.tools["FileTools"].save(text, name, output_dir)
+        return f"saved to {output_dir}"
+
+def test_simulation_sends_only_the_best_candidate(make_config, test_worker):
+    config_file = make_config(candidates=3)
+    evaluator = FakeEvaluator(70)
+    simulation = make_simulation(config_file, [evaluator], max_iterations=2, test_worker=test_worker)
+    simulation.generator = CandidateGenerator()
+    simulation.run()
+    assert evaluator.calls == 2
+    with open(os.path.join(simulation.output_dir, "data_utils.py")) as f:
+        assert f.read() == GOOD["data_utils.py"]
+    entry = simulation.history[0]
+    assert max(entry["candidates"], key=lambda c: c["score"] or 0)["index"] == 1
+    assert entry["tests"]["passed"] == 1
+
+def test_cancel_hangs_up_a_non_streaming_agent_mid_generation(tmp_path):
+    reply = "[FileTools]save:" + "x = 1\n" * 200 + ":a.py[/FileTools]"
+    with StubServer([reply], stream_chunk_chars=4, stream_chunk_delay=0.01) as stub:
+        agent = Agent(OpenRouter("stub", "key", stub.base_url), [FileTools()])
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        start = time.perf_counter()
+        with pytest.raises(GenerationCancelled):
+            agent.run("hello", output_dir=str(tmp_path), cancel=cancel)
+        # The full reply takes about three seconds to stream
+        assert time.perf_counter() - start < 1.0
+        # The server notices the hang-up and stops streaming instead of finishing the reply
+        time.sleep(0.3)
+        sent = stub.stats["bytes_out"]
+        time.sleep(0.3)
+        assert stub.stats["bytes_out"] == sent
+    assert not (tmp_path / "a.py").exists()
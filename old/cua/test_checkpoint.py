@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from checkpoint import load_checkpoint, read_arrays, save_checkpoint, write_arrays
+from cua4_rl import ACTIONS, PPO, MetaAgent, QLearning, SARSA
+
+def make_algorithms():
+    return [QLearning(epsilon=0.0), SARSA(epsilon=0.0), PPO()]
+
+def test_arrays_round_trip_memory_mapped(tmp_path):
+    path = str(tmp_path / "arrays.bin")
+    values = np.arange(12, dtype=np.float64).reshape(3, 4)
+    write_arrays(path, {"values": values, "empty": np.zeros((0, 3)), "mask": values > 5}, {"note": "x"})
+    arrays, meta = read_arrays(path)
+    assert isinstance(arrays["values"], np.memmap)
+    assert np.array_equal(arrays["values"], values)
+    assert arrays["empty"].shape == (0, 3)
+    assert arrays["mask"].sum() == 6
+    assert meta == {"note": "x"}
+    arrays["values"][0, 0] = 99
+    assert read_arrays(path)[0]["values"][0, 0] == 0
+
+def test_checkpoint_restores_tables_policy_and_scores(tmp_path):
+    path = str(tmp_path / "ckpt.bin")
+    algorithms = make_algorithms()
+    meta_agent = MetaAgent(algorithms)
+    for n in range(50):
+        for algo in algorithms:
+            algo.update(f"score_{n}", ACTIONS[n % 3], 0.5, f"score_{n + 1}", "fix_bugs")
+        meta_agent.update_score("SARSA", n)
+    save_checkpoint(path, algorithms, meta_agent)
+
+    restored = make_algorithms()
+    restored_meta = MetaAgent(restored)
+    load_checkpoint(path, restored, restored_meta)
+    for original, loaded in zip(algorithms[:2], restored[:2]):
+        assert loaded.q_table.to_dict() == original.q_table.to_dict()
+    assert restored[2].policy == algorithms[2].policy
+    assert restored_meta.stats["SARSA"].count == 50
+    assert restored_meta.stats["SARSA"].mean == pytest.approx(24.5)
+
+def test_loaded_table_keeps_learning(tmp_path):
+    path = str(tmp_path / "ckpt.bin")
+    algo = QLearning()
+    algo.update("initial", "fix_bugs", 1.0, "score_100")
+    save_checkpoint(path, [algo], MetaAgent([algo]))
+    restored = QLearning()
+    load_checkpoint(path, [restored], MetaAgent([restored]))
+    for n in range(200):
+        restored.update(f"new_{n}", "add_features", 0.5, "initial")
+    assert restored.q_table["initial"]["fix_bugs"] == pytest.approx(0.1)
+    assert len(restored.q_table) == 201
@@ -0,0 +1,80 @@
+import json
+from consensus import ConsensusController
+from conftest import FakeEvaluator, make_simulation
+
+def evaluate(evaluator):
+    return evaluator.evaluate_code("code", "type", "description", "tests")
+
+def test_agreeing_evaluators_stop_after_first_wave():
+    controller = ConsensusController(ci_width=12, prior_sd=5)
+    evaluators = [FakeEvaluator(score) for score in (70, 72, 20, 95)]
+    results, decision = controller.run(evaluators, evaluate)
+    assert [r is not None for r in results] == [True, True, False, False]
+    assert decision["reason"] == "ci" and decision["skipped"] == 2
+    assert decision["mean"] == 71
+    assert 0 < decision["error_bound"] <= 6
+    assert controller.report()["saved"] == 2
+
+def test_disagreeing_evaluators_are_all_asked():
+    controller = ConsensusController(ci_width=10, prior_sd=5)
+    evaluators = [FakeEvaluator(score) for score in (20, 90, 60)]
+    results, decision = controller.run(evaluators, evaluate)
+    assert all(result is not None for result in results)
+    # With the whole panel asked there is nothing left to be wrong about
+    assert (decision["reason"], decision["error_bound"]) == ("all", 0.0)
+
+def test_decisive_pass_stops_even_when_interval_is_wide():
+    controller = ConsensusController(ci_width=1, prior_sd=3)
+    results, decision = controller.run([FakeEvaluator(score) for score in (99, 98, 40, 40)], evaluate)
+    assert decision["reason"] == "threshold"
+    assert decision["mean"] - decision["error_bound"] >= 90
+    assert sum(result is not None for result in results) == 2
+
+def test_cheap_and_fast_evaluators_go_first():
+    controller = ConsensusController(ci_width=100, first_wave=1, costs={"fake-10": 5.0})
+    slow, fast, expensive = FakeEvaluator(50, delay=0.1), FakeEvaluator(60), FakeEvaluator(10)
+    evaluators = [expensive, slow, fast]
+    controller.run(evaluators, evaluate)
+    controller.run(evaluators, evaluate)
+    controller.run(evaluators, evaluate)
+    # Unmeasured models are tried once, then the fast one leads; the priced one never does
+    assert (fast.calls, slow.calls, expensive.calls) == (2, 1, 0)
+    assert controller.report()["calls"] == 3
+
+def test_early_stops_do_not_shrink_the_pooled_spread():
+    controller = ConsensusController(ci_width=12, prior_sd=5)
+    _, decision = controller.run([FakeEvaluator(score) for score in (70, 71, 20, 95)], evaluate)
+    assert decision["reason"] == "ci"
+    # Only an agreeing first wave was seen; pooling it would drive sigma toward zero run after run
+    assert (controller.ss, controller.df) == (0.0, 0)
+    assert controller.sigma() == 5
+
+def test_errored_evaluators_are_not_scored():
+    class FailingEvaluator(FakeEvaluator):
+        def evaluate_code(self, *args):
+            return {"score": 0, "functionality_feedback": "Evaluation failed: boom", "quality_feedback": "", "error": True}
+
+    controller = ConsensusController(ci_width=12, prior_sd=5)
+    evaluators = [FailingEvaluator(0), FakeEvaluator(70), FakeEvaluator(72), FakeEvaluator(20)]
+    results, decision = controller.run(evaluators, evaluate)
+    assert decision["mean"] == 71
+    assert [r is not None for r in results] == [True, True, True, False]
+
+def test_pooled_spread_carries_over_through_state_dict():
+    controller = ConsensusController(prior_sd=5)
+    controller.run([FakeEvaluator(score) for score in (10, 90, 50)], evaluate)
+    restored = ConsensusController(prior_sd=5)
+    restored.load_state_dict(json.loads(json.dumps(controller.state_dict())))
+    assert restored.sigma() == controller.sigma() > 5
+    assert restored.report()["iterations"] == 1
+
+def test_simulation_skips_evaluators_once_they_agree(make_config):
+    config_file = make_config(consensus={"ci_width": 12, "prior_sd": 5})
+    evaluators = [FakeEvaluator(score) for score in (70, 71, 10)]
+    simulation = make_simulation(config_file, evaluators, max_iterations=1)
+    simulation.run()
+    assert [evaluator.calls for evaluator in evaluators] == [1, 1, 0]
+    entry = simulation.history[0]
+    assert entry["score"] == 70.5
+    assert entry["consensus"]["skipped"] == 1
+    assert "Evaluator 3" not in entry["feedback"]
@@ -0,0 +1,117 @@
+import time
+import pytest
+from hedging import HedgeCancelled, Hedger, LatencyTracker
+from stub_server import LatencyModel, StubServer
+from cua4_rl import Agent, FileTools, OpenRouter
+
+class Model:
+    def __init__(self, id):
+        self.id = id
+
+def delayed_send(delays, failures=()):
+    calls = []
+
+    def send(model, cancel):
+        calls.append(model.id)
+        if cancel.wait(delays[model.id]):
+            raise HedgeCancelled(model.id)
+        if model.id in failures:
+            raise RuntimeError(f"{model.id} failed")
+        return model.id
+    return send, calls
+
+def test_latency_tracker_uses_initial_until_enough_samples():
+    tracker = LatencyTracker(quantile=95, min_samples=3, initial=5.0, floor=0.0)
+    tracker.record(0.1)
+    assert tracker.threshold() == 5.0
+    for value in (0.2, 0.3, 0.4):
+        tracker.record(value)
+    assert 0.3 < tracker.threshold() <= 0.4
+
+def test_fast_primary_is_not_hedged():
+    hedger = Hedger(initial=1.0)
+    send, calls = delayed_send({"primary": 0.01, "backup": 0.01})
+    result, model = hedger.call([Model("primary"), Model("backup")], send)
+    assert result == "primary" and calls == ["primary"]
+    assert hedger.stats["hedged"] == 0
+
+def test_slow_primary_is_hedged_and_cancelled():
+    hedger = Hedger(initial=0.05)
+    send, calls = delayed_send({"primary": 2.0, "backup": 0.01})
+    start = time.perf_counter()
+    result, model = hedger.call([Model("primary"), Model("backup")], send)
+    assert result == "backup" and time.perf_counter() - start < 1.0
+    assert calls == ["primary", "backup"]
+    report = hedger.report()
+    assert report["hedged"] == 1 and report["hedge_wins"] == 1 and report["cancelled"] == 1
+    assert report["wins"] == {"backup": 1}
+
+def test_cancelled_loser_still_counts_toward_latency():
+    hedger = Hedger(initial=0.05)
+    send, _ = delayed_send({"primary": 2.0, "backup": 0.01})
+    hedger.call([Model("primary"), Model("backup")], send)
+    time.sleep(0.1)
+    # Censored at the moment it was cancelled, which is at least the hedge delay
+    samples = list(hedger.tracker("primary").samples)
+    assert len(samples) == 1 and samples[0] >= 0.05
+
+def test_failed_primary_falls_back_without_waiting():
+    hedger = Hedger(initial=5.0)
+    send, calls = delayed_send({"primary": 0.0, "backup": 0.0}, failures={"primary"})
+    start = time.perf_counter()
+    result, _ = hedger.call([Model("primary"), Model("backup")], send)
+    assert result == "backup" and time.perf_counter() - start < 1.0
+    assert hedger.stats["fallbacks"] == 1
+
+def test_all_attempts_failing_raises():
+    hedger = Hedger(initial=5.0)
+    send, _ = delayed_send({"a": 0.0, "b": 0.0}, failures={"a", "b"})
+    with pytest.raises(Exception, match="All hedged attempts failed"):
+        hedger.call([Model("a"), Model("b")], send)
+    assert hedger.stats["failures"] == 1
+
+def test_agent_hedges_to_backup_server():
+    reply = ["[FileTools]save:x = 1:a.py[/FileTools]"]
+    with StubServer(reply, latency=LatencyModel("fixed", value=1.5)) as slow, StubServer(reply) as fast:
+        agent = Agent(
+            OpenRouter("stub/slow", "key", slow.base_url), tools=[],
+            hedge_models=[OpenRouter("stub/fast", "key", fast.base_url)],
+            hedger=Hedger(initial=0.1)
+        )
+        start = time.perf_counter()
+        response = agent._call_api("hello")
+        assert time.perf_counter() - start < 1.0
+        assert response["model"] == "stub/fast"
+    assert agent.hedger.stats["hedge_wins"] == 1
+
+def test_failing_primary_falls_back_without_full_backoff():
+    reply = ["[FileTools]save:x = 1:a.py[/FileTools]"]
+    with StubServer(reply, error_rate_5xx=1.0) as failing, StubServer(reply) as backup:
+        agent = Agent(
+            OpenRouter("stub/failing", "key", failing.base_url), tools=[],
+            hedge_models=[OpenRouter("stub/backup", "key", backup.base_url)],
+            hedger=Hedger(initial=5.0)
+        )
+        start = time.perf_counter()
+        response = agent._call_api("hello")
+        # The shared client alone would retry three times with 1s, 2s and 4s waits
+        assert time.perf_counter() - start < 2.0
+        assert response["model"] == "stub/backup"
+        assert failing.stats["5xx"] == 2
+    assert agent.hedger.stats["fallbacks"] == 1
+
+def test_streaming_agent_hedges_on_first_token(tmp_path):
+    reply = ["[FileTools]save:x = 1:a.py[/FileTools]"]
+    with StubServer(reply, latency=LatencyModel("fixed", value=1.5)) as slow, StubServer(reply, stream_chunk_chars=8) as fast:
+        agent = Agent(
+            OpenRouter("stub/slow", "key", slow.base_url), tools=[FileTools()], stream=True,
+            hedge_models=[OpenRouter("stub/fast", "key", fast.base_url)],
+            hedger=Hedger(initial=0.1)
+        )
+        start = time.perf_counter()
+        agent.run("hello", output_dir=str(tmp_path))
+        assert time.perf_counter() - start < 1.0
+        assert fast.stats["streamed"] == 1
+    assert (tmp_path / "a.py").read_text() == "x = 1"
+    assert agent.stream_stats["tool_calls"] == 1
+    assert agent.hedger.stats["hedge_wins"] == 1
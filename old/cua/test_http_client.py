@@ -0,0 +1,99 @@
+import time
+import threading
+from stub_server import StubServer
+from http_client import AIMDLimiter, HTTPClient, TokenBucket
+
+def post(client, base_url, model="stub/a"):
+    return client.post(f"{base_url}/chat/completions", json={"model": model, "messages": [{"role": "user", "content": "hi"}]}, timeout=5)
+
+def test_token_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(rate=50.0, burst=2)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # Two tokens come from the burst, the other three at 50/s
+    assert time.monotonic() - start >= 0.05
+
+def test_token_bucket_pause_blocks_unlimited_bucket():
+    bucket = TokenBucket(rate=None)
+    bucket.pause(0.05)
+    assert bucket.acquire() >= 0.04
+
+def test_aimd_grows_on_success_and_halves_on_throttle():
+    limiter = AIMDLimiter(initial=4, maximum=8, cooldown=0.0)
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(False, 0.01)
+    assert 5 <= limiter.limit <= 8
+    grown = limiter.limit
+    limiter.acquire()
+    limiter.release(True, 0.01)
+    assert limiter.limit == grown * 0.5 and limiter.decreases == 1
+
+def test_aimd_treats_slow_responses_as_congestion():
+    limiter = AIMDLimiter(initial=4, latency_target=0.1, cooldown=0.0)
+    limiter.acquire()
+    limiter.release(False, 0.5)
+    assert limiter.limit == 2
+
+def test_aimd_caps_in_flight_requests():
+    limiter = AIMDLimiter(initial=2, maximum=2)
+    peak = []
+    lock = threading.Lock()
+    active = [0]
+
+    def work():
+        limiter.acquire()
+        with lock:
+            active[0] += 1
+            peak.append(active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        limiter.release(False, 0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 2
+
+def test_client_reuses_connections_and_tracks_lanes():
+    client = HTTPClient()
+    with StubServer(["ok"]) as stub:
+        for _ in range(3):
+            assert post(client, stub.base_url).status_code == 200
+        assert post(client, stub.base_url, model="stub/b").status_code == 200
+        metrics = client.metrics()
+    lanes = metrics["lanes"]
+    assert set(lanes) == {f"{stub.base_url[7:]}/stub/a", f"{stub.base_url[7:]}/stub/b"}
+    assert lanes[f"{stub.base_url[7:]}/stub/a"]["ok"] == 3
+    [pool] = metrics["pool"].values()
+    assert pool["connections_opened"] == 1 and pool["requests"] == 4
+
+def test_client_honours_retry_after_and_backs_off():
+    client = HTTPClient(max_retries=2)
+    with StubServer(["ok"], error_rate_429=1.0, retry_after=0) as stub:
+        response = post(client, stub.base_url)
+        assert response.status_code == 429
+        assert stub.stats["requests"] == 3
+    lane = next(iter(client.metrics()["lanes"].values()))
+    assert lane["throttled"] == 3 and lane["retries"] == 2
+    assert lane["limit"] < 4
+
+def test_client_retries_until_success():
+    client = HTTPClient(max_retries=5, backoff_factor=0.0)
+    with StubServer(["ok"], error_rate_5xx=0.5, seed=3) as stub:
+        responses = [post(client, stub.base_url) for _ in range(5)]
+        assert all(response.status_code == 200 for response in responses)
+        assert stub.stats["5xx"] > 0
+
+def test_per_call_retry_settings_override_client_defaults():
+    client = HTTPClient(max_retries=3, backoff_factor=1.0)
+    with StubServer(["ok"], error_rate_5xx=1.0) as stub:
+        start = time.monotonic()
+        response = client.post(f"{stub.base_url}/chat/completions", json={"model": "stub/a"}, timeout=5, max_retries=1, backoff_factor=0.05)
+        assert time.monotonic() - start < 1.0
+        assert response.status_code == 503
+        assert stub.stats["requests"] == 2
@@ -0,0 +1,52 @@
+import json
+import pytest
+from stub_server import LatencyModel, StubServer
+from leaderboard import Leaderboard, probe_models, summarize
+
+def reply_by_model(body):
+    if body["model"] == "stub/chatty":
+        return "You could run head on the file to see the first lines of it."
+    return "[shell]head -n 5 treechat.md[/shell]"
+
+def test_probe_models_records_latency_and_compliance():
+    with StubServer(reply_by_model, latency=LatencyModel("fixed", value=0.01), stream_chunk_chars=8) as stub:
+        summaries = probe_models(["stub/fast", "stub/chatty"], "key", stub.base_url, requests_per_model=6, concurrency=3)
+        assert stub.stats["streamed"] == 12
+    fast, chatty = summaries
+    assert fast["requests"] == 6 and fast["ok"] == 6 and fast["error_rate"] == 0.0
+    assert fast["compliance_rate"] == 1.0 and chatty["compliance_rate"] == 0.0
+    assert 0.01 <= fast["ttft_p50"] <= fast["latency_p50"] <= fast["latency_p95"] <= fast["latency_p99"]
+    assert fast["tokens_per_second"] > 0
+
+def test_probe_models_counts_errors():
+    with StubServer(reply_by_model, error_rate_429=1.0) as stub:
+        [summary] = probe_models(["stub/fast"], "key", stub.base_url, requests_per_model=4, concurrency=2)
+    assert summary["ok"] == 0 and summary["error_rate"] == 1.0
+    assert summary["errors"] == {"429": 4}
+    assert summary["latency_p50"] is None
+
+def test_leaderboard_sorts_and_persists(tmp_path):
+    path = str(tmp_path / "leaderboard.json")
+    board = Leaderboard(path)
+    board.update([
+        {"model": "a", "latency_p50": 0.5, "tokens_per_second": 80.0, "error_rate": 0.0},
+        {"model": "b", "latency_p50": 0.2, "tokens_per_second": 40.0, "error_rate": 0.1},
+        {"model": "c", "latency_p50": None, "tokens_per_second": None, "error_rate": 1.0}
+    ])
+    assert [e["model"] for e in board.sorted("p50")] == ["b", "a", "c"]
+    assert [e["model"] for e in board.sorted("tps")] == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        board.sorted("nope")
+    board.save("tps")
+    with open(path) as f:
+        assert [e["model"] for e in json.load(f)] == ["a", "b", "c"]
+    assert (tmp_path / "leaderboard.csv").exists()
+
+    reloaded = Leaderboard(path)
+    reloaded.update([{"model": "a", "latency_p50": 0.1, "tokens_per_second": 90.0, "error_rate": 0.0}])
+    assert len(reloaded.entries) == 3
+    assert reloaded.sorted("p50")[0]["model"] == "a"
+
+def test_decode_speed_excludes_time_to_first_token():
+    result = {"ok": True, "status": 200, "ttft": 2.0, "latency": 3.0, "completion_tokens": 101, "compliant": True}
+    assert summarize("m", [result])["tokens_per_second"] == 100.0
@@ -0,0 +1,94 @@
+import time
+import pytest
+from http_client import HTTPClient
+from local_inference import EngineBusy, LocalEngine, PrefixCache, mount_local
+from cua4_rl import Agent, EvaluatorAgent, OpenRouter
+
+class ToyBackend:
+    # Character-level stand-in for a tiny model: replies with a canned answer and records what it was asked to compute
+    def __init__(self, reply='{"score": 80, "functionality_feedback": "ok", "quality_feedback": "ok"}', delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.loads = 0
+        self.batches = []
+        self.prefilled = []
+
+    def load(self):
+        self.loads += 1
+
+    def encode(self, messages):
+        return [ord(c) for c in "\n".join(m.get("content", "") for m in messages)]
+
+    def decode(self, ids):
+        return "".join(chr(i) for i in ids)
+
+    def prefill(self, ids):
+        self.prefilled.append(len(ids))
+        return ("kv", len(ids))
+
+    def generate(self, prefix, cache, suffixes, max_new_tokens, temperature):
+        time.sleep(self.delay)
+        assert cache is None or cache == ("kv", len(prefix))
+        self.batches.append({"prefix": len(prefix), "cached": cache is not None, "suffixes": [len(s) for s in suffixes]})
+        return [[ord(c) for c in self.reply][:max_new_tokens] for _ in suffixes]
+
+def messages(text):
+    return [{"role": "user", "content": text}]
+
+def test_concurrent_requests_are_batched():
+    backend = ToyBackend(delay=0.05)
+    engine = LocalEngine(backend, max_batch_size=4, max_wait=0.05, min_prefix_tokens=1000)
+    futures = [engine.submit(messages(f"prompt {i}"), max_tokens=5) for i in range(4)]
+    results = [future.result(5) for future in futures]
+    engine.close()
+    assert backend.loads == 1
+    assert engine.stats["batches"] == 1 and engine.stats["max_batch"] == 4
+    assert all(result["text"] == backend.reply[:5] and result["completion_tokens"] == 5 for result in results)
+
+def test_shared_prefix_is_prefilled_once_and_reused():
+    backend = ToyBackend()
+    engine = LocalEngine(backend, max_batch_size=1, max_wait=0.0, min_prefix_tokens=20)
+    template = "You are an expert code reviewer. Evaluate the following code:\n"
+    for code in ("a = 1", "b = 2", "c = 3"):
+        engine.generate(messages(template + code), max_tokens=3)
+    engine.close()
+    assert backend.prefilled == [len(template)]
+    assert engine.stats["prefix_builds"] == 1 and engine.stats["prefix_hits"] == 1
+    assert [batch["cached"] for batch in backend.batches] == [False, True, True]
+    assert backend.batches[-1]["suffixes"] == [len("c = 3")]
+
+def test_prefix_cache_prefers_longest_match_and_evicts():
+    cache = PrefixCache(capacity=2)
+    cache.put((1, 2), "short")
+    cache.put((1, 2, 3), "long")
+    assert cache.match([1, 2, 3, 4]) == (1, 2, 3)
+    assert cache.match([1, 2, 3]) == (1, 2)
+    cache.put((9,), "other")
+    assert cache.get((1, 2, 3)) is None or cache.get((1, 2)) is None
+
+def test_full_queue_rejects():
+    backend = ToyBackend(delay=0.2)
+    engine = LocalEngine(backend, max_batch_size=1, max_wait=0.0, max_queue=1, min_prefix_tokens=1000)
+    engine.submit(messages("first"))
+    time.sleep(0.05)
+    engine.submit(messages("second"))
+    with pytest.raises(EngineBusy):
+        engine.submit(messages("third"))
+    engine.close()
+    assert engine.stats["rejected"] == 1
+
+def test_agents_target_the_local_provider_through_the_client(tmp_path):
+    backend = ToyBackend()
+    engine = LocalEngine(backend, max_wait=0.0)
+    client = HTTPClient()
+    model = OpenRouter(id="toy/local", api_key="", base_url=mount_local(client, engine, "toy"))
+    evaluator = EvaluatorAgent(model, session=client)
+    assert evaluator.evaluate_code("x = 1", "type", "description", "tests")["score"] == 80
+
+    backend.reply = "[FileTools]save:x = 1:a.py[/FileTools]"
+    from cua4_rl import FileTools
+    agent = Agent(model, tools=[FileTools()], stream=True, session=client)
+    agent.run("write a.py", output_dir=str(tmp_path))
+    assert (tmp_path / "a.py").read_text() == "x = 1"
+    engine.close()
+    assert "toy/toy/local" in client.metrics()["lanes"]
@@ -0,0 +1,62 @@
+from prompt_builder import FeedbackBuffer, IncrementalPromptBuilder, estimate_tokens, summarize_python
+
+LIB = "import os\n\n" + "\n\n".join(f"def helper_{n}(path):\n    return os.path.join(path, '{n}')" for n in range(30)) + "\n"
+
+def test_first_iteration_sends_full_files():
+    prompt, report = IncrementalPromptBuilder().build({"data_utils.py": LIB, "app.py": "print(1)\n"})
+    assert LIB in prompt
+    assert report["files"] == {"data_utils.py": "full", "app.py": "full"}
+    assert report["code_tokens"] == report["code_tokens_full"]
+
+def test_unchanged_files_become_summaries():
+    builder = IncrementalPromptBuilder()
+    builder.build({"data_utils.py": LIB})
+    prompt, report = builder.build({"data_utils.py": LIB})
+    assert report["files"]["data_utils.py"] == "unchanged"
+    assert "unchanged since iteration 1" in prompt
+    assert "def helper_29(path)" in prompt
+    assert report["code_tokens"] < report["code_tokens_full"] / 2
+
+def test_changed_files_become_diffs():
+    builder = IncrementalPromptBuilder()
+    builder.build({"data_utils.py": LIB})
+    changed = LIB.replace("'7'", "'seven'")
+    prompt, report = builder.build({"data_utils.py": changed})
+    assert report["files"]["data_utils.py"] == "diff"
+    assert "+    return os.path.join(path, 'seven')" in prompt
+    _, report = builder.build({"data_utils.py": changed})
+    assert report["files"]["data_utils.py"] == "unchanged"
+
+def test_rewritten_file_falls_back_to_full_text():
+    builder = IncrementalPromptBuilder()
+    builder.build({"app.py": "a = 1\n"})
+    _, report = builder.build({"app.py": "b = 2\n"})
+    assert report["files"]["app.py"] == "full"
+
+def test_summary_survives_syntax_errors():
+    assert "def broken(" in summarize_python("def broken(:\n    pass")
+
+def test_feedback_buffer_respects_budget_newest_first():
+    buffer = FeedbackBuffer(token_budget=50)
+    buffer.add(1, "old " * 100)
+    buffer.add(2, "new feedback")
+    text = buffer.render()
+    assert text.startswith("[Iteration 2]")
+    assert estimate_tokens(text) <= 55
+
+def test_tiny_unchanged_file_is_sent_in_full():
+    builder = IncrementalPromptBuilder()
+    builder.build({"app.py": "x = 1\n"})
+    prompt, report = builder.build({"app.py": "x = 1\n"})
+    assert report["files"]["app.py"] == "full"
+    assert "x = 1" in prompt
+
+def test_changed_files_are_sent_in_full_without_diffs():
+    builder = IncrementalPromptBuilder(diffs=False)
+    builder.build({"data_utils.py": LIB})
+    changed = LIB.replace("'7'", "'seven'")
+    prompt, report = builder.build({"data_utils.py": changed})
+    assert report["files"]["data_utils.py"] == "full"
+    assert changed in prompt
+    _, report = builder.build({"data_utils.py": changed})
+    assert report["files"]["data_utils.py"] == "unchanged"
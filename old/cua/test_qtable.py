@@ -0,0 +1,83 @@
+import random
+import numpy as np
+import pytest
+from qtable import QTable
+from cua4_rl import ACTIONS, QLearning, SARSA
+
+def dict_qlearning_update(q_table, state, action, reward, next_state, alpha=0.1, gamma=0.9):
+    q_table.setdefault(state, {})
+    q_table[state].setdefault(action, 0.0)
+    next_q = max(q_table.get(next_state, {}).values(), default=0.0)
+    q_table[state][action] += alpha * (reward + gamma * next_q - q_table[state][action])
+
+def test_qtable_grows_past_initial_capacity():
+    table = QTable(["a"], initial_states=2)
+    for n in range(10):
+        table.touch(f"s{n}", f"action_{n % 6}")
+    assert len(table) == 10
+    assert table.values.shape[0] >= 10
+    assert set(table["s9"]) == {"action_3"}
+
+def test_max_and_best_only_consider_seen_actions():
+    table = QTable(ACTIONS)
+    s, a = table.touch("s", "fix_bugs")
+    table.values[s, a] = -1.0
+    assert table.max_value("s") == -1.0
+    assert table.best_action("s") == "fix_bugs"
+    assert table.best_action("unseen") is None
+    assert table.max_value("missing") == 0.0
+
+def test_qlearning_matches_dict_reference():
+    rng = random.Random(0)
+    algo = QLearning()
+    reference = {}
+    for _ in range(500):
+        state, next_state = f"score_{rng.randint(0, 9)}", f"score_{rng.randint(0, 9)}"
+        action, reward = rng.choice(ACTIONS), rng.random()
+        algo.update(state, action, reward, next_state)
+        dict_qlearning_update(reference, state, action, reward, next_state)
+    learned = algo.q_table.to_dict()
+    assert learned.keys() == reference.keys()
+    for state in reference:
+        assert learned[state] == pytest.approx(reference[state])
+
+def test_greedy_action_uses_learned_values():
+    algo = SARSA(epsilon=0.0)
+    algo.update("s", "add_features", 1.0, "t", "fix_bugs")
+    assert algo.get_action("s") == "add_features"
+    assert algo.get_actions(["s", "s"]) == ["add_features", "add_features"]
+
+def test_batch_update_handles_thousands_of_transitions():
+    algo = QLearning()
+    n = 5000
+    states = [f"score_{i % 100}" for i in range(n)]
+    actions = [ACTIONS[i % 3] for i in range(n)]
+    next_states = [f"score_{(i + 1) % 100}" for i in range(n)]
+    algo.update_batch(states, actions, np.ones(n), next_states)
+    assert len(algo.q_table) == 100
+    assert algo.q_table["score_0"]["improve_modularity"] > 0
+
+def test_sarsa_batch_update_with_explicit_next_actions():
+    algo = SARSA()
+    algo.update_batch(["a", "a"], ["fix_bugs", "fix_bugs"], [1.0, 1.0], ["b", "b"], ["add_features", "add_features"])
+    # Two steps toward 1.0, as sequential updates would take: 0.1, then 0.1 + 0.1 * 0.9
+    assert algo.q_table["a"]["fix_bugs"] == pytest.approx(0.19)
+    assert algo.q_table["b"] == {"add_features": 0.0}
+
+def test_duplicated_batch_transitions_stay_bounded_and_track_sequential():
+    rng = np.random.default_rng(0)
+    transitions = []
+    for _ in range(300):
+        rewards = rng.uniform(0.4, 0.8, 3)
+        transitions += [("initial", ACTIONS[0], rewards[0], "score_50"), ("score_50", ACTIONS[1], rewards[1], "score_60"),
+                        ("score_60", ACTIONS[2], rewards[2], "score_70")]
+    sequential, batched = QLearning(), QLearning()
+    for transition in transitions:
+        sequential.update(*transition)
+    for start in range(0, len(transitions), 256):
+        batch = transitions[start:start + 256]
+        batched.update_batch(*[[t[i] for t in batch] for i in range(4)])
+    for state in ("initial", "score_50", "score_60"):
+        for action, value in batched.q_table[state].items():
+            assert 0 <= value <= 2
+            assert value == pytest.approx(sequential.q_table[state][action], abs=0.15)
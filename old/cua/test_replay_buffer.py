@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from replay_buffer import ReplayBuffer, train_offline
+from cua4_rl import PPO, QLearning, SARSA
+
+def test_ring_keeps_newest_transitions():
+    buffer = ReplayBuffer(capacity=3)
+    for n in range(5):
+        buffer.add(f"s{n}", "fix_bugs", n / 10, f"s{n + 1}")
+    assert len(buffer) == 3
+    batch = next(buffer.batches(batch_size=10, shuffle=False))
+    assert batch["states"] == ["s2", "s3", "s4"]
+    assert batch["rewards"] == pytest.approx([0.2, 0.3, 0.4])
+    assert batch["next_actions"] is None
+
+def test_save_and_load_round_trip(tmp_path):
+    buffer = ReplayBuffer(capacity=4)
+    for n in range(6):
+        buffer.add(f"s{n}", "add_features", 0.5, f"s{n + 1}", "fix_bugs", "SARSA")
+    path = str(tmp_path / "replay.npz")
+    buffer.save(path)
+    loaded = ReplayBuffer.load(path, capacity=2)
+    assert len(loaded) == 2
+    batch = next(loaded.batches(shuffle=False))
+    assert batch["states"] == ["s4", "s5"]
+    assert batch["next_actions"] == ["fix_bugs", "fix_bugs"]
+
+def test_train_offline_warms_up_algorithms():
+    buffer = ReplayBuffer()
+    for _ in range(100):
+        buffer.add("initial", "fix_bugs", 0.9, "score_90", "fix_bugs")
+    for algo in (QLearning(epsilon=0.0), SARSA(epsilon=0.0)):
+        assert train_offline(algo, buffer, batch_size=16, rng=np.random.default_rng(0)) == 100
+        assert algo.get_action("initial") == "fix_bugs"
+    ppo = PPO()
+    train_offline(ppo, buffer)
+    assert ppo.policy["initial"]["fix_bugs"] > 0.33
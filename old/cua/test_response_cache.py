@@ -0,0 +1,98 @@
+import os
+import time
+from response_cache import ResponseCache
+from cua4_rl import EvaluatorAgent, OpenRouter
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+        self.text = content
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+class FakeSession:
+    def __init__(self, content: str):
+        self.content = content
+        self.posts = 0
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.posts += 1
+        return FakeResponse(self.content)
+
+def test_key_depends_on_model_prompt_and_params():
+    base = {"model": "a", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.5}
+    assert ResponseCache.key(base) == ResponseCache.key(dict(reversed(list(base.items()))))
+    assert ResponseCache.key(base) != ResponseCache.key({**base, "model": "b"})
+    assert ResponseCache.key(base) != ResponseCache.key({**base, "temperature": 0.7})
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.key({"model": "a"})
+    assert cache.get(key) is None
+    cache.set(key, {"score": 80})
+    assert cache.get(key) == {"score": 80}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age=60)
+    key = ResponseCache.key({"model": "a"})
+    cache.set(key, "value")
+    old = time.time() - 120
+    os.utime(cache._path(key), (old, old))
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+def test_size_eviction_drops_oldest(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=300)
+    keys = [ResponseCache.key({"n": n}) for n in range(5)]
+    for n, key in enumerate(keys):
+        cache.set(key, "x" * 80)
+        os.utime(cache._path(key), (time.time() - 100 + n, time.time() - 100 + n))
+    assert cache.stats()["bytes"] <= 300
+    assert cache.get(keys[-1]) == "x" * 80
+    assert cache.get(keys[0]) is None
+
+def test_bypass_skips_reads_and_writes(tmp_path):
+    cache = ResponseCache(str(tmp_path), bypass=True)
+    key = ResponseCache.key({"model": "a"})
+    cache.set(key, "value")
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+def test_evaluator_reuses_cached_verdict(tmp_path):
+    session = FakeSession('{"score": 70, "functionality_feedback": "", "quality_feedback": ""}')
+    model = OpenRouter(id="m", api_key="", base_url="http://localhost")
+    evaluator = EvaluatorAgent(model, session=session, cache=ResponseCache(str(tmp_path)))
+    first = evaluator.evaluate_code("code", "type", "desc", "tests")
+    second = evaluator.evaluate_code("code", "type", "desc", "tests")
+    assert first == second
+    assert session.posts == 1
+    evaluator.evaluate_code("other code", "type", "desc", "tests")
+    assert session.posts == 2
+
+def test_evaluator_cache_ignores_test_durations(tmp_path):
+    session = FakeSession('{"score": 70, "functionality_feedback": "", "quality_feedback": ""}')
+    model = OpenRouter(id="m", api_key="", base_url="http://localhost")
+    evaluator = EvaluatorAgent(model, session=session, cache=ResponseCache(str(tmp_path)))
+    evaluator.evaluate_code("code", "type", "desc", "3 passed, 0 failed, 0 skipped, 0 errors in 0.42s")
+    evaluator.evaluate_code("code", "type", "desc", "3 passed, 0 failed, 0 skipped, 0 errors in 1.07s (cached, files unchanged)")
+    evaluator.evaluate_code("code", "type", "desc", "===== 3 passed in 0.51s (0:00:00) =====")
+    evaluator.evaluate_code("code", "type", "desc", "===== 3 passed in 0.88s =====")
+    assert session.posts == 2
+    evaluator.evaluate_code("code", "type", "desc", "2 passed, 1 failed, 0 skipped, 0 errors in 0.42s")
+    assert session.posts == 3
+
+def test_invalid_json_is_not_cached(tmp_path):
+    session = FakeSession("not json")
+    model = OpenRouter(id="m", api_key="", base_url="http://localhost")
+    evaluator = EvaluatorAgent(model, session=session, cache=ResponseCache(str(tmp_path)))
+    evaluator.evaluate_code("code", "type", "desc", "tests")
+    evaluator.evaluate_code("code", "type", "desc", "tests")
+    # Each call retries an unparseable reply once, and neither result is cached
+    assert session.posts == 4
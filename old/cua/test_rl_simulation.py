@@ -0,0 +1,246 @@
+import json
+import os
+import time
+import pytest
+from conftest import FakeEvaluator, FakeGenerator, make_simulation
+
+def test_evaluators_run_concurrently(config_file):
+    evaluators = [FakeEvaluator(score, delay=0.2) for score in (50, 60, 70, 80)]
+    simulation = make_simulation(config_file, evaluators)
+    start = time.time()
+    results = simulation._evaluate("code", "type", "description", "tests")
+    elapsed = time.time() - start
+    assert [r["score"] for r in results] == [50, 60, 70, 80]
+    assert elapsed < 0.6
+
+def test_concurrency_cap_is_respected(config_file):
+    evaluators = [FakeEvaluator(50, delay=0.1) for _ in range(4)]
+    simulation = make_simulation(config_file, evaluators, max_concurrent_evaluations=1)
+    start = time.time()
+    simulation._evaluate("code", "type", "description", "tests")
+    assert time.time() - start >= 0.4
+
+def test_evaluator_exception_scores_zero(config_file):
+    class BrokenEvaluator(FakeEvaluator):
+        def evaluate_code(self, *args):
+            raise ValueError("boom")
+
+    simulation = make_simulation(config_file, [BrokenEvaluator(0), FakeEvaluator(40)])
+    results = simulation._evaluate("code", "type", "description", "tests")
+    assert results[0]["score"] == 0
+    assert "boom" in results[0]["functionality_feedback"]
+    assert results[1]["score"] == 40
+
+def test_run_queries_each_evaluator_once_per_iteration(config_file):
+    evaluators = [FakeEvaluator(20), FakeEvaluator(40)]
+    simulation = make_simulation(config_file, evaluators, max_iterations=2)
+    simulation.run()
+    assert [e.calls for e in evaluators] == [2, 2]
+    assert simulation.history[0]["score"] == 30
+    assert "ok 20" in simulation.history[0]["feedback"]
+
+def test_concurrent_runs_get_distinct_output_dirs(config_file, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        dirs = list(executor.map(lambda _: make_simulation(config_file, [], output_root=str(tmp_path / "runs")).output_dir, range(16)))
+    assert len(set(dirs)) == 16
+
+def test_transitions_persist_and_warm_start_next_run(config_file, tmp_path):
+    replay_file = str(tmp_path / "replay.npz")
+    first = make_simulation(config_file, [FakeEvaluator(80)], max_iterations=2, replay_file=replay_file)
+    first.run()
+    assert first.history[0]["state"] == "initial"
+    assert first.history[0]["next_state"] == "score_80"
+    second = make_simulation(config_file, [FakeEvaluator(80)], replay_file=replay_file)
+    assert len(second.replay_buffer) == 2
+    assert "initial" in second.algorithms[0].q_table
+
+def test_checkpoint_written_each_iteration_and_warm_starts(config_file, tmp_path):
+    checkpoint_file = str(tmp_path / "rl.bin")
+    first = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=2, checkpoint_file=checkpoint_file)
+    first.run()
+    second = make_simulation(config_file, [FakeEvaluator(50)], checkpoint_file=checkpoint_file)
+    assert second.warm_started
+    assert second.meta_agent.total == 2
+
+def test_run_records_structured_test_results(config_file):
+    from warm_pytest import PytestWorker
+    worker = PytestWorker(timeout=30)
+    try:
+        simulation = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=2, test_worker=worker)
+        simulation.run()
+    finally:
+        worker.close()
+    assert simulation.history[0]["tests"]["passed"] == 1
+    assert simulation.history[1]["tests"]["cached"] is True
+
+class LongGenerator(FakeGenerator):
+    # A library big enough that its signature summary is shorter than the file
+    def __init__(self, edit_library=False):
+        super().__init__()
+        self.edit_library = edit_library
+        self.prompts = []
+
+    def run(self, prompt, max_tokens=2000, output_dir=".", cancel=None):
+        self.prompts.append(prompt)
+        super().run(prompt, max_tokens, output_dir)
+        offset = len(self.prompts) if self.edit_library else 0
+        body = "\n\n".join(f"def add_{i}(a, b):\n    # keep the two numbers apart\n    return a + b + {i + offset}" for i in range(20))
+        return self.tools["FileTools"].save(body, "data_utils.py", output_dir)
+
+class RecordingEvaluator(FakeEvaluator):
+    def evaluate_code(self, code, *args):
+        self.codes = getattr(self, "codes", []) + [code]
+        return super().evaluate_code(code, *args)
+
+def test_incremental_prompts_summarize_unchanged_files_and_accumulate_feedback(make_config):
+    evaluator = RecordingEvaluator(50)
+    simulation = make_simulation(make_config(incremental_prompts=True), [evaluator], max_iterations=2)
+    simulation.generator = LongGenerator()
+    simulation.run()
+    first, second = (entry["prompt_tokens"] for entry in simulation.history)
+    assert first["evaluator_code"] == first["evaluator_code_full"]
+    assert second["files"]["data_utils.py"] == "unchanged"
+    assert second["evaluator_code"] < second["evaluator_code_full"]
+    assert "unchanged since iteration 1" in evaluator.codes[1] and "def add_19(a, b)" in evaluator.codes[1]
+    assert second["generator"] > first["generator"]
+    assert len(simulation.feedback_buffer.entries) == 2
+
+def test_incremental_prompts_send_changed_files_in_full(make_config):
+    evaluator = RecordingEvaluator(50)
+    simulation = make_simulation(make_config(incremental_prompts=True), [evaluator], max_iterations=2)
+    simulation.generator = LongGenerator(edit_library=True)
+    simulation.run()
+    assert simulation.history[1]["prompt_tokens"]["files"]["data_utils.py"] == "full"
+    # Evaluators never saw iteration 1, so a diff against it would mean nothing to them
+    assert "return a + b + 21" in evaluator.codes[1] and "diff against" not in evaluator.codes[1]
+
+def test_evaluators_get_full_files_and_only_latest_feedback_by_default(config_file):
+    evaluator = RecordingEvaluator(50)
+    simulation = make_simulation(config_file, [evaluator], max_iterations=2)
+    simulation.run()
+    assert simulation.feedback_buffer is None
+    assert simulation.last_feedback == simulation.history[-1]["feedback"]
+    assert evaluator.codes[0] == evaluator.codes[1]
+    assert "def add(a, b)" in evaluator.codes[1]
+
+def test_latest_feedback_is_capped_by_default(make_config):
+    class VerboseEvaluator(FakeEvaluator):
+        def evaluate_code(self, *args):
+            return dict(super().evaluate_code(*args), quality_feedback="too long " * 500)
+
+    simulation = make_simulation(make_config(feedback_token_budget=50), [VerboseEvaluator(50)], max_iterations=2)
+    simulation.generator = LongGenerator()
+    simulation.run()
+    assert simulation.feedback_buffer is None
+    assert "too long " * 10 in simulation.generator.prompts[1]
+    assert "too long " * 30 not in simulation.generator.prompts[1]
+
+def test_traced_run_writes_iteration_spans(config_file):
+    from tracing import tracer
+    tracer.reset()
+    tracer.enable()
+    try:
+        simulation = make_simulation(config_file, [FakeEvaluator(40), FakeEvaluator(60)], max_iterations=1)
+        simulation.run()
+    finally:
+        tracer.disable()
+    names = [span.name for span in tracer.spans]
+    tracer.reset()
+    assert names.count("iteration") == 1
+    assert "simulation.evaluate" in names
+    assert os.path.exists(os.path.join(simulation.output_dir, "trace.trace.json"))
+
+def test_each_run_exports_only_its_own_spans(config_file):
+    from tracing import tracer
+    tracer.enable()
+    try:
+        for _ in range(2):
+            simulation = make_simulation(config_file, [FakeEvaluator(40)], max_iterations=1)
+            simulation.run()
+    finally:
+        tracer.disable()
+        tracer.reset()
+    with open(os.path.join(simulation.output_dir, "trace.jsonl")) as f:
+        names = [json.loads(line)["name"] for line in f]
+    assert names.count("iteration") == 1
+
+class CountingGenerator(FakeGenerator):
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.calls = 0
+        self.fail_at = fail_at
+
+    def run(self, prompt, max_tokens=2000, output_dir=".", cancel=None):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("provider down")
+        return super().run(prompt, max_tokens, output_dir)
+
+def test_resume_continues_after_the_last_completed_iteration(config_file):
+    evaluator = FakeEvaluator(50)
+    generator = CountingGenerator(fail_at=3)
+    simulation = make_simulation(config_file, [evaluator], max_iterations=4)
+    simulation.generator = generator
+    simulation.run()
+    assert [entry["code"] for entry in simulation.history][-1] == "Generation failed"
+    q_values = simulation.algorithms[0].q_table.to_dict()
+
+    resumed = make_simulation(config_file, [evaluator], max_iterations=4, resume_dir=simulation.output_dir)
+    resumed.generator = CountingGenerator()
+    assert resumed.start_iteration == 2 and resumed.state == simulation.history[1]["next_state"]
+    assert resumed.algorithms[0].q_table.to_dict() == q_values
+    assert resumed.last_feedback == simulation.history[1]["feedback"]
+    assert len(resumed.replay_buffer) == 2
+    resumed.run()
+    assert [entry["iteration"] for entry in resumed.history] == [1, 2, 3, 4]
+    assert resumed.generator.calls == 2
+    assert evaluator.calls == 4
+
+def test_resume_reuses_a_generation_saved_mid_iteration(config_file):
+    class FailingEvaluator(FakeEvaluator):
+        def evaluate_code(self, *args):
+            raise KeyboardInterrupt()
+
+    generator = CountingGenerator()
+    simulation = make_simulation(config_file, [FailingEvaluator(50)], max_iterations=2)
+    simulation.generator = generator
+    with pytest.raises(KeyboardInterrupt):
+        simulation.run()
+    assert generator.calls == 1
+
+    evaluator = FakeEvaluator(60)
+    resumed = make_simulation(config_file, [evaluator], max_iterations=2, resume_dir=simulation.output_dir)
+    resumed.generator = CountingGenerator()
+    assert resumed.start_iteration == 0 and resumed.pending["iteration"] == 1
+    resumed.run()
+    # Iteration 1 reuses the saved generation; only iteration 2 calls the generator
+    assert resumed.generator.calls == 1
+    assert [entry["score"] for entry in resumed.history] == [60, 60]
+
+def test_resume_after_evaluation_does_not_rebuild_the_prompt(make_config, monkeypatch):
+    config_file = make_config(incremental_prompts=True)
+    reference = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=2)
+    reference.generator = LongGenerator()
+    reference.run()
+
+    simulation = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=2)
+    simulation.generator = LongGenerator()
+
+    def interrupt(*args):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(simulation.meta_agent, "update_score", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        simulation.run()
+
+    resumed = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=2, resume_dir=simulation.output_dir)
+    resumed.generator = LongGenerator()
+    assert "eval_results" in resumed.pending
+    resumed.run()
+    # The generator prompt names the output directory, so only the code side is compared
+    def code_side(history):
+        return [{k: v for k, v in entry["prompt_tokens"].items() if k != "generator"} for entry in history]
+    assert code_side(resumed.history) == code_side(reference.history)
+    assert resumed.history[1]["prompt_tokens"]["files"]["data_utils.py"] == "unchanged"
+    assert resumed.prompt_builder.iteration == 2
@@ -0,0 +1,63 @@
+import json
+import os
+import sqlite3
+from run_store import RunStore, config_hash
+from conftest import FakeEvaluator, make_simulation
+
+def write_results(directory, history):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "simulation_results.json"), "w") as f:
+        json.dump(history, f)
+
+def test_query_filters_by_algorithm_score_model_and_config(tmp_path):
+    store = RunStore(str(tmp_path / "runs.db"))
+    config = {"project_type": "x"}
+    first = store.start_run(str(tmp_path / "output_1"), config, generator_model="gen/a", evaluator_models=["eval/a"])
+    second = store.start_run(str(tmp_path / "output_2"), {"project_type": "y"}, generator_model="gen/b", evaluator_models=["eval/a", "eval/b"])
+    store.record_iteration(first, {"iteration": 1, "score": 40.0, "rl_algorithm": "Q-Learning"})
+    store.record_iteration(first, {"iteration": 2, "score": 85.0, "rl_algorithm": "SARSA"})
+    store.record_iteration(second, {"iteration": 1, "score": 95.0, "rl_algorithm": "Q-Learning"})
+
+    assert [r["score"] for r in store.query(algorithm="Q-Learning")] == [95.0, 40.0]
+    assert [r["score"] for r in store.query(min_score=50, max_score=90)] == [85.0]
+    assert {r["run_id"] for r in store.query(model="eval/b")} == {second}
+    assert {r["run_id"] for r in store.query(model="gen/a")} == {first}
+    assert {r["run_id"] for r in store.query(config_hash=config_hash(config))} == {first}
+    assert store.query(limit=1)[0]["entry"]["rl_algorithm"] == "Q-Learning"
+
+def test_iterations_survive_a_run_that_never_finishes(tmp_path):
+    path = str(tmp_path / "runs.db")
+    store = RunStore(path)
+    run_id = store.start_run(str(tmp_path / "output_1"))
+    store.record_iteration(run_id, {"iteration": 1, "score": 10.0})
+    # No finish_run and no close: simulate the process dying here
+    reopened = RunStore(path)
+    [run] = reopened.runs()
+    assert run["status"] == "running" and run["iterations"] == 1
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_import_outputs_is_idempotent(tmp_path):
+    write_results(tmp_path / "outputs" / "output_1", [{"iteration": 1, "score": 0.0, "rl_algorithm": "Q-Learning"},
+                                                      {"iteration": 2, "code": "Generation failed", "score": 0, "rl_algorithm": "Q-Learning"}])
+    write_results(tmp_path / "outputs" / "output_4", [{"iteration": 1, "score": 72.5, "rl_algorithm": "PPO"}])
+    (tmp_path / "outputs" / "output_5").mkdir()
+    store = RunStore(str(tmp_path / "runs.db"))
+    assert len(store.import_outputs(str(tmp_path / "outputs"))) == 2
+    assert store.import_outputs(str(tmp_path / "outputs")) == []
+    assert len(store.query()) == 3
+    assert store.query(algorithm="PPO")[0]["output_dir"] == str(tmp_path / "outputs" / "output_4")
+
+def test_simulation_commits_each_iteration(config_file, tmp_path):
+    store = RunStore(str(tmp_path / "runs.db"))
+    simulation = make_simulation(config_file, [FakeEvaluator(50)], max_iterations=3, run_store=store)
+    recorded = []
+    original = store.record_iteration
+    # Each iteration is in the store before the next one starts
+    store.record_iteration = lambda run_id, entry: (recorded.append(len(simulation.history)), original(run_id, entry))
+    simulation.run()
+    assert recorded == [1, 2, 3]
+    [run] = store.runs()
+    assert run["status"] == "finished" and run["iterations"] == 3
+    assert [r["iteration"] for r in store.query(order_by="iteration")] == [1, 2, 3]
+    # The live run is not imported a second time from its results file
+    assert store.import_outputs(os.path.dirname(simulation.output_dir) or ".") == []
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+from shell_exec import RingBuffer, ShellExecutor
+from cua4_rl import ShellTools
+
+def test_ring_buffer_keeps_head_and_tail():
+    buffer = RingBuffer(limit=10)
+    buffer.write(b"abcdefghij")
+    buffer.write(b"klmnopqrst")
+    assert buffer.total == 20
+    assert buffer.dropped == 10
+    assert buffer.text() == "abcde\n... [10 bytes truncated] ...\npqrst"
+
+def test_structured_result_fields():
+    result = ShellExecutor().run("echo out; echo err >&2; exit 3")
+    assert result["exit_code"] == 3
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+    assert result["stdout_bytes"] == 4
+    assert result["timed_out"] is False
+
+def test_large_output_is_capped():
+    result = ShellExecutor(max_output_bytes=1000).run("yes x | head -c 1000000")
+    assert result["stdout_bytes"] == 1000000
+    assert len(result["stdout"]) < 1100
+
+def test_timeout_kills_process_group():
+    start = time.time()
+    result = ShellExecutor(timeout=0.5).run("sleep 30 | sleep 30")
+    assert result["timed_out"] is True
+    assert time.time() - start < 5
+
+def test_concurrency_limit():
+    executor = ShellExecutor(max_concurrent=1)
+    start = time.time()
+    threads = [threading.Thread(target=executor.run, args=("sleep 0.3",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.time() - start >= 0.9
+
+def test_shell_tools_keeps_string_interface():
+    tools = ShellTools(timeout=0.5)
+    assert tools.execute("echo hi") == "hi\n"
+    assert tools.execute("true") == "Command executed (no output)"
+    assert tools.execute("echo bad >&2; false") == "Error: bad\n"
+    assert "timed out" in tools.execute("sleep 5")
+
+def test_async_callers_share_the_executor_loop():
+    executor = ShellExecutor(max_concurrent=2)
+
+    async def fan_out():
+        # Already inside a running loop, where a nested asyncio.run() would raise
+        return await asyncio.gather(*(executor.arun(f"sleep 0.3; echo {n}") for n in range(4)))
+
+    start = time.time()
+    results = asyncio.run(fan_out())
+    assert [r["stdout"] for r in results] == [f"{n}\n" for n in range(4)]
+    assert 0.6 <= time.time() - start < 1.5
+    assert executor.run("echo sync")["stdout"] == "sync\n"
+    executor.close()
@@ -0,0 +1,118 @@
+import requests
+import structured_output
+from structured_output import (CLEAN, EXTRACTED, INVALID, REPAIRED, UNPARSEABLE, JSONExtractor, ParseStats,
+                               extract_json, parse_reply, repair_json)
+from cua4_rl import EVALUATION_SCHEMA, EvaluatorAgent, OpenRouter
+
+class FakeResponse:
+    def __init__(self, content: str, status_code: int = 200, text: str = ""):
+        self.content = content
+        self.status_code = status_code
+        self.text = text or content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+class ScriptedSession:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.bodies = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.bodies.append(json)
+        reply = self.replies.pop(0)
+        return reply if isinstance(reply, FakeResponse) else FakeResponse(reply)
+
+def make_evaluator(session, model_id="m"):
+    return EvaluatorAgent(OpenRouter(id=model_id, api_key="", base_url="http://localhost"), session=session)
+
+def test_fenced_reply_is_extracted():
+    # A reply from outputs/output_1 that plain json.loads rejected
+    reply = '```json\n{\n  "score": 0,\n  "functionality_feedback": "fails",\n  "quality_feedback": "placeholder \'[library_code]\'"\n}\n``` \n'
+    value, status = extract_json(reply)
+    assert status == EXTRACTED
+    assert value["score"] == 0 and value["quality_feedback"].endswith("'[library_code]'")
+
+def test_truncated_reply_is_closed():
+    value, status = extract_json('{\n  "score": 15,\n  "functionality_feedback": "Missing app.py\\n- Missing tes')
+    assert status == REPAIRED
+    assert value == {"score": 15, "functionality_feedback": "Missing app.py\n- Missing tes"}
+    # A reply cut off inside a key keeps the members before it
+    assert extract_json('{"score": 70, "quality_fe')[0] == {"score": 70}
+
+def test_repair_fixes_trailing_commas_and_python_literals():
+    assert repair_json('{"a": [1, 2,], "b": True, "c": None,}') == '{"a": [1, 2], "b": true, "c": null}'
+    # String contents are left alone
+    assert repair_json('{"a": "True, }"}') == '{"a": "True, }"}'
+
+def test_braces_in_prose_are_skipped():
+    value, status = extract_json('I would give {score} here. {"score": 81, "functionality_feedback": "ok"}')
+    assert status == EXTRACTED and value["score"] == 81
+
+def test_failed_candidates_are_scanned_once():
+    extractor = JSONExtractor()
+    attempts = []
+    accept = extractor._accept
+    extractor._accept = lambda text, truncated: attempts.append(text) or accept(text, truncated)
+    value = extractor.feed("{a " * 2000 + "}" * 2000 + ' then {"score": 3}')
+    assert value == {"score": 3}
+    assert len(attempts) == 2
+
+def test_extractor_returns_as_soon_as_object_closes():
+    extractor = JSONExtractor()
+    chunks = ["Sure! ```json\n{\"score\"", ": 90, \"functionality_feedback\": \"a } b\"", "}\n```", " and more prose"]
+    assert extractor.feed(chunks[0]) is None
+    assert extractor.feed(chunks[1]) is None
+    assert extractor.feed(chunks[2]) == {"score": 90, "functionality_feedback": "a } b"}
+    assert extractor.feed(chunks[3])["score"] == 90
+
+def test_schema_coerces_and_clamps():
+    assert parse_reply('{"score": "85/100"}', EVALUATION_SCHEMA)["value"] == {"score": 85, "functionality_feedback": "", "quality_feedback": ""}
+    assert parse_reply('{"score": 120.4, "quality_feedback": ["a"]}', EVALUATION_SCHEMA)["value"]["score"] == 100
+    assert parse_reply('{"score": 70}', EVALUATION_SCHEMA)["status"] == CLEAN
+    assert parse_reply('{"functionality_feedback": "no score"}', EVALUATION_SCHEMA)["status"] == INVALID
+    assert parse_reply('{"score": "great"}', EVALUATION_SCHEMA)["status"] == INVALID
+    assert parse_reply("no json at all", EVALUATION_SCHEMA)["status"] == UNPARSEABLE
+
+def test_parse_stats_rates():
+    stats = ParseStats()
+    for status in (CLEAN, EXTRACTED, UNPARSEABLE, REPAIRED):
+        stats.record("evaluator/m", status)
+    report = stats.report()["evaluator/m"]
+    assert report["replies"] == 4
+    assert report["failure_rate"] == 0.25
+    assert report["repair_rate"] == 0.5
+
+def test_evaluator_requests_json_mode_and_skips_retry_for_fenced_reply():
+    session = ScriptedSession(['```json\n{"score": 77, "functionality_feedback": "ok", "quality_feedback": "ok"}\n```'])
+    result = make_evaluator(session, "json-mode").evaluate_code("code", "type", "desc", "tests")
+    assert result["score"] == 77
+    assert session.bodies[0]["response_format"] == {"type": "json_object"}
+    assert len(session.bodies) == 1
+
+def test_evaluator_retries_unparseable_reply_once(monkeypatch):
+    stats = ParseStats()
+    monkeypatch.setattr("cua4_rl.parse_stats", stats)
+    session = ScriptedSession(["I think it deserves a solid score.", '{"score": 64}'])
+    result = make_evaluator(session, "retry").evaluate_code("code", "type", "desc", "tests")
+    assert result["score"] == 64
+    assert len(session.bodies) == 2
+    # The retry shows the model its reply and says what was wrong
+    assert session.bodies[1]["messages"][1] == {"role": "assistant", "content": "I think it deserves a solid score."}
+    assert "no JSON object found" in session.bodies[1]["messages"][2]["content"]
+    report = stats.report()["evaluator/retry"]
+    assert (report["replies"], report["retries"], report[UNPARSEABLE], report[CLEAN]) == (2, 1, 1, 1)
+
+def test_model_rejecting_json_mode_is_remembered():
+    rejection = FakeResponse("", status_code=400, text='{"error": {"message": "response_format is not supported"}}')
+    session = ScriptedSession([rejection, '{"score": 50}', '{"score": 51}'])
+    evaluator = make_evaluator(session, "no-json-mode")
+    assert evaluator.evaluate_code("code", "type", "desc", "tests")["score"] == 50
+    assert evaluator.evaluate_code("other", "type", "desc", "tests")["score"] == 51
+    assert "response_format" in session.bodies[0]
+    assert all("response_format" not in body for body in session.bodies[1:])
+    assert not structured_output.json_mode_supported("no-json-mode")
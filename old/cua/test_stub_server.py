@@ -0,0 +1,54 @@
+import json
+import requests
+import pytest
+from stub_server import LatencyModel, StubServer
+from benchmark import compare, main, parse_args, run_benchmarks
+from cua4_rl import Agent, FileTools, OpenRouter
+
+def post(base_url, body):
+    return requests.post(f"{base_url}/chat/completions", json=body, timeout=5)
+
+def test_rules_match_prompt_substrings():
+    with StubServer([("reviewer", "R"), ("", "G")]) as stub:
+        assert post(stub.base_url, {"messages": [{"content": "code reviewer"}]}).json()["choices"][0]["message"]["content"] == "R"
+        assert post(stub.base_url, {"messages": [{"content": "build"}]}).json()["choices"][0]["message"]["content"] == "G"
+
+def test_injected_errors_and_retry_after():
+    with StubServer(["ok"], error_rate_429=1.0, retry_after=2) as stub:
+        response = post(stub.base_url, {"messages": []})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert stub.stats["429"] == 1
+    with StubServer(["ok"], error_rate_5xx=1.0) as stub:
+        assert post(stub.base_url, {"messages": []}).status_code == 503
+
+def test_latency_models_are_seeded_and_positive():
+    for kind in ("fixed", "uniform", "lognormal", "exponential"):
+        samples = [LatencyModel(kind).sample() for _ in range(5)]
+        assert all(s >= 0 for s in samples)
+    with pytest.raises(ValueError):
+        LatencyModel("pareto")
+
+def test_streaming_reply_drives_agent(tmp_path):
+    reply = "[FileTools]save:A = 1:a.py[/FileTools][FileTools]save:B = 2:b.py[/FileTools]"
+    with StubServer([reply], stream_chunk_chars=7) as stub:
+        agent = Agent(OpenRouter("stub", "key", stub.base_url), [FileTools()], stream=True)
+        agent.run("prompt", output_dir=str(tmp_path))
+        assert stub.stats["streamed"] == 1
+    assert (tmp_path / "b.py").read_text() == "B = 2"
+    assert agent.stream_stats["tool_calls"] == 2
+
+def test_benchmark_report_is_machine_readable(tmp_path):
+    args = parse_args(["--iterations", "2", "--evaluators", "2", "--concurrency", "2", "--latency", "fixed", "--latency-ms", "1"])
+    report = run_benchmarks(args)
+    assert report["results"]["iteration_latency"]["iteration_seconds"]["n"] == 2
+    assert report["results"]["concurrent_throughput"]["iterations"] == 4
+    assert report["results"]["memory"]["peak_bytes"] > 0
+    json.dumps(report)
+    diff = compare(report, report)
+    assert diff["memory.peak_bytes"]["change"] == 0
+
+def test_benchmark_cli_writes_output(tmp_path):
+    output = tmp_path / "bench.json"
+    main(["--iterations", "1", "--only", "memory", "--output", str(output)])
+    assert "memory" in json.loads(output.read_text())["results"]
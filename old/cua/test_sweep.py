@@ -0,0 +1,37 @@
+import csv
+import json
+import sweep
+from sweep import expand_grid, run_sweep, write_results_table
+
+def fake_runner(job):
+    assert sweep._request_slots is not None
+    return {"job_id": job["job_id"], "rl_algorithm": job["rl_algorithm"], "evaluators": job["evaluators"],
+            "max_iterations": job["max_iterations"], "seed": job["seed"], "best_score": job["seed"] * 10, "error": ""}
+
+def failing_runner(job):
+    raise RuntimeError("boom")
+
+def test_expand_grid_is_cartesian_product():
+    grid = {"rl_algorithm": ["Q-Learning", "SARSA"], "evaluators": [["a"], ["a", "b"]], "seed": [1, 2, 3]}
+    jobs = expand_grid(grid, "config.json", "sweep")
+    assert len(jobs) == 12
+    assert [job["job_id"] for job in jobs] == list(range(12))
+    assert {job["max_iterations"] for job in jobs} == {3}
+
+def test_run_sweep_collects_rows_in_job_order():
+    jobs = expand_grid({"seed": [3, 1, 2]}, "config.json", "sweep")
+    rows = run_sweep(jobs, workers=2, max_inflight=1, runner=fake_runner)
+    assert [row["job_id"] for row in rows] == [0, 1, 2]
+    assert [row["best_score"] for row in rows] == [30, 10, 20]
+
+def test_worker_failure_is_recorded():
+    rows = run_sweep(expand_grid({}, "config.json", "sweep"), workers=1, runner=failing_runner)
+    assert "boom" in rows[0]["error"]
+
+def test_write_results_table(tmp_path):
+    rows = [{"job_id": 0, "rl_algorithm": "SARSA", "evaluators": ["a", "b"], "best_score": 80, "error": ""}]
+    write_results_table(rows, str(tmp_path))
+    with open(tmp_path / "sweep_results.csv") as f:
+        table = list(csv.DictReader(f))
+    assert table[0]["evaluators"] == "a b"
+    assert json.loads((tmp_path / "sweep_results.json").read_text())[0]["best_score"] == 80
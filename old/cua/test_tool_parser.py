@@ -0,0 +1,114 @@
+import json
+import time
+import os
+from tool_parser import IncrementalToolParser, dispatch_blocks, parse_file_command, parse_tool_blocks, plan_stages
+from cua4_rl import Agent, FileTools, OpenRouter, ShellTools
+
+def test_block_emitted_when_closing_tag_arrives():
+    parser = IncrementalToolParser(["FileTools", "ShellTools"])
+    assert parser.feed("intro [File") == []
+    assert parser.feed("Tools]save:x = 1:a.py[/File") == []
+    blocks = parser.feed("Tools] more")
+    assert len(blocks) == 1
+    assert blocks[0].tool_name == "FileTools"
+    assert blocks[0].command == "save:x = 1:a.py"
+
+def test_multiple_blocks_in_order_char_by_char():
+    text = "[FileTools]save:a:a.py[/FileTools]\n[ShellTools]echo hi[/ShellTools][FileTools]read:a.py:x[/FileTools]"
+    parser = IncrementalToolParser(["FileTools", "ShellTools"])
+    blocks = []
+    for ch in text:
+        blocks.extend(parser.feed(ch))
+    assert [(b.tool_name, b.command) for b in blocks] == [
+        ("FileTools", "save:a:a.py"),
+        ("ShellTools", "echo hi"),
+        ("FileTools", "read:a.py:x"),
+    ]
+
+def test_unclosed_block_is_not_emitted():
+    parser = IncrementalToolParser(["ShellTools"])
+    assert parser.feed("[ShellTools]rm -rf") == []
+
+class FakeStreamResponse:
+    status_code = 200
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        yield ": OPENROUTER PROCESSING"
+        for chunk in self.chunks:
+            yield "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]})
+            yield ""
+        yield "data: [DONE]"
+
+class FakeStreamSession:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.data = None
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        self.data = json
+        return FakeStreamResponse(self.chunks)
+
+def test_streaming_run_dispatches_every_block(tmp_path):
+    chunks = ["[FileTools]save:VALUE = ", "1:lib.py[/FileTools]", "[FileTools]save:x = 2", ":main.py[/FileTools]"]
+    agent = Agent(OpenRouter("m", "", "http://localhost"), [ShellTools(), FileTools()], stream=True)
+    agent.session = FakeStreamSession(chunks)
+    result = agent.run("prompt", output_dir=str(tmp_path))
+    assert agent.session.data["stream"] is True
+    assert os.path.exists(tmp_path / "lib.py")
+    assert (tmp_path / "main.py").read_text() == "x = 2"
+    assert "Saved to" in result
+    assert agent.stream_stats["tool_calls"] == 2
+    assert agent.stream_stats["time_to_first_token"] <= agent.stream_stats["time_to_first_tool"]
+
+def test_parse_tool_blocks_finds_every_block():
+    content = (
+        "[FileTools]save:def a():\n    return 1:data_utils.py[/FileTools]\n"
+        "[FileTools]save:import data_utils:app.py[/FileTools]\n"
+        "[FileTools]save:def test_a():\n    pass:tests.py[/FileTools]"
+    )
+    blocks = parse_tool_blocks(content, ["FileTools", "ShellTools"])
+    assert [parse_file_command(b.command)[2] for b in blocks] == ["data_utils.py", "app.py", "tests.py"]
+    assert parse_file_command(blocks[0].command)[1] == "def a():\n    return 1"
+
+def test_plan_stages_serialises_dependent_blocks():
+    blocks = parse_tool_blocks(
+        "[FileTools]save:1:a.py[/FileTools][FileTools]save:2:b.py[/FileTools]"
+        "[ShellTools]python a.py[/ShellTools]"
+        "[FileTools]save:3:a.py[/FileTools][FileTools]read:a.py:x[/FileTools]",
+        ["FileTools", "ShellTools"]
+    )
+    assert plan_stages(blocks) == [[0, 1], [2], [3], [4]]
+
+def test_dispatch_runs_independent_saves_in_parallel():
+    blocks = parse_tool_blocks("".join(f"[FileTools]save:x:{n}.py[/FileTools]" for n in range(4)), ["FileTools"])
+
+    def slow(block):
+        time.sleep(0.2)
+        return block.command
+
+    start = time.time()
+    results = dispatch_blocks(blocks, slow, max_workers=4)
+    assert time.time() - start < 0.6
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert all(r["duration"] >= 0.2 for r in results)
+
+def test_execute_tools_saves_all_files(tmp_path):
+    agent = Agent(OpenRouter("m", "", "http://localhost"), [ShellTools(), FileTools()])
+    content = (
+        "[FileTools]save:```python\nA = 1\n```:data_utils.py[/FileTools]"
+        "[FileTools]save:B = 2:app.py[/FileTools]"
+        "[FileTools]save:C = 3:tests.py[/FileTools]"
+    )
+    results = agent._execute_tools(content, str(tmp_path))
+    assert len(results) == 3
+    assert (tmp_path / "data_utils.py").read_text() == "A = 1"
+    assert (tmp_path / "tests.py").read_text() == "C = 3"
@@ -0,0 +1,75 @@
+import json
+import time
+import pytest
+from tracing import NOOP_SPAN, Tracer, current_span, traced, tracer
+from stub_server import StubServer
+from cua4_rl import Agent, FileTools, OpenRouter
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.reset()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.reset()
+
+def test_disabled_tracer_returns_noop():
+    local = Tracer()
+    assert local.span("x") is NOOP_SPAN
+    with local.span("x") as span:
+        span.set(a=1)
+    assert local.spans == []
+
+def test_nested_spans_record_parent_and_attrs():
+    local = Tracer()
+    local.enable()
+    with local.span("outer") as outer:
+        with local.span("inner", size=3) as inner:
+            inner.set(status=200)
+    assert [s.name for s in local.spans] == ["inner", "outer"]
+    assert local.spans[0].parent_id == outer.span_id
+    assert local.spans[0].attrs == {"size": 3, "status": 200}
+
+def test_exceptions_are_recorded():
+    local = Tracer()
+    local.enable()
+    with pytest.raises(ValueError):
+        with local.span("boom"):
+            raise ValueError("bad")
+    assert local.spans[0].attrs["error"] == "ValueError: bad"
+
+def test_traced_decorator_only_records_when_enabled(enabled_tracer):
+    @traced("work")
+    def work():
+        current_span().set(done=True)
+        return 1
+
+    assert work() == 1
+    enabled_tracer.disable()
+    work()
+    assert [(s.name, s.attrs) for s in enabled_tracer.spans] == [("work", {"done": True})]
+
+def test_agent_http_and_tool_spans_export(enabled_tracer, tmp_path):
+    with StubServer(["[FileTools]save:A = 1:a.py[/FileTools]"]) as stub:
+        Agent(OpenRouter("stub", "key", stub.base_url), [FileTools()]).run("prompt", output_dir=str(tmp_path))
+    spans = {s.name: s for s in enabled_tracer.spans}
+    assert spans["agent.call_api"].attrs["status"] == 200
+    assert spans["agent.call_api"].attrs["request_bytes"] > 0
+    assert spans["agent.tool"].parent_id == spans["agent.execute_tools"].span_id
+    jsonl, chrome = enabled_tracer.export(str(tmp_path / "trace"))
+    with open(chrome) as f:
+        events = json.load(f)["traceEvents"]
+    assert {e["name"] for e in events} >= {"agent.call_api", "agent.execute_tools", "agent.tool"}
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    with open(jsonl) as f:
+        assert len(f.read().splitlines()) == len(events)
+
+def test_disabled_overhead_is_small():
+    @traced("noop")
+    def noop():
+        return None
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        noop()
+    assert time.perf_counter() - start < 1.0
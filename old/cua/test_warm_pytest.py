@@ -0,0 +1,114 @@
+import time
+import pytest
+from warm_pytest import PytestWorker, content_key, format_report
+
+@pytest.fixture
+def worker():
+    worker = PytestWorker(timeout=10)
+    yield worker
+    worker.close()
+
+def write_suite(directory, body):
+    (directory / "data_utils.py").write_text("def add(a, b):\n    return a + b\n")
+    (directory / "tests.py").write_text("from data_utils import add\n\n" + body)
+
+def test_structured_counts(tmp_path, worker):
+    write_suite(tmp_path, "def test_ok():\n    assert add(1, 2) == 3\n\ndef test_bad():\n    assert add(1, 1) == 3\n\n@__import__('pytest').mark.skip\ndef test_skip():\n    pass\n")
+    result = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    assert (result["passed"], result["failed"], result["skipped"]) == (1, 1, 1)
+    assert result["cached"] is False
+    assert any("test_bad" in nodeid for nodeid in result["failures"])
+    assert "1 passed, 1 failed, 1 skipped" in format_report(result)
+
+def test_unchanged_files_return_cached_result(tmp_path, worker):
+    write_suite(tmp_path, "def test_ok():\n    assert add(1, 2) == 3\n")
+    worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    again = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    assert again["cached"] is True
+    assert worker.hits == 1
+
+def test_changed_library_reruns_with_fresh_imports(tmp_path, worker):
+    write_suite(tmp_path, "def test_ok():\n    assert add(1, 2) == 3\n")
+    assert worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])["passed"] == 1
+    (tmp_path / "data_utils.py").write_text("def add(a, b):\n    return a - b\n")
+    result = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    assert result["cached"] is False
+    assert result["failed"] == 1
+
+def test_collection_error_is_reported(tmp_path, worker):
+    (tmp_path / "tests.py").write_text("import missing_module\n")
+    result = worker.run(str(tmp_path), "tests.py")
+    assert result["error"] >= 1
+
+def test_hanging_test_times_out(tmp_path):
+    (tmp_path / "tests.py").write_text("import time\n\ndef test_hang():\n    time.sleep(30)\n")
+    worker = PytestWorker(timeout=1)
+    try:
+        start = time.time()
+        result = worker.run(str(tmp_path), "tests.py")
+        assert result["timed_out"] is True
+        assert time.time() - start < 10
+    finally:
+        worker.close()
+
+def test_content_key_tracks_file_contents(tmp_path):
+    (tmp_path / "a.py").write_text("x = 1")
+    first = content_key(str(tmp_path), ["a.py"], "tests.py")
+    (tmp_path / "a.py").write_text("x = 2")
+    assert content_key(str(tmp_path), ["a.py"], "tests.py") != first
+
+def test_sharded_run_matches_unsharded_counts(tmp_path, worker):
+    body = "".join(f"def test_ok_{i}():\n    assert add({i}, 1) == {i + 1}\n\n" for i in range(9))
+    write_suite(tmp_path, body + "def test_bad():\n    assert add(1, 1) == 3\n")
+    single = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    sharded = PytestWorker(timeout=10, shards=3)
+    try:
+        result = sharded.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    finally:
+        sharded.close()
+    assert (result["passed"], result["failed"]) == (single["passed"], single["failed"]) == (9, 1)
+    assert len(result["shards"]) == 2
+    assert sorted(t["nodeid"] for t in result["tests"]) == sorted(t["nodeid"] for t in single["tests"])
+    assert "across 2 shards" in format_report(result)
+
+def test_per_test_timeout_fails_only_the_hanging_test(tmp_path):
+    write_suite(tmp_path, "import time\n\ndef test_ok():\n    assert add(1, 2) == 3\n\ndef test_hang():\n    time.sleep(30)\n\ndef test_after():\n    assert add(2, 2) == 4\n")
+    worker = PytestWorker(timeout=20, per_test_timeout=0.5)
+    try:
+        start = time.time()
+        result = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+        assert time.time() - start < 10
+    finally:
+        worker.close()
+    assert (result["passed"], result["failed"]) == (2, 1)
+    assert result["timed_out"] is False
+    assert [nodeid.split("::")[-1] for nodeid in result["timed_out_tests"]] == ["test_hang"]
+    assert "TIMED OUT" in format_report(result)
+
+def test_shards_run_in_parallel(tmp_path):
+    write_suite(tmp_path, "import time\n\n" + "".join(f"def test_slow_{i}():\n    time.sleep(0.4)\n\n" for i in range(8)))
+    worker = PytestWorker(timeout=20, shards=4)
+    try:
+        worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+        start = time.time()
+        (tmp_path / "data_utils.py").write_text("def add(a, b):\n    return b + a\n")
+        result = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+        elapsed = time.time() - start
+    finally:
+        worker.close()
+    assert result["passed"] == 8
+    # 3.2s of sleeping in one process; two shards of four tests take about 1.6s
+    assert len(result["shards"]) == 2
+    assert elapsed < 2.8
+
+def test_global_timeout_marks_killed_shard_tests_as_errors(tmp_path):
+    write_suite(tmp_path, "import time\n\n" + "".join(f"def test_ok_{i}():\n    pass\n\n" for i in range(7)) + "def test_hang():\n    time.sleep(30)\n")
+    worker = PytestWorker(timeout=2, shards=2)
+    try:
+        result = worker.run(str(tmp_path), "tests.py", files=["data_utils.py"])
+    finally:
+        worker.close()
+    assert result["timed_out"] is True
+    assert result["passed"] == 4
+    assert result["error"] == 4
+    assert [shard["timed_out"] for shard in result["shards"]] == [False, True]
@@ -0,0 +1,121 @@
+import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+class ToolBlock:
+    def __init__(self, tool_name: str, command: str, start: int, end: int):
+        self.tool_name = tool_name
+        self.command = command
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"ToolBlock({self.tool_name!r}, {self.command[:40]!r})"
+
+class IncrementalToolParser:
+    # Emits each [Tool]...[/Tool] block as soon as its closing tag has been fed
+    def __init__(self, tool_names: Iterable[str]):
+        names = sorted(tool_names, key=len, reverse=True)
+        self.start_pattern = re.compile("|".join(re.escape(f"[{name}]") for name in names)) if names else None
+        self.max_start_len = max((len(name) + 2 for name in names), default=0)
+        self.buffer = ""
+        self.pos = 0
+        self.current = None
+        self.block_start = 0
+
+    def feed(self, chunk: str) -> List[ToolBlock]:
+        self.buffer += chunk
+        blocks = []
+        while self.start_pattern is not None:
+            if self.current is None:
+                match = self.start_pattern.search(self.buffer, self.pos)
+                if not match:
+                    # Keep a tail that may hold a partially streamed start tag
+                    self.pos = max(self.pos, len(self.buffer) - self.max_start_len + 1)
+                    break
+                self.current = match.group(0)[1:-1]
+                self.block_start = match.start()
+                self.pos = match.end()
+            end_tag = f"[/{self.current}]"
+            end_idx = self.buffer.find(end_tag, self.pos)
+            if end_idx == -1:
+                self.pos = max(self.pos, len(self.buffer) - len(end_tag) + 1)
+                break
+            content_start = self.block_start + len(self.current) + 2
+            blocks.append(ToolBlock(self.current, self.buffer[content_start:end_idx].strip(), self.block_start, end_idx + len(end_tag)))
+            self.pos = end_idx + len(end_tag)
+            self.current = None
+        return blocks
+
+def parse_tool_blocks(content: str, tool_names: Iterable[str]) -> List[ToolBlock]:
+    return IncrementalToolParser(tool_names).feed(content)
+
+def parse_file_command(cmd: str) -> Optional[Tuple[str, str, str]]:
+    # save:<content>:<file> splits on the last colon since code is full of them
+    match = re.match(r"^(save|read):(.+):(.+?)$", cmd, re.DOTALL)
+    if not match:
+        return None
+    op, content_or_file, filename = match.groups()
+    return op, content_or_file, filename.strip()
+
+def _block_target(block: ToolBlock) -> Optional[str]:
+    if block.tool_name != "FileTools":
+        return None
+    parsed = parse_file_command(block.command)
+    if parsed is None:
+        return None
+    op, content_or_file, filename = parsed
+    return filename if op == "save" else content_or_file.strip()
+
+def plan_stages(blocks: List[ToolBlock]) -> List[List[int]]:
+    # File operations on distinct files share a stage; shell commands and
+    # repeated touches of the same file wait for everything before them
+    stages = []
+    current = []
+    touched = set()
+    for index, block in enumerate(blocks):
+        target = _block_target(block)
+        if target is None:
+            if current:
+                stages.append(current)
+            stages.append([index])
+            current, touched = [], set()
+            continue
+        if target in touched:
+            stages.append(current)
+            current, touched = [], set()
+        current.append(index)
+        touched.add(target)
+    if current:
+        stages.append(current)
+    return stages
+
+def dispatch_blocks(blocks: List[ToolBlock], run_block: Callable[[ToolBlock], str], max_workers: int = 4) -> List[Dict]:
+    results = [None] * len(blocks)
+    dispatch_start = time.time()
+
+    def timed(index: int) -> Dict:
+        block = blocks[index]
+        start = time.time()
+        try:
+            result = run_block(block)
+        except Exception as e:
+            result = f"Unexpected error: {str(e)}"
+        return {
+            "index": index,
+            "tool": block.tool_name,
+            "command": block.command,
+            "result": result,
+            "started_at": start - dispatch_start,
+            "duration": time.time() - start
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for stage in plan_stages(blocks):
+            # Each task runs in a copy of the caller's context so tracing spans keep their parent
+            futures = [executor.submit(contextvars.copy_context().run, timed, index) for index in stage]
+            for index, future in zip(stage, futures):
+                results[index] = future.result()
+    return results
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+import functools
+import itertools
+import contextvars
+from typing import Dict, List, Optional
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+class _NoopSpan:
+    # Shared stand-in while tracing is off, so instrumented code pays one attribute check
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "start", "end", "tid", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(tracer._ids)
+        self.parent_id = None
+        self.start = 0.0
+        self.end = 0.0
+        self.tid = 0
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current.set(self)
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+        if exc is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._record(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.tracer.wall_origin + (self.start - self.tracer.origin),
+            "duration": self.end - self.start,
+            "tid": self.tid,
+            "attrs": self.attrs
+        }
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.origin = time.perf_counter()
+        self.wall_origin = time.time()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def _record(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def write_jsonl(self, path: str):
+        with open(path, "w") as f:
+            for span in list(self.spans):
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def write_chrome_trace(self, path: str):
+        pid = os.getpid()
+        events = [{
+            "name": span.name,
+            "cat": span.name.split(".")[0],
+            "ph": "X",
+            "ts": (span.start - self.origin) * 1e6,
+            "dur": (span.end - span.start) * 1e6,
+            "pid": pid,
+            "tid": span.tid,
+            "args": {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v) for k, v in span.attrs.items()}
+        } for span in list(self.spans)]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export(self, prefix: str) -> List[str]:
+        paths = [f"{prefix}.jsonl", f"{prefix}.trace.json"]
+        self.write_jsonl(paths[0])
+        self.write_chrome_trace(paths[1])
+        return paths
+
+tracer = Tracer()
+
+def current_span():
+    span = _current.get()
+    return span if span is not None else NOOP_SPAN
+
+def traced(name: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_http(response, model_id: Optional[str] = None):
+    if not tracer.enabled:
+        return
+    span = current_span()
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    request_body = getattr(getattr(response, "request", None), "body", None) or b""
+    attrs = {
+        "status": response.status_code,
+        "request_bytes": len(request_body),
+        "retries": len(retries.history) if retries is not None else 0
+    }
+    # Reading .content would drain a streaming body
+    if getattr(response, "_content_consumed", True):
+        attrs["response_bytes"] = len(response.content or b"")
+    if model_id is not None:
+        attrs["model"] = model_id
+    span.set(**attrs)
@@ -0,0 +1,343 @@
+import io
+import os
+import re
+import json
+import time
+import select
+import signal
+import hashlib
+import importlib
+import threading
+import contextlib
+import multiprocessing
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+MAX_OUTPUT_CHARS = 4000
+# Smallest shard worth an extra fork; suites below twice this run in one process
+MIN_SHARD_SIZE = 4
+
+class TestTimeout(Exception):
+    pass
+
+class _ResultCollector:
+    def __init__(self):
+        self.outcomes = {}
+        self.durations = {}
+        self.failures = {}
+        self.collection_errors = []
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.collection_errors.append(f"{report.nodeid}: {report.longreprtext[-1000:]}")
+
+    def pytest_runtest_logreport(self, report):
+        self.durations[report.nodeid] = self.durations.get(report.nodeid, 0.0) + report.duration
+        if report.failed:
+            self.outcomes[report.nodeid] = "failed" if report.when == "call" else "error"
+            self.failures[report.nodeid] = report.longreprtext[-1000:]
+        elif report.skipped and self.outcomes.get(report.nodeid) is None:
+            self.outcomes[report.nodeid] = "skipped"
+        elif report.when == "call" and report.passed:
+            self.outcomes[report.nodeid] = "passed"
+
+class _IdCollector:
+    def __init__(self):
+        self.ids = []
+        self.collection_errors = []
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.collection_errors.append(f"{report.nodeid}: {report.longreprtext[-1000:]}")
+
+    def pytest_collection_finish(self, session):
+        self.ids = [item.nodeid for item in session.items]
+
+def _timeout_plugin(seconds: float):
+    import pytest
+
+    def expire(signum, frame):
+        raise TestTimeout(f"Test exceeded the per-test timeout of {seconds}s")
+
+    class PerTestTimeout:
+        # SIGALRM interrupts Python-level hangs; anything deaf to signals is left to the shard's hard timeout
+        @pytest.hookimpl(hookwrapper=True)
+        def pytest_runtest_call(self, item):
+            previous = signal.signal(signal.SIGALRM, expire)
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+            try:
+                yield
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+
+    return PerTestTimeout()
+
+def collect_test_ids(test_dir: str, test_file: str, args: Iterable[str] = ()) -> Dict:
+    import pytest
+    collector = _IdCollector()
+    cwd = os.getcwd()
+    try:
+        os.chdir(test_dir)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            pytest.main([test_file, "--collect-only", "-q", "--rootdir", ".", "-p", "no:cacheprovider", *args], plugins=[collector])
+    except Exception as e:
+        collector.collection_errors.append(f"pytest crashed: {str(e)}")
+    finally:
+        os.chdir(cwd)
+    return {"ids": collector.ids, "collection_errors": collector.collection_errors}
+
+def run_pytest(test_dir: str, test_file: str, args: Iterable[str] = (), per_test_timeout: Optional[float] = None,
+               test_ids: Optional[List[str]] = None) -> Dict:
+    import pytest
+    collector = _ResultCollector()
+    plugins = [collector]
+    if per_test_timeout and hasattr(signal, "setitimer"):
+        plugins.append(_timeout_plugin(per_test_timeout))
+    output = io.StringIO()
+    start = time.time()
+    cwd = os.getcwd()
+    # Node ids from collect_test_ids are relative to the test dir, hence the pinned rootdir
+    targets = list(test_ids) if test_ids is not None else [test_file]
+    try:
+        os.chdir(test_dir)
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            exit_code = int(pytest.main([*targets, "-q", "--tb=short", "--rootdir", ".", "-p", "no:cacheprovider", *args], plugins=plugins))
+    except Exception as e:
+        exit_code = -1
+        collector.collection_errors.append(f"pytest crashed: {str(e)}")
+    finally:
+        os.chdir(cwd)
+    counts = {"passed": 0, "failed": 0, "skipped": 0, "error": 0}
+    for outcome in collector.outcomes.values():
+        counts[outcome] += 1
+    counts["error"] += len(collector.collection_errors)
+    text = output.getvalue()
+    return {
+        "exit_code": exit_code,
+        **counts,
+        "duration": time.time() - start,
+        "tests": [{"nodeid": nodeid, "outcome": outcome, "duration": collector.durations.get(nodeid, 0.0)} for nodeid, outcome in collector.outcomes.items()],
+        "failures": collector.failures,
+        "collection_errors": collector.collection_errors,
+        "output": text if len(text) <= MAX_OUTPUT_CHARS else text[-MAX_OUTPUT_CHARS:],
+        "timed_out": False,
+        "timed_out_tests": [nodeid for nodeid, message in collector.failures.items() if "TestTimeout" in message]
+    }
+
+def _start_fork(target: Callable[[], Dict]) -> Tuple[int, int]:
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            data = json.dumps(target()).encode("utf-8")
+        except BaseException as e:
+            data = json.dumps({"exit_code": -1, "error": 1, "collection_errors": [str(e)]}).encode("utf-8")
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(data)
+        os._exit(0)
+    os.close(write_fd)
+    return pid, read_fd
+
+def _wait_forks(children: List[Tuple[int, int]], deadline: float) -> List[Optional[Dict]]:
+    # Reads every child's pipe until EOF or the shared deadline; children still running then are killed
+    buffers = {fd: [] for _, fd in children}
+    open_fds = set(buffers)
+    while open_fds:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        ready, _, _ = select.select(list(open_fds), [], [], remaining)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                buffers[fd].append(chunk)
+            else:
+                open_fds.discard(fd)
+    results = []
+    for pid, fd in children:
+        result = None
+        if fd in open_fds:
+            os.kill(pid, signal.SIGKILL)
+        else:
+            try:
+                result = json.loads(b"".join(buffers[fd]).decode("utf-8"))
+            except ValueError:
+                pass
+        os.waitpid(pid, 0)
+        os.close(fd)
+        results.append(result)
+    return results
+
+def _timeout_result(timeout: float) -> Dict:
+    return {"exit_code": -1, "passed": 0, "failed": 0, "skipped": 0, "error": 1, "duration": timeout,
+            "tests": [], "failures": {}, "collection_errors": [f"Timed out after {timeout}s"], "output": "", "timed_out": True}
+
+def _run_forked(request: Dict, timeout: float) -> Dict:
+    # Each run gets a fresh fork of the warm interpreter, so the generated modules
+    # imported by one iteration never leak into the next
+    child = _start_fork(lambda: run_pytest(request["test_dir"], request["test_file"], request.get("args", ()), request.get("per_test_timeout")))
+    [result] = _wait_forks([child], time.time() + timeout)
+    return result if result is not None else _timeout_result(timeout)
+
+def merge_reports(shards: List[Optional[Dict]], chunks: List[List[str]], duration: float) -> Dict:
+    merged = {"exit_code": 0, "passed": 0, "failed": 0, "skipped": 0, "error": 0, "duration": duration, "tests": [],
+              "failures": {}, "collection_errors": [], "output": "", "timed_out": False, "timed_out_tests": [], "shards": []}
+    outputs = []
+    for index, (result, chunk) in enumerate(zip(shards, chunks)):
+        if result is None:
+            # Killed at the global deadline: whatever it had not reported counts as an error
+            merged["timed_out"] = True
+            merged["exit_code"] = -1
+            merged["error"] += len(chunk)
+            merged["tests"].extend({"nodeid": nodeid, "outcome": "error", "duration": 0.0} for nodeid in chunk)
+            merged["failures"].update({nodeid: "Shard killed at the global test timeout" for nodeid in chunk})
+            merged["shards"].append({"tests": len(chunk), "duration": None, "timed_out": True})
+            continue
+        for key in ("passed", "failed", "skipped", "error"):
+            merged[key] += result.get(key, 0)
+        merged["tests"].extend(result.get("tests", []))
+        merged["failures"].update(result.get("failures", {}))
+        merged["collection_errors"].extend(result.get("collection_errors", []))
+        merged["timed_out_tests"].extend(result.get("timed_out_tests", []))
+        if result.get("exit_code", 0) != 0 and merged["exit_code"] == 0:
+            merged["exit_code"] = result["exit_code"]
+        if result.get("output"):
+            outputs.append(f"[shard {index}]\n{result['output']}")
+        merged["shards"].append({"tests": len(chunk), "duration": result.get("duration"), "timed_out": False})
+    text = "\n".join(outputs)
+    merged["output"] = text if len(text) <= MAX_OUTPUT_CHARS else text[-MAX_OUTPUT_CHARS:]
+    return merged
+
+def _run_sharded(request: Dict, timeout: float) -> Dict:
+    start = time.time()
+    deadline = start + timeout
+    test_dir, test_file, args = request["test_dir"], request["test_file"], request.get("args", ())
+    [collected] = _wait_forks([_start_fork(lambda: collect_test_ids(test_dir, test_file, args))], deadline)
+    if collected is None:
+        return _timeout_result(timeout)
+    ids = collected["ids"]
+    shards = min(request.get("shards", 1), len(ids) // MIN_SHARD_SIZE)
+    if collected["collection_errors"] or shards < 2:
+        # Too small to split, or broken: one process gives the clearest report
+        result = _run_forked(request, max(0.0, deadline - time.time()))
+        result["duration"] = time.time() - start
+        return result
+    # Round-robin keeps neighbouring (often similar) tests on different cores
+    chunks = [ids[i::shards] for i in range(shards)]
+    per_test_timeout = request.get("per_test_timeout")
+    children = [_start_fork(lambda chunk=chunk: run_pytest(test_dir, test_file, args, per_test_timeout, chunk)) for chunk in chunks]
+    return merge_reports(_wait_forks(children, deadline), chunks, time.time() - start)
+
+def _serve(conn, timeout: float):
+    # Pay for pytest and its builtin plugins once
+    importlib.import_module("pytest")
+    try:
+        from _pytest.config import get_config
+        get_config()
+    except Exception:
+        pass
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        if hasattr(os, "fork"):
+            result = _run_sharded(request, timeout) if request.get("shards", 1) > 1 else _run_forked(request, timeout)
+        else:
+            result = run_pytest(request["test_dir"], request["test_file"], request.get("args", ()), request.get("per_test_timeout"))
+        conn.send(result)
+
+def content_key(test_dir: str, files: Iterable[str], test_file: str, args: Iterable[str] = ()) -> str:
+    digest = hashlib.sha256()
+    for name in [*files, test_file]:
+        digest.update(name.encode("utf-8") + b"\0")
+        try:
+            with open(os.path.join(test_dir, name), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(b"<missing>")
+    digest.update(json.dumps(list(args)).encode("utf-8"))
+    return digest.hexdigest()
+
+class PytestWorker:
+    # `timeout` bounds a whole run across all shards; `per_test_timeout` fails a single hanging test
+    # and lets the rest of the suite finish
+    def __init__(self, timeout: float = 120.0, shards: int = 1, per_test_timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.shards = max(1, shards)
+        self.per_test_timeout = per_test_timeout
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(method)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child_conn, self.timeout), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def run(self, test_dir: str, test_file: str, files: Iterable[str] = (), args: List[str] = ()) -> Dict:
+        key = content_key(test_dir, files, test_file, [*args, f"per_test_timeout={self.per_test_timeout}"])
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                return {**self.cache[key], "cached": True}
+            self.misses += 1
+            if self.process is None or not self.process.is_alive():
+                self.start()
+            self.conn.send({"test_dir": os.path.abspath(test_dir), "test_file": test_file, "args": list(args),
+                            "shards": self.shards, "per_test_timeout": self.per_test_timeout})
+            # The worker enforces the per-run timeout; this only guards against a dead worker
+            if not self.conn.poll(self.timeout + 30):
+                self.close()
+                return {"exit_code": -1, "passed": 0, "failed": 0, "skipped": 0, "error": 1, "duration": self.timeout,
+                        "tests": [], "failures": {}, "collection_errors": ["Test worker did not respond"], "output": "", "timed_out": True, "cached": False}
+            result = self.conn.recv()
+            self.cache[key] = result
+            return {**result, "cached": False}
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+            self.process = None
+
+def format_report(result: Dict) -> str:
+    summary = (
+        f"{result.get('passed', 0)} passed, {result.get('failed', 0)} failed, "
+        f"{result.get('skipped', 0)} skipped, {result.get('error', 0)} errors in {result.get('duration', 0.0):.2f}s"
+    )
+    if len(result.get("shards", [])) > 1:
+        summary += f" across {len(result['shards'])} shards"
+    if result.get("cached"):
+        summary += " (cached, files unchanged)"
+    lines = [summary]
+    if result.get("timed_out_tests"):
+        lines.append(f"TIMED OUT {', '.join(result['timed_out_tests'])}")
+    for nodeid, message in result.get("failures", {}).items():
+        lines.append(f"FAILED {nodeid}\n{message}")
+    lines.extend(f"ERROR {error}" for error in result.get("collection_errors", []))
+    return "\n".join(lines)
+
+# Wall-clock times from format_report and pytest's own summary line ("3 passed in 0.42s (0:00:00)")
+_TIMING = re.compile(r" in \d+(?:\.\d+)?s(?: \(\d+:\d{2}:\d{2}\))?")
+
+def strip_timings(report: str) -> str:
+    # Identical results should read identically, however long they took and whether they were cached
+    return _TIMING.sub("", report.replace(" (cached, files unchanged)", ""))